@@ -107,3 +107,21 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipient', 'expense', 'message', 'is_read', 'created_date')
     search_fields = ('user__username', 'recipient__username', 'message')
     list_filter = ('is_read', 'created_date')
+
+# -----------------------
+# Daily totals rollup
+# -----------------------
+@admin.register(DailyTotal)
+class DailyTotalAdmin(admin.ModelAdmin):
+    list_display = ('id', 'date', 'user', 'order_total', 'expense_total')
+    list_filter = ('date',)
+    readonly_fields = ('date', 'user', 'order_total', 'expense_total')
+
+# -----------------------
+# Notification outbox
+# -----------------------
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'group_name', 'attempts', 'next_attempt_at', 'delivered_date', 'created_date')
+    list_filter = ('delivered_date', 'created_date')
+    search_fields = ('group_name',)
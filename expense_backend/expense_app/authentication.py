@@ -0,0 +1,48 @@
+# expense_app/authentication.py
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that loads the user's role in the same query.
+
+    ``permissions.is_admin`` then checks the role as it is now rather than
+    the token's ``is_admin`` claim, without another query. Inactive users
+    and revoked tokens are rejected as in simplejwt.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        try:
+            user = self.user_model.objects.select_related('role').get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """Authenticate from the access token alone, without a user lookup.
+
+    ``request.user`` is a ``TokenUser`` built from the token claims; it has
+    ``id``/``pk`` but is not a model instance, so views using this class must
+    filter with ``user_id=request.user.id`` rather than ``user=request.user``.
+    Meant for read-only endpoints. Nothing is re-checked until the token
+    expires: a deactivated or demoted user keeps the access their claims
+    grant here, so ``permissions.is_admin`` must not guard anything sensitive
+    behind this class.
+    """
@@ -0,0 +1,578 @@
+# expense_app/bench.py
+"""Benchmark harness behind ``manage.py bench``.
+
+A suite is a function that receives a ``BenchRunner`` and calls
+``runner.measure()`` once per case; suites are registered with ``@suite``.
+Each case is run ``warmup`` times untimed and then ``iterations`` times. The
+report records p50/p95/p99/mean latency, the number of queries per run and
+the tracemalloc peak of one extra run. Reports are plain JSON so two commits
+can be compared with ``compare_reports()`` (``manage.py bench --baseline``).
+"""
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .compression import available_codecs, compression_settings
+from .middleware import QueryCounter
+from .models import (
+    Category, Expense, Item, Notification, Order, OrderItem, Role, Transaction, User,
+)
+from .permissions import role_name_for
+from .fast_serializers import EXPENSE_VALUES, ORDER_VALUES, serialize_expenses, serialize_orders
+from .pricing import PriceTimeline, resolve_prices
+from .renderers import FastJSONParser, FastJSONRenderer, MessagePackParser, MessagePackRenderer
+from .serializers import ExpenseSerializer, MyTokenObtainPairSerializer, OrderSerializer
+
+SUITES = {}
+
+
+def suite(name):
+    """Register a benchmark suite under ``name``."""
+    def register(func):
+        SUITES[name] = func
+        return func
+    return register
+
+
+def percentile(samples, pct):
+    """Linearly interpolated percentile of a sorted list."""
+    if not samples:
+        return None
+    rank = (len(samples) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+
+class BenchRunner:
+    def __init__(self, iterations=20, warmup=2, name_filter=None, progress=None, options=None):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.name_filter = name_filter
+        self.progress = progress
+        # Suite-specific settings, e.g. which users the endpoint suite uses
+        self.options = options or {}
+        self.results = {}
+        self._suite = None
+
+    def run_suite(self, name):
+        self._suite = self.results.setdefault(name, {})
+        SUITES[name](self)
+        return self._suite
+
+    def _run_once(self, run, setup, rollback, counter=None):
+        """Run ``setup`` then ``run``; return (seconds, result of run)."""
+        if not rollback:
+            state = setup() if setup else None
+            if counter is not None:
+                counter.count = 0
+            start = time.perf_counter()
+            result = run(state)
+            return time.perf_counter() - start, result
+
+        # Writes are rolled back so every iteration sees the same data
+        with db_transaction.atomic():
+            state = setup() if setup else None
+            if counter is not None:
+                counter.count = 0
+            start = time.perf_counter()
+            result = run(state)
+            elapsed = time.perf_counter() - start
+            db_transaction.set_rollback(True)
+        return elapsed, result
+
+    def measure(self, name, run, setup=None, rollback=False, **info):
+        """Benchmark ``run(state)``, where ``state`` is what ``setup()`` returned.
+
+        ``setup`` is excluded from the timings and the query count. With
+        ``rollback=True`` each iteration runs in a transaction that is rolled
+        back afterwards. Extra ``info`` is stored with the result.
+        """
+        if self.name_filter and self.name_filter not in name:
+            return None
+
+        for _ in range(self.warmup):
+            self._run_once(run, setup, rollback)
+
+        timings = []
+        counter = QueryCounter()
+        result = None
+        for _ in range(self.iterations):
+            counter.count = 0
+            with connection.execute_wrapper(counter):
+                elapsed, result = self._run_once(run, setup, rollback, counter)
+            timings.append(elapsed * 1000)
+        queries = counter.count
+
+        tracemalloc.start()
+        try:
+            self._run_once(run, setup, rollback)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        entry = dict(info)
+        if isinstance(result, dict):
+            entry.update(result)
+        entry.update({
+            'iterations': self.iterations,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': queries,
+            'peak_kib': round(peak / 1024, 1),
+        })
+        self._suite[name] = entry
+        if self.progress:
+            self.progress(name, entry)
+        return entry
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(runner):
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': runner.iterations,
+            'warmup': runner.warmup,
+            'rows': {
+                'users': User.objects.count(),
+                'items': Item.objects.count(),
+                'orders': Order.objects.count(),
+                'order_items': OrderItem.objects.count(),
+                'expenses': Expense.objects.count(),
+            },
+        },
+        'suites': runner.results,
+    }
+
+
+def compare_reports(baseline, current):
+    """Yield ``(suite, case, old, new)`` for every case present in both reports."""
+    for suite_name, cases in current.get('suites', {}).items():
+        old_cases = baseline.get('suites', {}).get(suite_name, {})
+        for name, new in cases.items():
+            if name in old_cases:
+                yield suite_name, name, old_cases[name], new
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+# Endpoint suite
+
+Case = namedtuple('Case', 'name who method path data setup', defaults=(None, None))
+
+# Stands in for the object a case's setup creates when its path is previewed
+_NEW = namedtuple('New', 'pk')('<new>')
+
+
+def _jwt_client(user):
+    client = APIClient()
+    token = MyTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def _today():
+    return timezone.localdate().isoformat()
+
+
+def _csv_upload():
+    return SimpleUploadedFile(
+        'expenses.csv', b'date,amount,description\n2024-01-01,10,Tea\n2024-01-02,12,Coffee\n',
+        content_type='text/csv',
+    )
+
+
+def _new_order(ctx):
+    order = Order.objects.create(created_user=ctx['user'], calculated_price=0)
+    OrderItem.objects.create(
+        order=order, item=ctx['item'], price=ctx['item'].item_price,
+        morning_count=1, evening_count=1, added_date=timezone.now(),
+    )
+    return order
+
+
+ENDPOINT_CASES = [
+    # Authentication
+    Case('register', 'anon', 'post', lambda c: '/api/register/',
+         lambda c: {'username': 'bench_new', 'email': 'bench_new@example.com', 'password': 'bench-pass-1'}),
+    Case('login', 'anon', 'post', lambda c: '/api/login/',
+         lambda c: {'email': c['admin'].email, 'password': c['password']} if c['password'] else None),
+    Case('logout', 'user', 'post', lambda c: '/api/logout/',
+         lambda c: {'refresh_token': str(MyTokenObtainPairSerializer.get_token(c['user']))}),
+    # Roles
+    Case('role-list', 'admin', 'get', lambda c: '/api/roles/'),
+    Case('role-create', 'admin', 'post', lambda c: '/api/roles/', lambda c: {'role_name': 'Bench'}),
+    Case('role-detail', 'admin', 'get', lambda c: f"/api/roles/{c['role'].pk}/"),
+    Case('role-update', 'admin', 'put', lambda c: f"/api/roles/{c['role'].pk}/",
+         lambda c: {'role_name': c['role'].role_name}),
+    Case('role-delete', 'admin', 'delete', lambda c: f"/api/roles/{c['new'].pk}/",
+         setup=lambda c: Role.objects.create(role_name='Bench')),
+    # Categories
+    Case('category-list', 'user', 'get', lambda c: '/api/categories/'),
+    Case('category-list-paginated', 'user', 'get', lambda c: '/api/categories/?limit=50'),
+    Case('category-create', 'admin', 'post', lambda c: '/api/categories/', lambda c: {'category_name': 'Bench'}),
+    Case('category-detail', 'admin', 'get', lambda c: f"/api/categories/{c['category'].pk}/"),
+    Case('category-update', 'admin', 'put', lambda c: f"/api/categories/{c['category'].pk}/",
+         lambda c: {'category_name': c['category'].category_name}),
+    Case('category-delete', 'admin', 'delete', lambda c: f"/api/categories/{c['new'].pk}/",
+         setup=lambda c: Category.objects.create(category_name='Bench', created_user=c['admin'])),
+    # Items
+    Case('item-list', 'user', 'get', lambda c: '/api/items/'),
+    Case('item-list-paginated', 'user', 'get', lambda c: '/api/items/?limit=50'),
+    Case('item-create', 'admin', 'post', lambda c: '/api/items/',
+         lambda c: {'category': c['category'].pk, 'item_name': 'Bench', 'item_price': 10}),
+    Case('item-detail', 'admin', 'get', lambda c: f"/api/items/{c['item'].pk}/"),
+    Case('item-update', 'admin', 'patch', lambda c: f"/api/items/{c['item'].pk}/",
+         lambda c: {'item_price': c['item'].item_price + 1}),
+    Case('item-delete', 'admin', 'delete', lambda c: f"/api/items/{c['new'].pk}/",
+         setup=lambda c: Item.objects.create(
+             category=c['category'], created_user=c['admin'], item_name='Bench', item_price=1)),
+    Case('item-price-history', 'user', 'get', lambda c: f"/api/items/{c['item'].pk}/price-history/"),
+    Case('item-prices-as-of', 'user', 'get', lambda c: f"/api/items/prices-as-of/?at={c['line_date']}"),
+    Case('item-prices-batch', 'user', 'post', lambda c: '/api/items/prices-as-of/',
+         lambda c: {'lookups': [{'item': c['item'].pk, 'at': c['line_date']}] * 1000}),
+    Case('item-reprice', 'admin', 'post', lambda c: '/api/items/reprice/',
+         lambda c: {'prices': {str(pk): price + 1 for pk, price in Item.objects.values_list('id', 'item_price')}}),
+    # Expenses
+    Case('expense-list', 'admin', 'get', lambda c: '/api/expenses/'),
+    Case('expense-list-paginated', 'admin', 'get', lambda c: '/api/expenses/?limit=50'),
+    Case('expense-create', 'user', 'post', lambda c: '/api/expenses/',
+         lambda c: {'date': _today(), 'amount': 42, 'expense_type': 'Food', 'description': 'Bench'}),
+    Case('expense-detail', 'user', 'get', lambda c: f"/api/expenses/{c['expense'].pk}/"),
+    Case('expense-update', 'admin', 'put', lambda c: f"/api/expenses/{c['expense'].pk}/",
+         lambda c: {'amount': 50, 'is_verified': True}),
+    Case('expense-delete', 'user', 'delete', lambda c: f"/api/expenses/{c['expense'].pk}/"),
+    Case('my-expenses', 'user', 'get', lambda c: '/api/expenses/mydata/'),
+    Case('my-expenses-paginated', 'user', 'get', lambda c: '/api/expenses/mydata/?limit=50'),
+    # Profile
+    Case('profile', 'user', 'get', lambda c: '/api/profile/'),
+    Case('profile-update', 'user', 'put', lambda c: '/api/profile/', lambda c: {'name': 'Bench'}),
+    Case('profile-picture-update', 'user', 'patch', lambda c: '/api/update-profile-picture/',
+         lambda c: {'name': 'Bench'}),
+    # Orders
+    Case('order-list', 'user', 'get', lambda c: '/api/orders/'),
+    Case('order-list-admin', 'admin', 'get', lambda c: '/api/orders/'),
+    Case('order-list-paginated', 'admin', 'get', lambda c: '/api/orders/?limit=50'),
+    Case('order-create', 'user', 'post', lambda c: '/api/orders/',
+         lambda c: {'order_items': [
+             {'item': c['item'].pk, 'count': 3, 'added_date': timezone.now().isoformat()},
+         ]}),
+    Case('order-detail', 'user', 'get', lambda c: f"/api/orders/{c['order'].pk}/"),
+    Case('order-update', 'user', 'put', lambda c: f"/api/orders/{c['order'].pk}/",
+         lambda c: {'order_items': [{'id': line.pk, 'count': 4} for line in c['order'].orderitem_set.all()]}),
+    Case('order-delete', 'user', 'delete', lambda c: f"/api/orders/{c['new'].pk}/delete/", setup=_new_order),
+    # Order items
+    Case('order-item-list', 'admin', 'get', lambda c: '/api/order-items/'),
+    Case('order-item-list-paginated', 'admin', 'get', lambda c: '/api/order-items/?limit=50'),
+    Case('order-item-create', 'user', 'post', lambda c: '/api/order-items/',
+         lambda c: {'order': c['order'].pk, 'item': c['item'].pk, 'count': 2,
+                    'added_date': timezone.now().isoformat()}),
+    Case('order-item-detail', 'user', 'get', lambda c: f"/api/order-items/{c['line'].pk}/"),
+    Case('order-item-update', 'user', 'patch', lambda c: f"/api/order-items/{c['line'].pk}/",
+         lambda c: {'count': 5}),
+    Case('order-item-delete', 'user', 'delete', lambda c: f"/api/order-items/{c['line'].pk}/"),
+    # Transactions
+    Case('transaction-list', 'user', 'get', lambda c: '/api/transactions/'),
+    Case('transaction-list-paginated', 'user', 'get', lambda c: '/api/transactions/?limit=50'),
+    Case('transaction-create', 'user', 'post', lambda c: '/api/transactions/',
+         lambda c: {'total_price': 10, 'status': 'Pending',
+                    'from_date': timezone.now().isoformat(), 'to_date': timezone.now().isoformat()}),
+    Case('transaction-detail', 'user', 'get', lambda c: f"/api/transactions/{c['transaction'].pk}/"),
+    Case('transaction-update', 'user', 'put', lambda c: f"/api/transactions/{c['transaction'].pk}/",
+         lambda c: {'remarks': 'bench'}),
+    Case('transaction-delete', 'user', 'delete', lambda c: f"/api/transactions/{c['transaction'].pk}/"),
+    # Notifications
+    Case('notification-list', 'admin', 'get', lambda c: '/api/notifications/'),
+    Case('notification-list-paginated', 'admin', 'get', lambda c: '/api/notifications/?limit=50'),
+    Case('notification-detail', 'admin', 'get', lambda c: f"/api/notifications/{c['new'].pk}/",
+         setup=lambda c: Notification.objects.create(user=c['user'], recipient=c['admin'], message='Bench')),
+    Case('notification-read', 'admin', 'patch', lambda c: f"/api/notifications/{c['new'].pk}/",
+         setup=lambda c: Notification.objects.create(user=c['user'], recipient=c['admin'], message='Bench')),
+    Case('notification-mark-all-read', 'admin', 'patch', lambda c: '/api/notifications/mark-all-read/'),
+    Case('notification-clear-all', 'admin', 'delete', lambda c: '/api/notifications/clear-all/'),
+    # Reports
+    Case('daily-summary', 'user', 'get', lambda c: '/api/daily-summary/'),
+    Case('order-summary', 'user', 'get', lambda c: '/api/order-summary/'),
+    Case('order-summary-paginated', 'admin', 'get', lambda c: '/api/order-summary/?limit=50'),
+    Case('orders-by-date', 'user', 'get',
+         lambda c: f"/api/orders-by-date/?date={c['line_date']}&username={c['user'].username}"),
+    Case('orders-delete-by-date', 'user', 'delete',
+         lambda c: f"/api/orders/delete-by-date/?date={c['line_date']}&username={c['user'].username}"),
+    Case('grouped-by-date', 'user', 'get', lambda c: '/api/orders/grouped-by-date/'),
+    Case('grouped-by-date-month', 'user', 'get', lambda c: f"/api/orders/grouped-by-date/?month={c['line_date'][:7]}"),
+    Case('available-dates', 'user', 'get', lambda c: '/api/orders/available-dates/'),
+    # Exports and imports
+    Case('export-expenses', 'admin', 'get', lambda c: '/api/export/expenses/'),
+    Case('export-orders', 'admin', 'get', lambda c: '/api/export/orders/?output=ndjson'),
+    Case('export-order-items', 'admin', 'get', lambda c: '/api/export/order-items/'),
+    Case('import-expenses', 'admin', 'post', lambda c: '/api/import/expenses/', lambda c: {'file': _csv_upload()}),
+]
+
+# Requests sent as multipart form data rather than JSON
+MULTIPART_CASES = {'profile-update', 'profile-picture-update', 'import-expenses'}
+
+
+def endpoint_context(admin=None, user=None, password=None):
+    """Pick the users and objects the endpoint cases run against.
+
+    Defaults to the first admin and the non-admin user with the most orders,
+    so the per-user endpoints see the heaviest realistic history.
+    """
+    if admin is None:
+        admin = next(
+            (u for u in User.objects.exclude(role=None).order_by('id') if role_name_for(u.role_id) == 'admin'),
+            None,
+        )
+    if user is None:
+        user = (
+            User.objects.exclude(pk=getattr(admin, 'pk', None))
+            .annotate(order_count=Count('order')).order_by('-order_count', 'id').first()
+        )
+    if admin is None or user is None:
+        return None
+
+    order = Order.objects.filter(created_user=user, orderitem__isnull=False).order_by('-created_date').first()
+    line = order.orderitem_set.first() if order else None
+    return {
+        'admin': admin,
+        'user': user,
+        'password': password,
+        'role': Role.objects.order_by('id').first(),
+        'category': Category.objects.order_by('id').first(),
+        'item': Item.objects.order_by('id').first(),
+        'order': order,
+        'line': line,
+        'line_date': timezone.localdate(line.added_date).isoformat() if line else _today(),
+        'expense': Expense.objects.filter(user=user).order_by('-date').first(),
+        'transaction': Transaction.objects.filter(user=user).order_by('-created_date').first(),
+    }
+
+
+@suite('endpoints')
+def endpoint_suite(runner):
+    """Drive every URL in expense_app/urls.py through the test client."""
+    ctx = endpoint_context(**runner.options)
+    if ctx is None:
+        raise ValueError('The endpoint suite needs an admin and a regular user; run seed_perf first.')
+    clients = {'anon': APIClient(), 'admin': _jwt_client(ctx['admin']), 'user': _jwt_client(ctx['user'])}
+
+    for case in ENDPOINT_CASES:
+        if case.name == 'login' and not ctx['password']:
+            continue
+        try:
+            path = case.path({**ctx, 'new': _NEW})
+        except AttributeError:
+            # A target this dataset does not have (e.g. no expenses yet)
+            continue
+
+        def setup(case=case):
+            state = dict(ctx)
+            if case.setup:
+                state['new'] = case.setup(ctx)
+            state['body'] = case.data(state) if case.data else None
+            return state
+
+        def run(state, case=case):
+            client = clients[case.who]
+            path = case.path(state)
+            if case.name in MULTIPART_CASES:
+                response = getattr(client, case.method)(path, state['body'], format='multipart')
+            else:
+                response = getattr(client, case.method)(path, state['body'], format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return {'status': response.status_code}
+
+        runner.measure(
+            f'{case.method.upper()} {case.name}', run, setup=setup,
+            rollback=case.method != 'get' or case.setup is not None,
+            path=path,
+        )
+
+
+# Pricing suite
+
+PRICING_LOOKUPS = 100_000
+
+
+@suite('pricing')
+def pricing_suite(runner):
+    """Resolve ``PRICING_LOOKUPS`` historical (item, added_date) lookups."""
+    lines = list(
+        OrderItem.objects.order_by('-added_date').values_list('item_id', 'added_date')[:PRICING_LOOKUPS]
+    )
+    if not lines:
+        raise ValueError('The pricing suite needs order lines; run seed_perf first.')
+    pairs = (lines * (PRICING_LOOKUPS // len(lines) + 1))[:PRICING_LOOKUPS]
+
+    runner.measure(
+        'resolve_prices', lambda state: {'resolved': len(resolve_prices(pairs))}, lookups=len(pairs),
+    )
+    timeline = PriceTimeline.load()
+    runner.measure(
+        'PriceTimeline.resolve (loaded)', lambda state: {'resolved': len(timeline.resolve(pairs))},
+        lookups=len(pairs),
+    )
+
+
+# Serializer suite
+
+SERIALIZER_ROWS = 10_000
+
+
+def _repeat(rows, count):
+    return (rows * (count // len(rows) + 1))[:count] if rows else []
+
+
+@suite('serializers')
+def serializer_suite(runner):
+    """DRF serializers against the values() fast path, per row, at ``SERIALIZER_ROWS`` rows.
+
+    The stored rows are repeated in memory up to the row count, so this
+    measures serialization alone; the endpoint suite covers the queries.
+    """
+    request = Request(APIRequestFactory().get('/api/expenses/'))
+    expenses = list(Expense.objects.select_related('user').order_by('-date')[:SERIALIZER_ROWS])
+    expense_rows = list(Expense.objects.order_by('-date').values(*EXPENSE_VALUES)[:SERIALIZER_ROWS])
+    orders = list(Order.objects.prefetch_related('orderitem_set').order_by('-created_date')[:SERIALIZER_ROWS])
+    order_rows = list(Order.objects.order_by('-created_date').values(*ORDER_VALUES)[:SERIALIZER_ROWS])
+    if not expenses or not orders:
+        raise ValueError('The serializer suite needs expenses and orders; run seed_perf first.')
+
+    expenses, expense_rows = _repeat(expenses, SERIALIZER_ROWS), _repeat(expense_rows, SERIALIZER_ROWS)
+    orders, order_rows = _repeat(orders, SERIALIZER_ROWS), _repeat(order_rows, SERIALIZER_ROWS)
+    cases = [
+        ('expenses: ExpenseSerializer', lambda: ExpenseSerializer(expenses, many=True, context={'request': request}).data),
+        ('expenses: serialize_expenses', lambda: serialize_expenses(expense_rows, request)),
+        ('orders: OrderSerializer', lambda: OrderSerializer(orders, many=True).data),
+        ('orders: serialize_orders', lambda: serialize_orders(order_rows)),
+    ]
+    for name, serialize in cases:
+        entry = runner.measure(name, lambda state, serialize=serialize: {'rows': len(serialize())})
+        if entry:
+            entry['per_row_us'] = round(entry['p50_ms'] * 1000 / entry['rows'], 2)
+
+
+# Renderer suite
+
+def _throughput(entry, size):
+    if entry:
+        entry['mib_per_s'] = round(size / 1048576 / (entry['p50_ms'] / 1000), 1)
+
+
+@suite('renderers')
+def renderer_suite(runner):
+    """Render/parse throughput: DRF's stdlib JSON, FastJSON* and MessagePack.
+
+    Rendering uses the expense list (``SERIALIZER_ROWS`` rows) and a
+    grouped-by-date page as the views build them; parsing uses order POST
+    bodies, single and bulk. ``bytes`` is each format's own body size and
+    ``mib_per_s`` is measured against it.
+    """
+    ctx = endpoint_context(**runner.options)
+    if ctx is None:
+        raise ValueError('The renderer suite needs an admin and a regular user; run seed_perf first.')
+    request = Request(APIRequestFactory().get('/api/expenses/'))
+    rows = _repeat(list(Expense.objects.order_by('-date').values(*EXPENSE_VALUES)), SERIALIZER_ROWS)
+    responses = {
+        'expenses': serialize_expenses(rows, request),
+        'grouped-by-date': _jwt_client(ctx['user']).get('/api/orders/grouped-by-date/?page_size=100').data,
+    }
+    order = {'order_items': [
+        {'item': pk, 'count': 2, 'added_date': timezone.now().isoformat()}
+        for pk in Item.objects.values_list('id', flat=True)[:10]
+    ]}
+    requests = {'order': order, 'bulk-orders': {'orders': [order] * 100}}
+
+    for payload_name, payload in responses.items():
+        for renderer in (JSONRenderer(), FastJSONRenderer(), MessagePackRenderer()):
+            entry = runner.measure(
+                f'render {payload_name}: {type(renderer).__name__}',
+                lambda state, renderer=renderer, payload=payload: {'bytes': len(renderer.render(payload))},
+            )
+            _throughput(entry, len(renderer.render(payload)))
+    for payload_name, payload in requests.items():
+        for parser in (JSONParser(), FastJSONParser(), MessagePackParser()):
+            body = parser.renderer_class().render(payload)
+            entry = runner.measure(
+                f'parse {payload_name}: {type(parser).__name__}',
+                lambda state, parser=parser, body=body: {'bytes': len(body), 'keys': len(parser.parse(io.BytesIO(body)))},
+            )
+            _throughput(entry, len(body))
+
+
+COMPRESSED_REPORTS = {
+    'daily-summary': '/api/daily-summary/',
+    'order-summary': '/api/order-summary/',
+    'grouped-by-date': '/api/orders/grouped-by-date/?page_size=100',
+    'expenses': '/api/expenses/',
+}
+
+
+@suite('compression')
+def compression_suite(runner):
+    """Cost and ratio of each installed codec on the report responses.
+
+    ``bytes`` is the compressed size and ``ratio`` its share of the original.
+    The export cases stream ``order-items`` NDJSON through the middleware,
+    uncompressed and gzipped.
+    """
+    ctx = endpoint_context(**runner.options)
+    if ctx is None:
+        raise ValueError('The compression suite needs an admin and a regular user; run seed_perf first.')
+    client = _jwt_client(ctx['admin'])
+    codecs = available_codecs(compression_settings())
+
+    for report, url in COMPRESSED_REPORTS.items():
+        body = client.get(url).content
+        for codec in codecs:
+            entry = runner.measure(
+                f'{report}: {codec.encoding}',
+                lambda state, codec=codec, body=body: {'bytes': len(codec.compress(body))},
+                original_bytes=len(body),
+            )
+            if entry:
+                entry['ratio'] = round(entry['bytes'] / len(body), 3)
+
+    url = '/api/export/order-items/?output=ndjson'
+    for accept_encoding in ('identity', 'gzip'):
+        runner.measure(
+            f'export order-items: {accept_encoding}',
+            lambda state, accept_encoding=accept_encoding: {'bytes': sum(
+                len(chunk) for chunk in client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding).streaming_content
+            )},
+        )
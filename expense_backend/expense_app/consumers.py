@@ -3,19 +3,27 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from . import metrics
+
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         user = self.scope['user']
-        if user.is_authenticated:
-            self.group_name = f"user_{user.id}"
-        else:
-            self.group_name = "anonymous"
+        if not user.is_authenticated:
+            # Refuse the handshake instead of pooling sockets in a shared group
+            metrics.WEBSOCKET_HANDSHAKES.inc(result='rejected')
+            await self.close(code=4401)
+            return
 
+        self.group_name = f"user_{user.id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=self.scope.get('auth_subprotocol'))
+        metrics.WEBSOCKET_HANDSHAKES.inc(result='accepted')
+        metrics.WEBSOCKET_CONNECTIONS.inc()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, 'group_name'):
+            metrics.WEBSOCKET_CONNECTIONS.dec()
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def send_notification(self, event):
         await self.send(text_data=json.dumps({
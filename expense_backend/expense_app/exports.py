@@ -0,0 +1,110 @@
+# expense_app/exports.py
+"""Streaming CSV / NDJSON exports.
+
+Rows are read with ``values_list()`` through ``QuerySet.iterator()`` and
+written out one at a time, so memory stays flat regardless of how much
+history is exported and the first bytes go out as soon as the first chunk
+has been fetched. Resources take the ``user`` to scope rows to; ``None``
+exports every user's rows (admins).
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .filters import apply_report_filters
+from .models import Expense, Order, OrderItem
+
+CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _expenses(params, user=None):
+    queryset = apply_report_filters(
+        Expense.objects.all(), params,
+        date_field='date',
+        user_field='user__username',
+        date_is_datetime=False,
+    )
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    columns = [
+        'id', 'user_id', 'user__username', 'date', 'description', 'expense_type',
+        'amount', 'is_verified', 'is_refunded', 'bill', 'created_date',
+    ]
+    return queryset, columns
+
+
+def _orders(params, user=None):
+    queryset = apply_report_filters(
+        Order.objects.all(), params,
+        date_field='created_date',
+        user_field='created_user__username',
+    )
+    if user is not None:
+        queryset = queryset.filter(created_user=user)
+    if params.get('item_name'):
+        queryset = queryset.filter(orderitem__item__item_name=params['item_name']).distinct()
+    columns = ['id', 'created_user_id', 'created_user__username', 'calculated_price', 'created_date']
+    return queryset, columns
+
+
+def _order_items(params, user=None):
+    queryset = apply_report_filters(
+        OrderItem.objects.all(), params,
+        date_field='added_date',
+        user_field='order__created_user__username',
+        item_field='item__item_name',
+    )
+    if user is not None:
+        queryset = queryset.filter(order__created_user=user)
+    columns = [
+        'id', 'order_id', 'order__created_user__username', 'item_id', 'item__item_name',
+        'morning_count', 'evening_count', 'price', 'added_date',
+    ]
+    return queryset, columns
+
+
+EXPORT_RESOURCES = {
+    'expenses': _expenses,
+    'orders': _orders,
+    'order-items': _order_items,
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_rows(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_rows(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def export_response(resource, params, output='csv', user=None):
+    """Build a StreamingHttpResponse for ``resource`` in ``output`` format.
+
+    Only ``user``'s rows are exported unless ``user`` is None.
+    """
+    queryset, columns = EXPORT_RESOURCES[resource](params, user)
+    rows = queryset.order_by('id').values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+
+    body = _ndjson_rows(columns, rows) if output == 'ndjson' else _csv_rows(columns, rows)
+    response = StreamingHttpResponse(body, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{resource}.{output}"'
+    return response
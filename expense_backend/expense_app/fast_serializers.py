@@ -0,0 +1,158 @@
+# expense_app/fast_serializers.py
+"""values()-based serialization for the large list responses.
+
+The list GETs for expenses and orders return thousands of rows, and building
+a serializer (plus nested serializers and method fields) per row dominates
+their cost. The functions here read flat ``values()`` rows with the joins
+they need and build the same dicts as ``ExpenseSerializer`` /
+``OrderSerializer``: same keys in the same order and the same value formats,
+so the rendered JSON is identical. Detail views and writes keep using the
+DRF serializers.
+
+File URLs are built from the storage's media prefix, made absolute once per
+response, instead of calling ``request.build_absolute_uri`` per row.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
+
+from .models import Expense, OrderItem
+
+EXPENSE_VALUES = (
+    'id', 'user_id', 'user__username', 'user__name', 'user__email', 'date', 'description', 'expense_type',
+    'bill', 'amount', 'is_verified', 'is_refunded', 'created_date', 'updated_date',
+)
+ORDER_VALUES = ('id', 'created_user_id', 'calculated_price', 'created_date')
+ORDER_ITEM_VALUES = ('id', 'order_id', 'item_id', 'morning_count', 'evening_count', 'added_date')
+
+# OrderItemSerializer.added_date
+ADDED_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def datetime_formatter(output_format=None):
+    """``DateTimeField.to_representation`` for one response (fixed timezone)."""
+    output_format = output_format or api_settings.DATETIME_FORMAT
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def format_datetime(value):
+        if not value:
+            return None
+        if output_format is None or isinstance(value, str):
+            return value
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, dt_timezone.utc)
+        if output_format.lower() == ISO_8601:
+            value = value.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return value.strftime(output_format)
+
+    return format_datetime
+
+
+def format_date(value, output_format=None):
+    """``DateField.to_representation``."""
+    output_format = output_format or api_settings.DATE_FORMAT
+    if not value:
+        return None
+    if output_format is None or isinstance(value, str):
+        return value
+    if output_format.lower() == ISO_8601:
+        return value.isoformat()
+    return value.strftime(output_format)
+
+
+class MediaUrl:
+    """``FileField.to_representation`` for stored file names.
+
+    For the filesystem storage the URL is the (absolute) media prefix plus
+    the quoted name; other storages are asked per file.
+    """
+
+    def __init__(self, storage, request=None):
+        self.storage = storage
+        self.request = request
+        self.prefix = None
+        if isinstance(storage, FileSystemStorage) and storage.base_url:
+            self.prefix = request.build_absolute_uri(storage.base_url) if request else storage.base_url
+
+    def __call__(self, name):
+        if not name:
+            return None
+        if self.prefix is not None:
+            return self.prefix + filepath_to_uri(name).lstrip('/')
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request else url
+
+
+def serialize_expenses(rows, request=None):
+    """``ExpenseSerializer(many=True).data`` for ``queryset.values(*EXPENSE_VALUES)`` rows."""
+    bill_url = MediaUrl(Expense._meta.get_field('bill').storage, request)
+    format_datetime = datetime_formatter()
+    data = []
+    for row in rows:
+        url = bill_url(row['bill'])
+        amount = row['amount']
+        data.append({
+            'id': row['id'],
+            'user': {
+                'id': row['user_id'],
+                'username': row['user__username'],
+                'name': row['user__name'],
+                'email': row['user__email'],
+            },
+            'date': format_date(row['date']),
+            'description': row['description'],
+            'expense_type': row['expense_type'],
+            'bill': url,
+            'bill_url': url,
+            'amount': float(amount) if amount is not None else None,
+            'is_verified': row['is_verified'],
+            'is_refunded': row['is_refunded'],
+            'created_date': format_datetime(row['created_date']),
+            'updated_date': format_datetime(row['updated_date']),
+            'total_count': 1,
+            'total_amount': amount or 0,
+        })
+    return data
+
+
+def serialize_orders(rows):
+    """``OrderSerializer(many=True).data`` for ``queryset.values(*ORDER_VALUES)`` rows.
+
+    The lines of all the orders are read with one extra ``values()`` query.
+    """
+    rows = list(rows)
+    format_datetime = datetime_formatter()
+    format_added_date = datetime_formatter(ADDED_DATE_FORMAT)
+
+    lines = {row['id']: [] for row in rows}
+    if lines:
+        line_rows = (
+            OrderItem.objects.filter(order_id__in=list(lines)).order_by('id').values_list(*ORDER_ITEM_VALUES)
+        )
+        for pk, order_id, item_id, morning, evening, added_date in line_rows:
+            lines[order_id].append({
+                'id': pk,
+                'item': item_id,
+                'count': (morning or 0) + (evening or 0),
+                'added_date': format_added_date(added_date),
+                'order': order_id,
+            })
+
+    return [
+        {
+            'id': row['id'],
+            'created_user': row['created_user_id'],
+            'calculated_price': float(row['calculated_price']),
+            'created_date': format_datetime(row['created_date']),
+            'order_items': lines[row['id']],
+        }
+        for row in rows
+    ]
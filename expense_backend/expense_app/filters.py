@@ -0,0 +1,77 @@
+# expense_app/filters.py
+"""Query-string filters shared by the report and export endpoints.
+
+Date filters are always expressed as half-open ranges on the raw column
+(``field >= start AND field < end``) rather than ``__date`` / ``__year`` /
+``__month`` lookups, which wrap the column in a function and stop the
+database from using the index on it.
+"""
+from datetime import date as date_cls, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def start_of_day(day):
+    """Aware datetime for midnight at the start of ``day`` (current timezone)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def parse_month(month):
+    """Return the first day of a ``YYYY-MM`` string, or None if invalid."""
+    try:
+        return date_cls(int(month[:4]), int(month[5:]), 1)
+    except (ValueError, TypeError):
+        return None
+
+
+def date_range_filter(field, start, end, is_datetime=True):
+    """Filter kwargs for ``start <= field < end`` where start/end are dates."""
+    if is_datetime:
+        start, end = start_of_day(start), start_of_day(end)
+    return {f'{field}__gte': start, f'{field}__lt': end}
+
+
+def day_filter(field, day, is_datetime=True):
+    """Filter kwargs matching one calendar ``day`` (a date or YYYY-MM-DD)."""
+    if isinstance(day, str):
+        parsed = parse_date(day)
+        if parsed is None:
+            # Keep the old lookup so bad input fails the same way as before
+            return {f'{field}__date' if is_datetime else field: day}
+        day = parsed
+    return date_range_filter(field, day, day + timedelta(days=1), is_datetime)
+
+
+def apply_report_filters(queryset, params, date_field, user_field, item_field=None, date_is_datetime=True):
+    """Filter ``queryset`` by ``start_date``, ``end_date``, ``month`` (YYYY-MM),
+    ``date``, ``user`` (username) and ``item_name``.
+
+    ``date_field`` is the DateTimeField (or DateField, with
+    ``date_is_datetime=False``) the date filters apply to; ``item_field`` is
+    optional because not every resource has items.
+    """
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    month = params.get('month')
+    user = params.get('user')
+    item_name = params.get('item_name')
+    date = params.get('date')
+
+    if start_date:
+        queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+    if end_date:
+        queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+    if month:
+        first = parse_month(month)
+        if first is not None:
+            next_month = (first + timedelta(days=32)).replace(day=1)
+            queryset = queryset.filter(**date_range_filter(date_field, first, next_month, date_is_datetime))
+
+    if user:
+        queryset = queryset.filter(**{user_field: user})
+    if item_name and item_field:
+        queryset = queryset.filter(**{item_field: item_name})
+    if date:
+        queryset = queryset.filter(**day_filter(date_field, date, date_is_datetime))
+    return queryset
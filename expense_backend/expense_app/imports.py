@@ -0,0 +1,245 @@
+# expense_app/imports.py
+"""Bulk CSV import of historical expenses and daily order sheets.
+
+The CSV is read as a stream and processed in chunks: each chunk is validated
+row by row, then its whole object graph is written with ``bulk_create`` in one
+transaction. No notifications are sent. Invalid rows are skipped and reported
+with their line number; the rest of the chunk is still imported. The upload is
+decoded as UTF-8 with ``errors='replace'``, so rows with bytes that are not
+UTF-8 are reported the same way instead of failing the whole import.
+
+Expense columns: ``date`` (YYYY-MM-DD), ``amount``, and optionally
+``description``, ``expense_type``, ``user`` (email), ``is_verified``,
+``is_refunded``.
+
+Order sheet columns: ``date`` (YYYY-MM-DD or ISO datetime), ``item`` (id) or
+``item_name``, ``morning_count``, ``evening_count``, and optionally ``user``
+(email). Rows for the same user and date within a chunk become one order.
+"""
+import csv
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .bulk import OrderIngestError, create_orders, parse_added_date
+from .models import Expense, Item, Order, OrderItem, Transaction, TransactionOrder, User
+from .rollups import apply_daily_deltas, local_date
+
+CHUNK_SIZE = 1000
+ENCODING_ERROR = 'Not valid UTF-8 text.'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+EXPENSE_TYPES = {choice for choice, _ in Expense.EXPENSE_TYPE_CHOICES}
+
+
+def _undecodable(row):
+    """True if the row had bytes that are not UTF-8 (decoded as U+FFFD)."""
+    return any('\ufffd' in value for value in row.values() if isinstance(value, str))
+
+
+def _chunks(reader, size):
+    chunk = []
+    # Line 1 is the header, so data rows start at 2
+    for line_no, row in enumerate(reader, start=2):
+        chunk.append((line_no, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _UserLookup:
+    """Resolve ``user`` email columns, one query per chunk of new emails."""
+
+    def __init__(self, default_user):
+        self.default_user = default_user
+        self.by_email = {}
+
+    def prefetch(self, rows):
+        emails = {
+            (row.get('user') or '').strip().lower() for _, row in rows
+        } - set(self.by_email) - {''}
+        if emails:
+            for user_id, email in User.objects.filter(email__in=emails).values_list('id', 'email'):
+                self.by_email[email.lower()] = user_id
+            for email in emails:
+                self.by_email.setdefault(email, None)
+
+    def resolve(self, row):
+        email = (row.get('user') or '').strip().lower()
+        if not email:
+            return self.default_user.id
+        return self.by_email.get(email)
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _parse_expense(row, users):
+    errors = {}
+    day = parse_date((row.get('date') or '').strip())
+    if day is None:
+        errors['date'] = 'Expected YYYY-MM-DD.'
+    try:
+        amount = float(row.get('amount') or '')
+    except ValueError:
+        errors['amount'] = 'A number is required.'
+        amount = None
+    expense_type = (row.get('expense_type') or 'Product').strip()
+    if expense_type not in EXPENSE_TYPES:
+        errors['expense_type'] = f"Must be one of: {', '.join(sorted(EXPENSE_TYPES))}."
+    user_id = users.resolve(row)
+    if user_id is None:
+        errors['user'] = f"Unknown user: {row.get('user')}"
+    if errors:
+        return None, errors
+
+    # Historical rows are dated on their expense day so the DailyTotal
+    # rollup lands them on the right date.
+    created = _start_of_day(day)
+    return Expense(
+        user_id=user_id,
+        date=day,
+        description=row.get('description') or None,
+        expense_type=expense_type,
+        amount=amount,
+        is_verified=(row.get('is_verified') or '').strip().lower() in TRUE_VALUES,
+        is_refunded=(row.get('is_refunded') or '').strip().lower() in TRUE_VALUES,
+        created_date=created,
+    ), None
+
+
+def write_expenses(expenses):
+    """Create each expense with its Order, Transaction and TransactionOrder."""
+    Expense.objects.bulk_create(expenses)
+    orders = Order.objects.bulk_create([
+        Order(created_user_id=expense.user_id, calculated_price=expense.amount, created_date=expense.created_date)
+        for expense in expenses
+    ])
+    transactions = Transaction.objects.bulk_create([
+        Transaction(
+            user_id=expense.user_id,
+            total_price=expense.amount,
+            status=Transaction.StatusChoices.COMPLETED if expense.is_refunded else Transaction.StatusChoices.PENDING,
+            from_date=expense.created_date,
+            to_date=expense.created_date,
+        )
+        for expense in expenses
+    ])
+    TransactionOrder.objects.bulk_create([
+        TransactionOrder(transaction=txn, expense=expense, order_id=order)
+        for expense, order, txn in zip(expenses, orders, transactions)
+    ])
+
+    daily_deltas = defaultdict(lambda: [0.0, 0.0])
+    for expense in expenses:
+        daily_deltas[(local_date(expense.created_date), expense.user_id)][1] += expense.amount
+    apply_daily_deltas(daily_deltas)
+
+
+def import_expenses(stream, default_user, chunk_size=CHUNK_SIZE):
+    """Import expenses from a text ``stream``; return ``{'created', 'errors'}``."""
+    users = _UserLookup(default_user)
+    created = 0
+    errors = []
+
+    for chunk in _chunks(csv.DictReader(stream), chunk_size):
+        users.prefetch(chunk)
+        expenses = []
+        for line_no, row in chunk:
+            if _undecodable(row):
+                errors.append({'row': line_no, 'errors': {'encoding': ENCODING_ERROR}})
+                continue
+            expense, row_errors = _parse_expense(row, users)
+            if row_errors:
+                errors.append({'row': line_no, 'errors': row_errors})
+            else:
+                expenses.append(expense)
+
+        if expenses:
+            with db_transaction.atomic():
+                write_expenses(expenses)
+            created += len(expenses)
+
+    return {'created': created, 'errors': errors}
+
+
+class _ItemLookup:
+    def __init__(self):
+        items = list(Item.objects.all())
+        self.by_id = {item.id: item for item in items}
+        self.by_name = {item.item_name.strip().lower(): item for item in items}
+
+    def resolve(self, row):
+        raw_id = (row.get('item') or '').strip()
+        if raw_id:
+            try:
+                return self.by_id.get(int(raw_id))
+            except ValueError:
+                return None
+        return self.by_name.get((row.get('item_name') or '').strip().lower())
+
+
+def _parse_order_line(row, users, items):
+    errors = {}
+    try:
+        added_date = parse_added_date((row.get('date') or '').strip())
+    except OrderIngestError as exc:
+        errors['date'] = str(exc)
+        added_date = None
+    item = items.resolve(row)
+    if item is None:
+        errors['item'] = f"Unknown item: {row.get('item') or row.get('item_name')}"
+    counts = {}
+    for field in ('morning_count', 'evening_count'):
+        try:
+            counts[field] = int(row.get(field) or 0)
+        except ValueError:
+            errors[field] = 'A whole number is required.'
+    user_id = users.resolve(row)
+    if user_id is None:
+        errors['user'] = f"Unknown user: {row.get('user')}"
+    if errors:
+        return None, None, errors
+
+    line = OrderItem(item=item, added_date=added_date, price=item.item_price, **counts)
+    return user_id, line, None
+
+
+def import_order_sheet(stream, default_user, chunk_size=CHUNK_SIZE):
+    """Import daily order lines from a text ``stream``."""
+    users = _UserLookup(default_user)
+    items = _ItemLookup()
+    created = 0
+    errors = []
+
+    for chunk in _chunks(csv.DictReader(stream), chunk_size):
+        users.prefetch(chunk)
+        grouped = defaultdict(list)
+        for line_no, row in chunk:
+            if _undecodable(row):
+                errors.append({'row': line_no, 'errors': {'encoding': ENCODING_ERROR}})
+                continue
+            user_id, line, row_errors = _parse_order_line(row, users, items)
+            if row_errors:
+                errors.append({'row': line_no, 'errors': row_errors})
+            else:
+                grouped[(user_id, local_date(line.added_date))].append(line)
+
+        if grouped:
+            with db_transaction.atomic():
+                create_orders([(user_id, lines) for (user_id, _), lines in grouped.items()])
+            created += sum(len(lines) for lines in grouped.values())
+
+    return {'created': created, 'errors': errors}
+
+
+IMPORTERS = {
+    'expenses': import_expenses,
+    'orders': import_order_sheet,
+}
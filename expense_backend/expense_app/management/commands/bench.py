@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_app.bench import SUITES, BenchRunner, compare_reports, load_report, report
+from expense_app.models import User
+from expense_app.synthetic import PASSWORD
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API against the current database and write a JSON report "
+        "with p50/p95/p99 latency, query counts and peak memory per case."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                            help="Suite to run; repeat for several. Defaults to all suites.")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--filter', help="Only run cases whose name contains this text.")
+        parser.add_argument('--output', default='bench-report.json', help="Where to write the JSON report.")
+        parser.add_argument('--baseline', help="Earlier report to compare against.")
+        parser.add_argument('--admin', help="Email of the admin user the endpoint suite uses.")
+        parser.add_argument('--user', help="Email of the regular user the endpoint suite uses.")
+        parser.add_argument('--password', default=PASSWORD,
+                            help="Admin password, for benchmarking the login endpoint.")
+
+    def _user(self, email):
+        if not email:
+            return None
+        try:
+            return User.objects.get(email=email)
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {email}")
+
+    def _progress(self, name, entry):
+        self.stdout.write(
+            f"{name:<40} p50 {entry['p50_ms']:>9.2f}ms  p95 {entry['p95_ms']:>9.2f}ms  "
+            f"p99 {entry['p99_ms']:>9.2f}ms  {entry['queries']:>4} queries  {entry['peak_kib']:>9.1f} KiB"
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        runner = BenchRunner(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            name_filter=options['filter'],
+            progress=self._progress,
+            options={
+                'admin': self._user(options['admin']),
+                'user': self._user(options['user']),
+                'password': options['password'],
+            },
+        )
+        for name in options['suite'] or sorted(SUITES):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Suite: {name}"))
+            try:
+                runner.run_suite(name)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        result = report(runner)
+        with open(options['output'], 'w', encoding='utf-8') as handle:
+            json.dump(result, handle, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if options['baseline']:
+            self._compare(load_report(options['baseline']), result)
+
+    def _compare(self, baseline, current):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {baseline['meta'].get('git_commit') or 'baseline'}"
+        ))
+        for suite_name, name, old, new in compare_reports(baseline, current):
+            change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            queries = new['queries'] - old['queries']
+            line = f"{suite_name}/{name:<40} p50 {old['p50_ms']:>9.2f} -> {new['p50_ms']:>9.2f}ms ({change:+.1f}%)"
+            if queries:
+                line += f"  queries {queries:+d}"
+            style = self.style.ERROR if change > 10 or queries > 0 else self.style.SUCCESS if change < -10 else None
+            self.stdout.write(style(line) if style else line)
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_app.metrics import start_http_server
+from expense_app.outbox import BATCH_SIZE, deliver_pending, purge_dead, purge_delivered
+
+
+class Command(BaseCommand):
+    help = "Drain the notification outbox to the channel layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Deliver what is due now and exit.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle.")
+        parser.add_argument(
+            '--keep-days', type=int, default=7,
+            help="Delete delivered rows older than this many days.",
+        )
+        parser.add_argument(
+            '--keep-dead-days', type=int, default=30,
+            help="Delete rows that exhausted their retries after this many days.",
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help="Serve this worker's Prometheus metrics (group_send latency/failures) on this port.",
+        )
+        parser.add_argument(
+            '--metrics-address', default='127.0.0.1',
+            help="Address for --metrics-port. Non-loopback addresses need METRICS_PUBLIC=1.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        keep = timedelta(days=options['keep_days'])
+        keep_dead = timedelta(days=options['keep_dead_days'])
+        last_purge = 0.0
+        if options['metrics_port'] is not None:
+            try:
+                start_http_server(options['metrics_port'], options['metrics_address'])
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+
+        while True:
+            sent, failed = deliver_pending(batch_size)
+            if sent or failed:
+                self.stdout.write(f"Delivered {sent}, failed {failed}.")
+
+            if time.monotonic() - last_purge > 3600:
+                purge_delivered(keep)
+                purge_dead(keep_dead)
+                last_purge = time.monotonic()
+
+            if options['once']:
+                if sent + failed < batch_size:
+                    break
+                continue
+            if sent + failed < batch_size:
+                time.sleep(options['interval'])
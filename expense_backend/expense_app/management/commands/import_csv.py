@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_app.imports import CHUNK_SIZE, IMPORTERS
+from expense_app.models import User
+
+
+class Command(BaseCommand):
+    help = "Bulk-import expenses or daily order sheets from a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="CSV file to import.")
+        parser.add_argument(
+            '--user', required=True,
+            help="Email of the user that rows without a 'user' column are attributed to.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+
+        # Bytes that are not UTF-8 are reported per row, as in the import view
+        with open(options['path'], encoding='utf-8-sig', errors='replace', newline='') as stream:
+            result = IMPORTERS[options['resource']](stream, user, chunk_size=options['chunk_size'])
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} row(s); {len(result['errors'])} row(s) skipped."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_app.rollups import check_daily_totals, rebuild_daily_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyTotal rollup from order items and expenses, or check it for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the rollup with the source tables; exit non-zero on mismatch.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = check_daily_totals()
+            for row in mismatches:
+                self.stdout.write(
+                    f"{row['date']} user={row['user']} "
+                    f"expected={row['expected']} stored={row['stored']}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} daily total(s) out of date.")
+            self.stdout.write(self.style.SUCCESS("Daily totals are consistent."))
+            return
+
+        count = rebuild_daily_totals()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily total row(s)."))
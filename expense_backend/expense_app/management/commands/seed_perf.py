@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expense_app.models import User
+from expense_app.synthetic import PASSWORD, seed_perf
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, items, daily orders and expenses for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Regular users to create (plus one admin).")
+        parser.add_argument('--items', type=int, default=30, help="Size of the item catalog.")
+        parser.add_argument('--years', type=float, default=1, help="Years of daily history, ending today.")
+        parser.add_argument('--days', type=int, help="Days of history; overrides --years.")
+        parser.add_argument('--expense-rate', type=float, default=0.15,
+                            help="Chance that a user files an expense on a given day.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed; the same seed gives the same data.")
+        parser.add_argument('--prefix', default='perf', help="Username/email prefix of the generated users.")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username=f'{prefix}_admin').exists():
+            raise CommandError(f"Users with prefix '{prefix}' already exist; pick another --prefix.")
+
+        days = options['days'] or max(1, round(options['years'] * 365))
+        counts = seed_perf(
+            users=options['users'],
+            items=options['items'],
+            days=days,
+            seed=options['seed'],
+            prefix=prefix,
+            expense_rate=options['expense_rate'],
+            progress=lambda message: self.stdout.write(message) if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['users']} users, {counts['items']} items, {counts['orders']} orders "
+            f"({counts['order_items']} lines) and {counts['expenses']} expenses over {days} days. "
+            f"Log in as {prefix}_admin@example.com / {PASSWORD}."
+        ))
@@ -0,0 +1,269 @@
+# expense_app/metrics.py
+"""In-process metrics in the Prometheus text exposition format.
+
+A deliberately small implementation (counters, gauges, histograms with
+labels) so the app needs no client library or sidecar. Values live in the
+memory of the process that records them: the web process serves
+``/metrics``, and the outbox worker can serve its own with
+``deliver_notifications --metrics-port`` (on loopback unless
+``METRICS['PUBLIC']`` is set). When running several web processes, scrape
+each one.
+"""
+import ipaddress
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+SIZE_BUCKETS = (10_240, 51_200, 102_400, 512_000, 1_048_576, 2_097_152, 5_242_880, 10_485_760, 26_214_400)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        if not self.label_names:
+            # Unlabelled series are exported as 0 until first used
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_labels(self.label_names, key)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from ``collect()`` at scrape time."""
+
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY, collect=None):
+        super().__init__(name, help, labels, registry)
+        self.collect = collect
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.collect is not None:
+            try:
+                self.set(self.collect())
+            except Exception:
+                # Leave the last value in place if the source is unavailable
+                pass
+        return super().samples()
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+        if not self.label_names:
+            self._values[()] = [[0] * (len(self.buckets) + 1), 0.0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (non-cumulative), +Inf last, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _labels(self.label_names, key, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _labels(self.label_names, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def _pending_outbox():
+    from .models import NotificationOutbox
+    from .outbox import MAX_ATTEMPTS
+
+    return NotificationOutbox.objects.filter(delivered_date__isnull=True, attempts__lt=MAX_ATTEMPTS).count()
+
+
+def _dead_outbox():
+    from .outbox import dead_letters
+
+    return dead_letters().count()
+
+
+# HTTP (recorded by expense_app.middleware.MetricsMiddleware)
+REQUEST_LATENCY = Histogram(
+    'expense_http_request_duration_seconds', 'Time spent handling a request, by view.', ['view', 'method'],
+)
+REQUESTS = Counter(
+    'expense_http_requests_total', 'Requests handled, by view and status code.', ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'expense_http_request_db_queries', 'Database queries run per request, by view.', ['view', 'method'],
+    buckets=QUERY_BUCKETS,
+)
+
+# Realtime notifications
+NOTIFICATIONS_QUEUED = Counter(
+    'expense_notifications_queued_total', 'Realtime notifications written to the outbox.',
+)
+NOTIFICATIONS_PENDING = Gauge(
+    'expense_notification_outbox_pending', 'Outbox rows not yet delivered.', collect=_pending_outbox,
+)
+NOTIFICATIONS_DEAD = Gauge(
+    'expense_notification_outbox_dead', 'Outbox rows that failed MAX_ATTEMPTS times and are no longer retried.',
+    collect=_dead_outbox,
+)
+GROUP_SEND_LATENCY = Histogram(
+    'expense_channel_group_send_duration_seconds', 'Channel layer group_send latency.',
+)
+GROUP_SEND_FAILURES = Counter(
+    'expense_channel_group_send_failures_total', 'Channel layer group_send calls that raised.',
+)
+
+# WebSockets (NotificationConsumer)
+WEBSOCKET_CONNECTIONS = Gauge(
+    'expense_websocket_connections', 'Open notification WebSocket connections.',
+)
+WEBSOCKET_HANDSHAKES = Counter(
+    'expense_websocket_handshakes_total', 'Notification WebSocket handshakes, by outcome.', ['result'],
+)
+
+# Uploads
+BILL_UPLOAD_BYTES = Histogram(
+    'expense_bill_upload_bytes', 'Size of uploaded expense bills.', buckets=SIZE_BUCKETS,
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _is_loopback(address):
+    if address == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def start_http_server(port, address='127.0.0.1'):
+    """Serve the registry on ``address:port`` from a daemon thread (for non-web processes).
+
+    This server has no authentication, so any address other than loopback
+    is refused unless ``METRICS['PUBLIC']`` is set, as for ``/metrics``.
+    """
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    if not _is_loopback(address) and not getattr(settings, 'METRICS', {}).get('PUBLIC'):
+        raise ImproperlyConfigured(
+            f"Refusing to serve unauthenticated metrics on {address or 'all interfaces'}; "
+            "bind to a loopback address or set METRICS_PUBLIC=1."
+        )
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,198 @@
+# expense_app/middleware.py
+"""Request instrumentation middleware.
+
+``MetricsMiddleware`` records per-view latency, status and query counts for
+``/metrics`` (see metrics.py).
+
+``RequestProfilingMiddleware``, switched on with
+``REQUEST_PROFILING['ENABLED']``, gives every response a ``Server-Timing``
+header with the wall time, the number of queries and the time spent in the
+database. Requests slower than
+``SLOW_REQUEST_MS`` are logged with their slowest statements.
+
+Sending ``X-Profile: <PROFILE_TOKEN>`` also runs that single request under
+cProfile. The stats are written to ``PROFILE_DIR``, which keeps only the
+newest ``PROFILE_KEEP`` files, and the response names the file in
+``X-Profile-File``. Only trusted requests get the SQL of the slowest
+statements in their ``Server-Timing`` header.
+"""
+import cProfile
+import heapq
+import hmac
+import logging
+import os
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('expense_app.profiling')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SLOW_QUERIES': 3,
+    'SLOW_REQUEST_MS': 500,
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_TOKEN': '',
+    'PROFILE_DIR': 'profiles',
+    'PROFILE_KEEP': 50,
+}
+
+_unsafe = re.compile(r'[^A-Za-z0-9_.,*()=<>!-]+')
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+class QueryTimer:
+    """``execute_wrapper`` that times every statement and keeps the slowest."""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []  # min-heap of (seconds, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if self.keep:
+                entry = (elapsed, sql)
+                if len(self.slowest) < self.keep:
+                    heapq.heappush(self.slowest, entry)
+                elif entry > self.slowest[0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def slowest_first(self):
+        return sorted(self.slowest, reverse=True)
+
+
+def _describe(sql, limit=80):
+    """A header-safe, shortened form of ``sql``."""
+    return _unsafe.sub(' ', sql).strip()[:limit]
+
+
+def _rotate(directory, keep):
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.prof')),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.config = profiling_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profile_meta_key = 'HTTP_' + self.config['PROFILE_HEADER'].upper().replace('-', '_')
+
+    def _trusted(self, request):
+        token = self.config['PROFILE_TOKEN']
+        supplied = request.META.get(self.profile_meta_key)
+        return bool(token and supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+    def __call__(self, request):
+        trusted = self._trusted(request)
+        timer = QueryTimer(self.config['SLOW_QUERIES'])
+        profiler = cProfile.Profile() if trusted else None
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        db_ms = timer.total * 1000
+
+        timings = [
+            f'total;dur={elapsed_ms:.1f}',
+            f'db;dur={db_ms:.1f};desc="{timer.count} queries"',
+            f'app;dur={max(elapsed_ms - db_ms, 0):.1f}',
+        ]
+        slowest = timer.slowest_first()
+        if trusted:
+            timings += [
+                f'sql-{rank};dur={seconds * 1000:.1f};desc="{_describe(sql)}"'
+                for rank, (seconds, sql) in enumerate(slowest, start=1)
+            ]
+        response['Server-Timing'] = ', '.join(timings)
+
+        if profiler:
+            response['X-Profile-File'] = self._save_profile(request, profiler)
+
+        if elapsed_ms >= self.config['SLOW_REQUEST_MS']:
+            logger.warning(
+                'Slow request %s %s: %.1fms, %d queries in %.1fms; slowest: %s',
+                request.method, request.path, elapsed_ms, timer.count, db_ms,
+                '; '.join(f'{seconds * 1000:.1f}ms {_describe(sql, 200)}' for seconds, sql in slowest),
+            )
+        return response
+
+    def _save_profile(self, request, profiler):
+        directory = self.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10**6:06d}-{request.method}-{slug}.prof'
+        profiler.dump_stats(os.path.join(directory, name))
+        _rotate(directory, self.config['PROFILE_KEEP'])
+        return name
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` that only counts statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Feed the per-view request metrics. Disabled with ``METRICS['ENABLED']``."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS', {}).get('ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        # The URL pattern, not the path, keeps the label set small
+        match = getattr(request, 'resolver_match', None)
+        view = f'/{match.route}' if match and match.route else 'unmatched'
+        metrics.REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+        metrics.REQUEST_QUERIES.observe(counter.count, view=view, method=request.method)
+        metrics.REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        return response
@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-18 17:28
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast, TruncDate
+
+
+def backfill_daily_totals(apps, schema_editor):
+    # Self-contained copy of the rebuild as of this migration; it must not
+    # follow later changes to expense_app.rollups.
+    OrderItem = apps.get_model('expense_app', 'OrderItem')
+    Expense = apps.get_model('expense_app', 'Expense')
+    DailyTotal = apps.get_model('expense_app', 'DailyTotal')
+
+    totals = defaultdict(lambda: [0.0, 0.0])
+    order_rows = (
+        OrderItem.objects
+        .annotate(day=TruncDate('added_date'))
+        .values('day', 'order__created_user')
+        .annotate(total=Sum(
+            Cast('price', FloatField()) * (F('morning_count') + F('evening_count')),
+            output_field=FloatField(),
+        ))
+        .order_by()
+    )
+    for row in order_rows:
+        totals[(row['day'], row['order__created_user'])][0] += row['total'] or 0
+
+    expense_rows = (
+        Expense.objects
+        .annotate(day=TruncDate('created_date'))
+        .values('day', 'user')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for row in expense_rows:
+        totals[(row['day'], row['user'])][1] += row['total'] or 0
+
+    DailyTotal.objects.bulk_create(
+        [
+            DailyTotal(date=date, user_id=user_id, order_total=order_total, expense_total=expense_total)
+            for (date, user_id), (order_total, expense_total) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_app', '0019_alter_orderitem_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_total', models.FloatField(default=0)),
+                ('expense_total', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'user'), name='unique_daily_total_per_user')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast, TruncDate
+
+BATCH_SIZE = 1000
+
+# Self-contained copies of the pricing and rollup logic as of this migration;
+# they must not follow later changes to expense_app.pricing or rollups.
+
+
+def _price_timelines(ItemPriceHistory, item_ids):
+    """item id -> (change dates, price before each change), sorted by date."""
+    timelines = defaultdict(lambda: ([], []))
+    rows = (
+        ItemPriceHistory.objects
+        .filter(item_id__in=item_ids)
+        .order_by('item_id', 'date', 'id')
+        .values_list('item_id', 'date', 'price')
+    )
+    for item_id, changed_at, old_price in rows.iterator(chunk_size=BATCH_SIZE):
+        dates, prices = timelines[item_id]
+        dates.append(changed_at)
+        prices.append(old_price)
+    return timelines
+
+
+def _rebuild_daily_totals(apps):
+    OrderItem = apps.get_model('expense_app', 'OrderItem')
+    Expense = apps.get_model('expense_app', 'Expense')
+    DailyTotal = apps.get_model('expense_app', 'DailyTotal')
+
+    totals = defaultdict(lambda: [0.0, 0.0])
+    order_rows = (
+        OrderItem.objects
+        .annotate(day=TruncDate('added_date'))
+        .values('day', 'order__created_user')
+        .annotate(total=Sum(
+            Cast('price', FloatField()) * (F('morning_count') + F('evening_count')),
+            output_field=FloatField(),
+        ))
+        .order_by()
+    )
+    for row in order_rows:
+        totals[(row['day'], row['order__created_user'])][0] += row['total'] or 0
+
+    expense_rows = (
+        Expense.objects
+        .annotate(day=TruncDate('created_date'))
+        .values('day', 'user')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for row in expense_rows:
+        totals[(row['day'], row['user'])][1] += row['total'] or 0
+
+    DailyTotal.objects.all().delete()
+    DailyTotal.objects.bulk_create(
+        [
+            DailyTotal(date=date, user_id=user_id, order_total=order_total, expense_total=expense_total)
+            for (date, user_id), (order_total, expense_total) in totals.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def backfill_line_prices(apps, schema_editor):
+    """Fill in lines created before OrderItem.price existed (price 0).
+
+    ItemPriceHistory rows hold the price an item had *until* their date, so a
+    line added at ``t`` cost the price of the first change after ``t``, or the
+    current item price if the item has not changed since.
+    """
+    OrderItem = apps.get_model('expense_app', 'OrderItem')
+    Order = apps.get_model('expense_app', 'Order')
+    Item = apps.get_model('expense_app', 'Item')
+    ItemPriceHistory = apps.get_model('expense_app', 'ItemPriceHistory')
+
+    missing = OrderItem.objects.filter(price=0)
+    item_ids = set(missing.values_list('item_id', flat=True).distinct())
+    if not item_ids:
+        return
+    current = dict(Item.objects.filter(pk__in=item_ids).values_list('id', 'item_price'))
+    timelines = _price_timelines(ItemPriceHistory, item_ids)
+
+    touched_orders = set()
+    batch = []
+    for line in missing.only('id', 'order_id', 'item_id', 'added_date').iterator(chunk_size=BATCH_SIZE):
+        dates, prices = timelines.get(line.item_id, ((), ()))
+        index = bisect_right(dates, line.added_date)
+        line.price = prices[index] if index < len(prices) else current[line.item_id]
+        batch.append(line)
+        touched_orders.add(line.order_id)
+        if len(batch) >= BATCH_SIZE:
+            OrderItem.objects.bulk_update(batch, ['price'])
+            batch = []
+    if batch:
+        OrderItem.objects.bulk_update(batch, ['price'])
+
+    # Order totals and the DailyTotal rollup are derived from line prices
+    touched_orders = list(touched_orders)
+    for start in range(0, len(touched_orders), BATCH_SIZE):
+        chunk = touched_orders[start:start + BATCH_SIZE]
+        totals = dict(
+            OrderItem.objects.filter(order_id__in=chunk)
+            .values('order_id')
+            .annotate(total=Sum(
+                Cast('price', FloatField()) * (F('morning_count') + F('evening_count')),
+                output_field=FloatField(),
+            ))
+            .order_by()
+            .values_list('order_id', 'total')
+        )
+        orders = list(Order.objects.filter(pk__in=chunk).only('id'))
+        for order in orders:
+            order.calculated_price = totals.get(order.pk) or 0
+        Order.objects.bulk_update(orders, ['calculated_price'])
+
+    _rebuild_daily_totals(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_app', '0022_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_line_prices, migrations.RunPython.noop),
+    ]
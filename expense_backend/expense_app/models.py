@@ -1,9 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_save,post_delete
 from django.db.models import Sum,F
+from django.db.models.functions import Cast
 import os
 
 
@@ -55,6 +54,15 @@ class Item(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     updated_date = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the price as loaded so track_price_change can tell whether
+        # it changed without re-reading the row.
+        if 'item_price' not in instance.get_deferred_fields():
+            instance._loaded_price = instance.item_price
+        return instance
+
     def __str__(self):
         return self.item_name
 
@@ -74,11 +82,24 @@ class Order(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Latest order per user (expense_detail) and per-user listings
+            models.Index(fields=['created_user', '-created_date'], name='order_user_created_idx'),
+        ]
+
     def update_total_price(self):
-        total_price = sum(order_item.item.item_price * order_item.count for order_item in self.orderitem_set.all())
-        print("total Price ", total_price)
+        """Recompute the total from the line price snapshots in one query.
+
+        Item changes keep ``calculated_price`` current incrementally (see
+        order_totals.py); this full recompute is only needed to reconcile.
+        """
+        total_price = self.orderitem_set.aggregate(
+            total=Sum(Cast('price', models.FloatField()) * (F('morning_count') + F('evening_count')),
+                      output_field=models.FloatField())
+        )['total'] or 0
         self.calculated_price = total_price
-        self.save()
+        self.save(update_fields=['calculated_price', 'updated_date'])
 
     def __str__(self):
         return f"Order #{self.id} by {self.created_user.username}"
@@ -91,21 +112,43 @@ class OrderItem(models.Model):
     added_date = models.DateTimeField(default=timezone.now)
     price = models.DecimalField(max_digits=10, decimal_places=2)  # ✅ Add this
 
+    class Meta:
+        indexes = [
+            # Date windows in grouped-by-date, orders-by-date, available-dates
+            models.Index(fields=['added_date'], name='orderitem_added_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the line as loaded so signal receivers can apply deltas
+        # (old vs new) without re-reading the row.
+        if not instance.get_deferred_fields():
+            instance._loaded_line = instance.line_snapshot()
+        return instance
+
     @property
     def count(self):
         return self.morning_count + self.evening_count
 
+    @count.setter
+    def count(self, value):
+        # Same split the order views use: the extra unit goes to the evening.
+        value = int(value)
+        self.morning_count = value // 2
+        self.evening_count = value - self.morning_count
+
+    @property
+    def line_total(self):
+        return float(self.price or 0) * ((self.morning_count or 0) + (self.evening_count or 0))
+
+    def line_snapshot(self):
+        return (self.order_id, self.added_date, self.line_total)
+
     def __str__(self):
         return f"{self.count}x {self.item.item_name} in Order #{self.order.id}"
 
 
-    
-@receiver(post_save, sender=OrderItem)
-@receiver(post_delete, sender=OrderItem)
-def update_order_total(sender, instance, **kwargs):
-    """Update order total price when an order item is modified."""
-    instance.order.update_total_price()
-
 #Expense
 
 class Expense(models.Model):
@@ -126,6 +169,23 @@ class Expense(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+            # Expense list ordering (-date, -id) and its cursor pagination
+            models.Index(fields=['date', 'id'], name='expense_date_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields():
+            instance._loaded_totals = instance.totals_snapshot()
+        return instance
+
+    def totals_snapshot(self):
+        return (self.user_id, self.created_date, float(self.amount or 0))
+
     def __str__(self):
         return f"{self.id} - {self.user.username} - {self.description}"
     
@@ -174,9 +234,68 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'created_date'], name='notif_recipient_read_idx'),
+            # Unread badge counts only ever look at unread rows
+            models.Index(
+                fields=['recipient', 'created_date'],
+                name='notif_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+        ]
+
     def __str__(self):
         return f"Notification to {self.recipient.username}: {self.message[:20]}..."
-    
+
+#Notification outbox
+
+class NotificationOutbox(models.Model):
+    """Realtime notification waiting to be pushed to the channel layer.
+
+    Rows are written inside the request's transaction and drained by
+    ``manage.py deliver_notifications``.
+    """
+    group_name = models.CharField(max_length=150)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    delivered_date = models.DateTimeField(null=True, blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_idx',
+                condition=models.Q(delivered_date__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Outbox #{self.id} to {self.group_name}"
+
+#Daily totals
+
+class DailyTotal(models.Model):
+    """Per-day, per-user rollup of order and expense totals.
+
+    Kept up to date by the OrderItem/Expense receivers in signals.py; rebuild
+    with ``manage.py rebuild_daily_totals``.
+    """
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_totals')
+    order_total = models.FloatField(default=0)
+    expense_total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user'], name='unique_daily_total_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.user_id}: {self.order_total} + {self.expense_total}"
 
 
 # @receiver(pre_save, sender=Item)
@@ -0,0 +1,85 @@
+# expense_app/order_totals.py
+"""Incremental maintenance of ``Order.calculated_price``.
+
+Every OrderItem change applies ``new line total - old line total`` to its
+order with a single ``UPDATE ... SET calculated_price = calculated_price + x``.
+Bulk paths wrap their work in ``suspend_order_totals()`` instead, which skips
+the per-line updates and reconciles each touched order once on exit.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F
+
+# order id -> Order instance (or None) touched while totals are suspended.
+_suspended = ContextVar('suspended_order_totals', default=None)
+
+
+@contextmanager
+def suspend_order_totals():
+    """Defer order total maintenance until the block exits.
+
+    Orders touched inside the block are recomputed once each on exit; nested
+    blocks are folded into the outermost one.
+    """
+    if _suspended.get() is not None:
+        yield
+        return
+
+    touched = {}
+    token = _suspended.set(touched)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+    reconcile_orders(touched)
+
+
+def mark_order_touched(order_id, order=None):
+    """Record ``order_id`` for reconciliation; return False if not suspended."""
+    touched = _suspended.get()
+    if touched is None:
+        return False
+    if order is not None or order_id not in touched:
+        touched[order_id] = order
+    return True
+
+
+def reconcile_orders(orders):
+    """Recompute the totals of ``{order_id: Order or None}`` from their lines."""
+    from .models import Order
+
+    missing = [order_id for order_id, order in orders.items() if order is None]
+    loaded = Order.objects.in_bulk(missing) if missing else {}
+    for order_id, order in orders.items():
+        order = order or loaded.get(order_id)
+        if order is not None:
+            order.update_total_price()
+
+
+def apply_order_delta(order_id, delta, order=None):
+    """Add ``delta`` to one order's total, keeping ``order`` in step in memory."""
+    from .models import Order
+
+    if order_id is None or mark_order_touched(order_id, order) or not delta:
+        return
+    Order.objects.filter(pk=order_id).update(calculated_price=F('calculated_price') + delta)
+    if order is not None and order.calculated_price is not None:
+        order.calculated_price += delta
+
+
+def order_item_saved(instance, order=None):
+    old = getattr(instance, '_loaded_line', None)
+    new = instance.line_snapshot()
+    if old is None:
+        apply_order_delta(new[0], new[2], order)
+    elif old[0] == new[0]:
+        apply_order_delta(new[0], new[2] - old[2], order)
+    else:
+        apply_order_delta(old[0], -old[2])
+        apply_order_delta(new[0], new[2], order)
+
+
+def order_item_deleted(instance, order=None):
+    old = getattr(instance, '_loaded_line', None) or instance.line_snapshot()
+    apply_order_delta(old[0], -old[2], order)
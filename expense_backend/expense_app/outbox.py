@@ -0,0 +1,144 @@
+# expense_app/outbox.py
+"""Transactional outbox for realtime notifications.
+
+Requests only INSERT outbox rows (in their own transaction), so their latency
+and success no longer depend on the channel layer. ``deliver_pending()`` is
+run by ``manage.py deliver_notifications`` and works in three steps:
+
+1. Claim a batch of due rows in a short transaction. Each claimed row has its
+   ``attempts`` counted and ``next_attempt_at`` moved ``CLAIM_TIMEOUT`` ahead,
+   so other workers skip it.
+2. Push the batch to the channel layer concurrently, with no transaction or
+   row locks held.
+3. Record the outcome. Failures are retried with exponential backoff.
+
+A worker that dies between the steps leaves its rows to be picked up again
+once the claim expires, so delivery is at least once. Rows that fail
+``MAX_ATTEMPTS`` times are dead letters. They are no longer retried, are
+logged and counted (``expense_notification_outbox_dead``), and are removed by
+``purge_dead()`` after a retention period.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import NotificationOutbox
+
+logger = logging.getLogger('expense_app.outbox')
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = timedelta(seconds=2)
+MAX_BACKOFF = timedelta(minutes=10)
+# How long a claimed batch is reserved for the worker sending it
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue_notifications(user_ids, message):
+    """Queue ``message`` for each user's ``user_<id>`` group."""
+    metrics.NOTIFICATIONS_QUEUED.inc(len(user_ids))
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            group_name=f"user_{user_id}",
+            payload={
+                "type": "send_notification",
+                "message": message,
+            },
+        )
+        for user_id in user_ids
+    ])
+
+
+def backoff(attempts):
+    return min(BASE_BACKOFF * (2 ** max(attempts - 1, 0)), MAX_BACKOFF)
+
+
+def _send_all(channel_layer, entries):
+    async def send_one(entry):
+        start = time.perf_counter()
+        try:
+            return await channel_layer.group_send(entry.group_name, entry.payload)
+        except Exception:
+            metrics.GROUP_SEND_FAILURES.inc()
+            raise
+        finally:
+            metrics.GROUP_SEND_LATENCY.observe(time.perf_counter() - start)
+
+    async def send():
+        return await asyncio.gather(*(send_one(entry) for entry in entries), return_exceptions=True)
+
+    return async_to_sync(send)()
+
+
+def claim_due(batch_size=BATCH_SIZE):
+    """Claim up to ``batch_size`` due rows for this worker and commit."""
+    now = timezone.now()
+    with db_transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(delivered_date__isnull=True, attempts__lt=MAX_ATTEMPTS, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for entry in entries:
+            entry.attempts += 1
+            entry.next_attempt_at = now + CLAIM_TIMEOUT
+        NotificationOutbox.objects.bulk_update(entries, ['attempts', 'next_attempt_at'])
+    return entries
+
+
+def deliver_pending(batch_size=BATCH_SIZE):
+    """Deliver one batch of due notifications; return ``(sent, failed)``."""
+    entries = claim_due(batch_size)
+    if not entries:
+        return 0, 0
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        results = [RuntimeError('No channel layer configured')] * len(entries)
+    else:
+        results = _send_all(channel_layer, entries)
+
+    sent = failed = dead = 0
+    finished = timezone.now()
+    for entry, result in zip(entries, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            entry.last_error = repr(result)[:1000]
+            entry.next_attempt_at = finished + backoff(entry.attempts)
+            if entry.attempts >= MAX_ATTEMPTS:
+                dead += 1
+        else:
+            sent += 1
+            entry.delivered_date = finished
+            entry.last_error = ''
+    NotificationOutbox.objects.bulk_update(entries, ['last_error', 'next_attempt_at', 'delivered_date'])
+    if dead:
+        logger.warning('%d notification(s) failed %d times and will not be retried.', dead, MAX_ATTEMPTS)
+    return sent, failed
+
+
+def dead_letters():
+    """Rows that reached ``MAX_ATTEMPTS`` without being delivered."""
+    return NotificationOutbox.objects.filter(delivered_date__isnull=True, attempts__gte=MAX_ATTEMPTS)
+
+
+def purge_delivered(older_than=timedelta(days=7)):
+    """Delete delivered rows older than ``older_than``; return the count."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = NotificationOutbox.objects.filter(delivered_date__lt=cutoff).delete()
+    return deleted
+
+
+def purge_dead(older_than=timedelta(days=30)):
+    """Delete dead letters created more than ``older_than`` ago; return the count."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = dead_letters().filter(created_date__lt=cutoff).delete()
+    return deleted
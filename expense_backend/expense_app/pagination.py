@@ -0,0 +1,102 @@
+# expense_app/pagination.py
+"""Opt-in keyset (cursor) pagination for the list views.
+
+A list view is paginated when the request carries ``cursor`` or ``limit``.
+Pages are ordered by ``(ordering field, id)`` and the opaque cursor encodes
+that pair for the last row returned, so every page costs the same index seek
+no matter how deep it is.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def is_paginated(request):
+    params = request.query_params
+    return 'cursor' in params or 'limit' in params
+
+
+def get_page_size(request):
+    try:
+        size = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def encode_key(*values):
+    """Opaque cursor for a sort key of any length (dates as ISO strings)."""
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_key(cursor, size):
+    """Inverse of ``encode_key``; raises NotFound unless it holds ``size`` values."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise NotFound('Invalid cursor')
+    return values
+
+
+def encode_cursor(value, pk):
+    return encode_key(value, pk)
+
+
+def decode_cursor(cursor):
+    value, pk = decode_key(cursor, 2)
+    try:
+        return value, int(pk)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+
+
+def paginate_queryset(request, queryset, ordering):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset``.
+
+    ``ordering`` is a single field name, optionally prefixed with ``-``;
+    ``id`` is always used as the tie-breaker in the same direction.
+    """
+    descending = ordering.startswith('-')
+    field_name = ordering.lstrip('-')
+    field = queryset.model._meta.get_field(field_name)
+    id_ordering = '-id' if descending else 'id'
+    queryset = queryset.order_by(ordering, id_ordering) if field_name != 'id' else queryset.order_by(id_ordering)
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        try:
+            value = field.to_python(value)
+        except Exception:
+            raise NotFound('Invalid cursor')
+        lookup = 'lt' if descending else 'gt'
+        if field_name == 'id':
+            queryset = queryset.filter(**{f'id__{lookup}': pk})
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__{lookup}': value})
+                | Q(**{field_name: value, f'id__{lookup}': pk})
+            )
+
+    page_size = get_page_size(request)
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            # ``values()`` querysets
+            next_cursor = encode_cursor(last[field_name], last['id'])
+        else:
+            next_cursor = encode_cursor(getattr(last, field.attname), last.pk)
+    return rows, next_cursor
@@ -1,15 +1,64 @@
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.models import TokenUser
+
+# Lower-cased role names are cached per role id in the Django cache. The Role
+# receivers in signals.py drop a role's entry once a save or delete commits;
+# the timeout bounds how stale other processes can be when the cache backend
+# is per process (locmem).
+ROLE_CACHE_TIMEOUT = 5 * 60
+
+
+def _role_key(role_id):
+    return f'expense_app:role_name:{role_id}'
+
+
+def role_name_for(role_id):
+    if role_id is None:
+        return None
+    key = _role_key(role_id)
+    name = cache.get(key)
+    if name is None:
+        from .models import Role
+
+        name = (Role.objects.filter(pk=role_id).values_list('role_name', flat=True).first() or '').lower()
+        cache.set(key, name, ROLE_CACHE_TIMEOUT)
+    return name
+
+
+def clear_role_cache(role_id):
+    cache.delete(_role_key(role_id))
+
+
+def is_admin(request):
+    """True if the requester is an admin.
+
+    For users loaded from the database (``RoleJWTAuthentication``, which
+    also rejects inactive users) the current role decides, so a demotion
+    takes effect at once. Views using ``ClaimsJWTAuthentication`` have no user
+    row; for them the ``is_admin`` claim is trusted until the access token
+    expires (``SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']``), so those views must not
+    gate anything sensitive on it.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, TokenUser):
+        return bool(user.token.get('is_admin'))
+    role_id = getattr(user, 'role_id', None)
+    if role_id is not None and user._meta.get_field('role').is_cached(user):
+        return user.role.role_name.lower() == 'admin'
+    return role_name_for(role_id) == 'admin'
+
 
 class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
-        return request.user.role.role_name.lower() == 'admin' if request.user.role else False
+        return is_admin(request)
 
 class IsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if request.user.role and request.user.role.role_name.lower() == 'admin':
+        if is_admin(request):
             return True
-        return obj.user == request.user
-    
+        return obj.user_id == request.user.id
+
 class IsNotificationRecipient(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.recipient == request.user
+        return obj.recipient_id == request.user.id
@@ -0,0 +1,162 @@
+# expense_app/pricing.py
+"""Point-in-time item prices from ItemPriceHistory.
+
+An ItemPriceHistory row records the price an item had *until* its ``date``,
+and ``Item.item_price`` holds from the last change on. The price at ``t`` is
+therefore the price of the first change after ``t``, or the current price
+when there is none.
+
+``PriceTimeline`` loads the timelines of any number of items in two queries
+and answers each lookup with a binary search over integer timestamps, so a
+report or backfill can price every line without per-line queries.
+
+``reprice_items`` and ``reprice_queryset`` change many prices at once and
+write the matching history rows in bulk; a plain ``QuerySet.update()`` of
+``item_price`` would bypass the history.
+"""
+from bisect import bisect_right
+from datetime import date as date_cls, datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps as django_apps
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .catalog import bump_catalog_version
+from .filters import start_of_day
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def as_instant(value):
+    """Microseconds since the epoch for a datetime, or for the end of a date."""
+    if isinstance(value, datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return (value - EPOCH) // MICROSECOND
+    if isinstance(value, date_cls):
+        # A day's price is the one in force when the day ends
+        return (start_of_day(value + timedelta(days=1)) - EPOCH) // MICROSECOND - 1
+    raise TypeError(f'Expected a date or datetime, got {type(value).__name__}')
+
+
+def parse_instant(value):
+    """Parse an ISO datetime or ``YYYY-MM-DD`` string; None if invalid.
+
+    Dates and datetimes (MessagePack timestamps, say) are returned as is.
+    """
+    if isinstance(value, date_cls):
+        return value
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_datetime(value) or parse_date(value)
+    except ValueError:
+        return None
+
+
+class PriceTimeline:
+    """Price timelines for a set of items; see the module docstring."""
+
+    def __init__(self, current, changes):
+        self.current = current  # item id -> current price
+        self.changes = changes  # item id -> ([change instants], [price until then])
+
+    @classmethod
+    def load(cls, item_ids=None, apps=django_apps):
+        """Load the timelines of ``item_ids`` (every item if None)."""
+        Item = apps.get_model('expense_app', 'Item')
+        ItemPriceHistory = apps.get_model('expense_app', 'ItemPriceHistory')
+
+        items = Item.objects.all()
+        history = ItemPriceHistory.objects.all()
+        if item_ids is not None:
+            item_ids = list(item_ids)
+            items = items.filter(pk__in=item_ids)
+            history = history.filter(item_id__in=item_ids)
+
+        current = dict(items.values_list('id', 'item_price'))
+        changes = {}
+        rows = history.order_by('item_id', 'date', 'id').values_list('item_id', 'date', 'price')
+        for item_id, changed_at, price in rows.iterator(chunk_size=10_000):
+            instants, prices = changes.setdefault(item_id, ([], []))
+            instants.append((changed_at - EPOCH) // MICROSECOND)
+            prices.append(price)
+        return cls(current, changes)
+
+    def _price(self, item_id, instant):
+        timeline = self.changes.get(item_id)
+        if timeline is not None:
+            index = bisect_right(timeline[0], instant)
+            if index < len(timeline[1]):
+                return timeline[1][index]
+        # None for items that are not (or no longer) in the catalog
+        return self.current.get(item_id)
+
+    def price_at(self, item_id, when):
+        return self._price(item_id, as_instant(when))
+
+    def resolve(self, pairs):
+        """Prices for ``(item_id, date or datetime)`` pairs, in input order."""
+        price = self._price
+        return [price(item_id, as_instant(when)) for item_id, when in pairs]
+
+
+def resolve_prices(pairs, apps=django_apps):
+    """One-shot ``PriceTimeline.resolve`` loading only the items in ``pairs``."""
+    pairs = list(pairs)
+    timeline = PriceTimeline.load({item_id for item_id, _ in pairs}, apps=apps)
+    return timeline.resolve(pairs)
+
+
+def reprice_items(prices, when=None):
+    """Apply ``{item_id: new_price}`` in one bulk update; return how many changed.
+
+    Runs three queries however many items there are. Items whose price is
+    already the requested one are left alone and get no history row.
+    """
+    from .models import Item, ItemPriceHistory
+
+    when = when or timezone.now()
+    with db_transaction.atomic():
+        items = Item.objects.select_for_update().filter(pk__in=list(prices)).only('id', 'item_price')
+        changed, history = [], []
+        for item in items:
+            new_price = prices[item.pk]
+            if item.item_price != new_price:
+                history.append(ItemPriceHistory(item_id=item.pk, price=item.item_price, date=when))
+                item.item_price = new_price
+                item.updated_date = when
+                changed.append(item)
+        Item.objects.bulk_update(changed, ['item_price', 'updated_date'])
+        ItemPriceHistory.objects.bulk_create(history)
+    if changed:
+        # bulk_update sends no post_save, so the catalog cache is not bumped
+        db_transaction.on_commit(bump_catalog_version)
+    return len(changed)
+
+
+def reprice_queryset(queryset, price, when=None):
+    """``queryset.update(item_price=price)`` that also writes ItemPriceHistory.
+
+    ``price`` may be a value or an expression such as ``F('item_price') * 1.1``.
+    Runs four queries however many items match; returns how many changed.
+    """
+    from .models import Item, ItemPriceHistory
+
+    when = when or timezone.now()
+    with db_transaction.atomic():
+        old = dict(queryset.select_for_update().values_list('id', 'item_price'))
+        if not old:
+            return 0
+        Item.objects.filter(pk__in=list(old)).update(item_price=price, updated_date=when)
+        history = [
+            ItemPriceHistory(item_id=pk, price=old[pk], date=when)
+            for pk, new_price in Item.objects.filter(pk__in=list(old)).values_list('id', 'item_price')
+            if new_price != old[pk]
+        ]
+        ItemPriceHistory.objects.bulk_create(history)
+    if history:
+        db_transaction.on_commit(bump_catalog_version)
+    return len(history)
@@ -0,0 +1,135 @@
+# expense_app/renderers.py
+"""Renderers and parsers for DRF: orjson-backed JSON and MessagePack.
+
+``FastJSONRenderer`` and ``FastJSONParser`` are drop-in replacements for
+DRF's ``JSONRenderer`` / ``JSONParser`` (see ``REST_FRAMEWORK`` in
+settings.py). Output is byte-for-byte what ``JSONRenderer`` produces for the
+API's data: datetimes, dates, times and ``Decimal`` go through DRF's own
+``JSONEncoder.default`` (so ``OrderItem.price`` still renders as a number and
+UTC datetimes end in ``Z``), U+2028/U+2029 are escaped, and floats in the
+non-exponent range print the same as ``repr``. The differences are confined
+to values the API does not produce: floats that need an exponent
+(``1e16`` rather than ``1e+16``) and NaN/Infinity, which orjson renders as
+``null`` where strict DRF raises.
+
+Anything orjson cannot handle, or any rendering it does not do (indented
+output for the browsable API, ``UNICODE_JSON = False``, non-compact
+separators), falls back to the stdlib implementation, as does everything
+when orjson is not installed.
+
+``MessagePackRenderer`` / ``MessagePackParser`` offer ``application/msgpack``
+through normal content negotiation (``Accept`` / ``Content-Type``, or
+``?format=msgpack``). MessagePack has no date or decimal types, so values are
+encoded as strings: datetimes and dates exactly as in the JSON output (ISO
+8601, ``Z`` for UTC), ``Decimal`` as its exact string form rather than a
+float. Other types follow DRF's ``JSONEncoder``. Incoming MessagePack may
+also use the timestamp extension type, which is decoded to an aware UTC
+datetime; DRF's DateTimeFields accept it as is.
+"""
+import codecs
+import io
+from decimal import Decimal
+
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME  # datetime, date and time: DRF's format, not RFC 3339
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+# orjson reads integers beyond 64 bits as floats, so bodies with a run of
+# 19+ digits (even inside a string) are parsed by the stdlib instead. Mapping
+# digits to '0' and the rest to ' ' finds such runs much faster than a regex.
+DIGIT_MASK = bytes(ord('0') if chr(code).isdigit() and code < 128 else ord(' ') for code in range(256))
+LONG_DIGIT_RUN = b'0' * 19
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; let the stdlib encoder decide
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer, so the output is a JavaScript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        body = stream.read() if stream is not None else b''
+        if LONG_DIGIT_RUN in body.translate(DIGIT_MASK):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            if codecs.lookup(encoding).name == 'utf-8':
+                return orjson.loads(body)
+            return orjson.loads(body.decode(encoding))
+        except (orjson.JSONDecodeError, UnicodeDecodeError):
+            # Let JSONParser produce its error (or accept what only the
+            # stdlib does, like NaN when not strict)
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+def _msgpack_default(obj, _encode=JSONEncoder().default):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return _encode(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # datetime=False: datetimes go through _msgpack_default as strings
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=False)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            # timestamp=3: the timestamp extension becomes an aware datetime
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
@@ -0,0 +1,236 @@
+# expense_app/rollups.py
+"""Maintenance of the DailyTotal rollup.
+
+Order lines count towards the day of ``OrderItem.added_date`` and the user who
+created the order; expenses count towards the day they were created on and
+their owner. Both are valued the same way here, in the receivers and in the
+full rebuild, so incremental deltas and a rebuild always agree.
+"""
+from collections import defaultdict
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Totals within this distance are considered equal by the consistency check.
+TOLERANCE = 0.005
+
+# Above this many (date, user) keys, apply_daily_deltas() switches to bulk writes.
+BULK_DELTA_THRESHOLD = 20
+
+
+def local_date(value):
+    """Return the calendar date of ``value`` in the current time zone."""
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            return parse_date(value)
+        value = parsed
+    if hasattr(value, 'hour'):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def apply_daily_delta(date, user_id, order_total=0.0, expense_total=0.0, create=True):
+    """Add the given amounts to the (date, user) rollup row with one UPDATE.
+
+    ``create=False`` is used on delete paths: a missing row there means the
+    owner is being deleted as well, so nothing should be written back.
+    """
+    from .models import DailyTotal
+
+    if date is None or user_id is None or (not order_total and not expense_total):
+        return
+    updated = DailyTotal.objects.filter(date=date, user_id=user_id).update(
+        order_total=F('order_total') + order_total,
+        expense_total=F('expense_total') + expense_total,
+    )
+    if updated or not create:
+        return
+    _, created = DailyTotal.objects.get_or_create(
+        date=date,
+        user_id=user_id,
+        defaults={'order_total': order_total, 'expense_total': expense_total},
+    )
+    if not created:
+        # Lost a race with another writer creating the same row.
+        apply_daily_delta(date, user_id, order_total, expense_total, create=False)
+
+
+def apply_daily_deltas(deltas):
+    """Apply ``{(date, user_id): (order_delta, expense_delta)}``.
+
+    A few keys go through apply_daily_delta() one by one. Larger batches (bulk
+    ingestion and imports) lock the affected rows and replace them with one
+    DELETE and one bulk INSERT carrying the summed values.
+    """
+    from .models import DailyTotal
+
+    deltas = {
+        key: value for key, value in deltas.items()
+        if key[0] is not None and key[1] is not None and (value[0] or value[1])
+    }
+    if len(deltas) <= BULK_DELTA_THRESHOLD:
+        for (date, user_id), (order_delta, expense_delta) in deltas.items():
+            apply_daily_delta(date, user_id, order_delta, expense_delta)
+        return
+
+    dates = {date for date, _ in deltas}
+    user_ids = {user_id for _, user_id in deltas}
+    try:
+        with db_transaction.atomic():
+            existing = {
+                (row['date'], row['user_id']): row
+                for row in DailyTotal.objects.select_for_update()
+                .filter(date__in=dates, user_id__in=user_ids)
+                .values('id', 'date', 'user_id', 'order_total', 'expense_total')
+                if (row['date'], row['user_id']) in deltas
+            }
+            DailyTotal.objects.filter(pk__in=[row['id'] for row in existing.values()]).delete()
+
+            rows = []
+            for (date, user_id), (order_delta, expense_delta) in deltas.items():
+                current = existing.get((date, user_id), {'order_total': 0.0, 'expense_total': 0.0})
+                rows.append(DailyTotal(
+                    date=date,
+                    user_id=user_id,
+                    order_total=current['order_total'] + order_delta,
+                    expense_total=current['expense_total'] + expense_delta,
+                ))
+            DailyTotal.objects.bulk_create(rows, batch_size=500)
+    except IntegrityError:
+        # A concurrent writer created one of the rows; fall back to row-wise upserts.
+        for (date, user_id), (order_delta, expense_delta) in deltas.items():
+            apply_daily_delta(date, user_id, order_delta, expense_delta)
+
+
+def _order_user_id(order_id, order=None):
+    from .models import Order
+
+    if order is not None and order.pk == order_id:
+        return order.created_user_id
+    return Order.objects.filter(pk=order_id).values_list('created_user_id', flat=True).first()
+
+
+def order_item_saved(instance, order=None):
+    old = getattr(instance, '_loaded_line', None)
+    new = instance.line_snapshot()
+
+    new_date = local_date(new[1])
+    new_user = _order_user_id(new[0], order)
+    if old is None:
+        apply_daily_delta(new_date, new_user, order_total=new[2])
+        return
+
+    old_date = local_date(old[1])
+    old_user = new_user if old[0] == new[0] else _order_user_id(old[0])
+    if (old_date, old_user) == (new_date, new_user):
+        apply_daily_delta(new_date, new_user, order_total=new[2] - old[2])
+    else:
+        apply_daily_delta(old_date, old_user, order_total=-old[2], create=False)
+        apply_daily_delta(new_date, new_user, order_total=new[2])
+
+
+def order_item_deleted(instance, order=None):
+    old = getattr(instance, '_loaded_line', None) or instance.line_snapshot()
+    user_id = _order_user_id(old[0], order)
+    apply_daily_delta(local_date(old[1]), user_id, order_total=-old[2], create=False)
+
+
+def expense_saved(instance):
+    old = getattr(instance, '_loaded_totals', None)
+    new = instance.totals_snapshot()
+    new_date = local_date(new[1])
+    if old is None:
+        apply_daily_delta(new_date, new[0], expense_total=new[2])
+        return
+
+    old_date = local_date(old[1])
+    if (old_date, old[0]) == (new_date, new[0]):
+        apply_daily_delta(new_date, new[0], expense_total=new[2] - old[2])
+    else:
+        apply_daily_delta(old_date, old[0], expense_total=-old[2], create=False)
+        apply_daily_delta(new_date, new[0], expense_total=new[2])
+
+
+def expense_deleted(instance):
+    old = getattr(instance, '_loaded_totals', None) or instance.totals_snapshot()
+    apply_daily_delta(local_date(old[1]), old[0], expense_total=-old[2], create=False)
+
+
+def compute_daily_totals(apps=django_apps):
+    """Aggregate the rollup from scratch: ``{(date, user_id): [order, expense]}``."""
+    OrderItem = apps.get_model('expense_app', 'OrderItem')
+    Expense = apps.get_model('expense_app', 'Expense')
+
+    totals = defaultdict(lambda: [0.0, 0.0])
+    order_rows = (
+        OrderItem.objects
+        .annotate(day=TruncDate('added_date'))
+        .values('day', 'order__created_user')
+        .annotate(total=Sum(
+            Cast('price', FloatField()) * (F('morning_count') + F('evening_count')),
+            output_field=FloatField(),
+        ))
+        .order_by()
+    )
+    for row in order_rows:
+        totals[(row['day'], row['order__created_user'])][0] += row['total'] or 0
+
+    expense_rows = (
+        Expense.objects
+        .annotate(day=TruncDate('created_date'))
+        .values('day', 'user')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for row in expense_rows:
+        totals[(row['day'], row['user'])][1] += row['total'] or 0
+
+    return totals
+
+
+def rebuild_daily_totals(apps=django_apps):
+    """Replace every DailyTotal row with freshly aggregated values."""
+    DailyTotal = apps.get_model('expense_app', 'DailyTotal')
+
+    totals = compute_daily_totals(apps)
+    with db_transaction.atomic():
+        DailyTotal.objects.all().delete()
+        DailyTotal.objects.bulk_create(
+            [
+                DailyTotal(date=date, user_id=user_id, order_total=order_total, expense_total=expense_total)
+                for (date, user_id), (order_total, expense_total) in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def check_daily_totals(apps=django_apps):
+    """Return a list of rollup rows that disagree with the source tables."""
+    DailyTotal = apps.get_model('expense_app', 'DailyTotal')
+
+    expected = compute_daily_totals(apps)
+    stored = {
+        (row['date'], row['user']): [row['order_total'], row['expense_total']]
+        for row in DailyTotal.objects.values('date', 'user', 'order_total', 'expense_total')
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], k[1] or 0)):
+        want = expected.get(key, [0.0, 0.0])
+        have = stored.get(key, [0.0, 0.0])
+        if abs(want[0] - have[0]) > TOLERANCE or abs(want[1] - have[1]) > TOLERANCE:
+            mismatches.append({
+                'date': key[0],
+                'user': key[1],
+                'expected': {'order_total': want[0], 'expense_total': want[1]},
+                'stored': {'order_total': have[0], 'expense_total': have[1]},
+            })
+    return mismatches
@@ -3,6 +3,7 @@ from .models import *
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.hashers import make_password
 from rest_framework.exceptions import AuthenticationFailed
+from .permissions import is_admin, role_name_for
 
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -99,9 +100,8 @@ class ExpenseSerializer(serializers.ModelSerializer):
         return None
 
     def update(self, instance, validated_data):
-        user = self.context['request'].user
         if 'is_verified' in validated_data or 'is_refunded' in validated_data:
-            if not user.role or user.role.role_name.lower() != 'admin':
+            if not is_admin(self.context['request']):
                 raise serializers.ValidationError({'error': 'Only admin can update verification status'})
         return super().update(instance, validated_data)
 
@@ -160,10 +160,9 @@ class OrderSerializer(serializers.ModelSerializer):
 
         total_price = 0
         for item_data in order_items_data:
-            item = item_data['item']
-            count = item_data['count']
-            OrderItem.objects.create(order=order, **item_data)
-            total_price += item.item_price * count
+            # Snapshot the price so later catalog changes keep this total
+            line = OrderItem.objects.create(order=order, price=item_data['item'].item_price, **item_data)
+            total_price += line.line_total
 
         order.calculated_price = total_price
         order.save()
@@ -194,6 +193,15 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Role claims let permission checks skip the Role lookup per request
+        token = super().get_token(user)
+        role_name = user.role.role_name if user.role else None
+        token['role'] = role_name
+        token['is_admin'] = role_name_for(user.role_id) == 'admin'
+        return token
+
     def validate(self, attrs):
         email = attrs.get('email', '')
         if not email or '@' not in email:
@@ -1,21 +1,117 @@
-from django.db.models.signals import pre_save
+from functools import partial
+
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Item, ItemPriceHistory
+from django.db import transaction
+from django.db.models import QuerySet
+from .models import Category, Item, ItemPriceHistory, Order, OrderItem, Expense, Role, User
+from . import order_totals, rollups
+from .utils import invalidate_admin_user_ids
+from .permissions import clear_role_cache
+from .catalog import bump_catalog_version
 
 @receiver(pre_save, sender=Item)
-def track_price_change(sender, instance, **kwargs):
-    if not instance.pk:
-        return  # new item, skip
+def track_price_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Record the replaced price in ItemPriceHistory when it changes.
 
-    try:
-        original = Item.objects.get(pk=instance.pk)
-    except Item.DoesNotExist:
+    The old price comes from Item.from_db; only an instance built by hand
+    with an existing pk needs a query. Bulk repricing goes through
+    pricing.reprice_items / reprice_queryset, which write history themselves.
+    """
+    if raw or not instance.pk:
+        return  # new item, skip
+    if update_fields is not None and 'item_price' not in update_fields:
         return
 
-    if original.item_price != instance.item_price:
+    old_price = getattr(instance, '_loaded_price', None)
+    if old_price is None:
+        old_price = Item.objects.filter(pk=instance.pk).values_list('item_price', flat=True).first()
+
+    if old_price is not None and old_price != instance.item_price:
         ItemPriceHistory.objects.create(
             item=instance,
-            price=original.item_price,  # ✅ use correct field name
+            price=old_price,  # ✅ use correct field name
             date=timezone.now()         # ✅ use correct field name
         )
+
+
+@receiver(post_save, sender=Item)
+def remember_saved_price(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._loaded_price = instance.item_price
+
+
+# Order totals and daily totals rollup
+
+def _cached_order(instance):
+    return instance.order if OrderItem.order.is_cached(instance) else None
+
+
+def _deleting_orders(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model is Order
+    return isinstance(origin, Order)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, raw=False, **kwargs):
+    """Apply the line's old-vs-new delta to its order and the daily rollup."""
+    if raw:
+        return
+    order = _cached_order(instance)
+    order_totals.order_item_saved(instance, order)
+    rollups.order_item_saved(instance, order)
+    instance._loaded_line = instance.line_snapshot()
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, origin=None, **kwargs):
+    # Lines removed by deleting their order don't need the order total fixed.
+    order = _cached_order(instance)
+    if not _deleting_orders(origin):
+        order_totals.order_item_deleted(instance, order)
+    rollups.order_item_deleted(instance, order)
+
+
+@receiver(post_save, sender=Expense)
+def rollup_expense_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.expense_saved(instance)
+    instance._loaded_totals = instance.totals_snapshot()
+
+
+@receiver(post_delete, sender=Expense)
+def rollup_expense_deleted(sender, instance, **kwargs):
+    rollups.expense_deleted(instance)
+
+
+# Cached admin recipients
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def reset_admin_user_ids(sender, **kwargs):
+    invalidate_admin_user_ids()
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def reset_role_cache(sender, instance, **kwargs):
+    clear_role_cache(instance.pk)
+    # Again after commit, in case a concurrent request re-cached the old name
+    transaction.on_commit(partial(clear_role_cache, instance.pk))
+
+
+# Catalog cache version
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, raw=False, **kwargs):
+    if not raw:
+        # After commit, so readers never cache the old catalog under the new version
+        transaction.on_commit(bump_catalog_version)
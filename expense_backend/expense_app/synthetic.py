@@ -0,0 +1,207 @@
+# expense_app/synthetic.py
+"""Synthetic history for benchmarking (``manage.py seed_perf``).
+
+The data is shaped like the real workload rather than uniform noise:
+
+- item popularity follows a Zipf-like curve, so a few items dominate;
+- each user has their own activity level, and weekends are quieter;
+- every order day has morning and evening counts per line;
+- item prices drift a few times a year, with ItemPriceHistory rows and
+  order line price snapshots that match the timeline;
+- users file an occasional expense with a long-tailed amount.
+
+Generation is deterministic for a given ``seed`` and is written a block of
+days at a time with the same bulk paths the importers use. The DailyTotal
+rollup is therefore maintained as the data goes in.
+"""
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .bulk import create_orders
+from .imports import write_expenses
+from .models import Category, Expense, Item, ItemPriceHistory, OrderItem, Role, User
+from .utils import invalidate_admin_user_ids
+
+PASSWORD = 'perf-password'
+DAYS_PER_BLOCK = 30
+CATEGORY_NAMES = ['Tea & Coffee', 'Snacks', 'Meals', 'Bakery', 'Drinks']
+EXPENSE_TYPES = [choice for choice, _ in Expense.EXPENSE_TYPE_CHOICES]
+
+
+class _PriceSchedule:
+    """Price changes for one item; ``price_on(day)`` is the price that day."""
+
+    def __init__(self, start_price, changes):
+        # changes: [(date, new_price)] sorted by date
+        self.start_price = start_price
+        self.changes = changes
+
+    def price_on(self, day):
+        price = self.start_price
+        for changed_on, new_price in self.changes:
+            if changed_on > day:
+                break
+            price = new_price
+        return price
+
+    @property
+    def current_price(self):
+        return self.changes[-1][1] if self.changes else self.start_price
+
+
+def _price_timelines(rng, count, first_day, last_day):
+    timelines = []
+    span = (last_day - first_day).days
+    for _ in range(count):
+        price = float(rng.choice([5, 8, 10, 12, 15, 20, 25, 30, 40, 60]))
+        changes = []
+        # Roughly one change a quarter, mostly upwards
+        for _ in range(max(span // 90, 0)):
+            changed_on = first_day + timedelta(days=rng.randint(1, span))
+            changes.append(changed_on)
+        changes.sort()
+        priced = []
+        current = price
+        for changed_on in changes:
+            current = round(max(1.0, current * rng.uniform(0.95, 1.15)), 2)
+            priced.append((changed_on, current))
+        timelines.append(_PriceSchedule(price, priced))
+    return timelines
+
+
+def _create_users(prefix, count):
+    admin_role, _ = Role.objects.get_or_create(role_name='Admin')
+    user_role, _ = Role.objects.get_or_create(role_name='User')
+    password = make_password(PASSWORD)
+    users = [User(
+        username=f'{prefix}_admin', email=f'{prefix}_admin@example.com',
+        name='Perf Admin', role=admin_role, password=password,
+    )]
+    users += [
+        User(
+            username=f'{prefix}_user{i}', email=f'{prefix}_user{i}@example.com',
+            name=f'Perf User {i}', role=user_role, password=password,
+        )
+        for i in range(count)
+    ]
+    users = User.objects.bulk_create(users)
+    # bulk_create skips the User signals that keep this cache current
+    invalidate_admin_user_ids()
+    return users
+
+
+def _create_catalog(rng, admin, timelines, first_day):
+    categories = Category.objects.bulk_create([
+        Category(category_name=name, created_user=admin) for name in CATEGORY_NAMES
+    ])
+    items = Item.objects.bulk_create([
+        Item(
+            category=rng.choice(categories),
+            created_user=admin,
+            item_name=f'Item {i}',
+            item_price=timeline.current_price,
+            created_date=timezone.make_aware(datetime.combine(first_day, time.min)),
+        )
+        for i, timeline in enumerate(timelines)
+    ])
+    # ItemPriceHistory keeps the price that was replaced on each change date
+    history = []
+    for item, timeline in zip(items, timelines):
+        previous = timeline.start_price
+        for changed_on, new_price in timeline.changes:
+            history.append(ItemPriceHistory(
+                item=item, price=previous,
+                date=timezone.make_aware(datetime.combine(changed_on, time(6))),
+            ))
+            previous = new_price
+    ItemPriceHistory.objects.bulk_create(history)
+    return items
+
+
+def _day_rows(rng, day, users, activity, items, weights, timelines, expense_rate):
+    weekend = day.weekday() >= 5
+    entries, expenses = [], []
+    for user in users:
+        chance = activity[user.id] * (0.4 if weekend else 1.0)
+        if rng.random() < chance:
+            picked = set()
+            for _ in range(rng.randint(1, 4)):
+                picked.add(rng.choices(range(len(items)), weights=weights)[0])
+            lines = []
+            for index in sorted(picked):
+                added = timezone.make_aware(datetime.combine(
+                    day, time(rng.randint(8, 11), rng.randint(0, 59)),
+                ))
+                lines.append(OrderItem(
+                    item=items[index],
+                    price=timelines[index].price_on(day),
+                    morning_count=rng.choice([0, 1, 1, 2, 2, 3]),
+                    evening_count=rng.choice([0, 0, 1, 1, 2]),
+                    added_date=added,
+                ))
+            entries.append((user.id, lines))
+        if rng.random() < expense_rate:
+            expenses.append(Expense(
+                user=user,
+                date=day,
+                description='Synthetic expense',
+                expense_type=rng.choice(EXPENSE_TYPES),
+                amount=round(rng.lognormvariate(4, 0.8), 2),
+                is_verified=rng.random() < 0.6,
+                is_refunded=rng.random() < 0.3,
+                created_date=timezone.make_aware(datetime.combine(day, time(rng.randint(12, 20)))),
+            ))
+    return entries, expenses
+
+
+def seed_perf(users=20, items=30, days=365, seed=42, prefix='perf', expense_rate=0.15, progress=None):
+    """Generate ``days`` days of history ending today; return row counts.
+
+    Creates ``<prefix>_admin`` plus ``users`` regular users (password
+    ``PASSWORD``), a catalog of ``items`` items, and their order lines and
+    expenses. ``progress`` is called with a message after each block of days.
+    """
+    rng = random.Random(seed)
+    last_day = timezone.localdate()
+    first_day = last_day - timedelta(days=days - 1)
+    timelines = _price_timelines(rng, items, first_day, last_day)
+
+    with db_transaction.atomic():
+        all_users = _create_users(prefix, users)
+        catalog = _create_catalog(rng, all_users[0], timelines, first_day)
+
+    # Zipf-like popularity and a per-user activity level
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(catalog))]
+    activity = {user.id: min(1.0, rng.lognormvariate(-0.5, 0.5)) for user in all_users}
+
+    counts = {'users': len(all_users), 'items': len(catalog), 'orders': 0, 'order_items': 0, 'expenses': 0}
+    day = first_day
+    while day <= last_day:
+        block_entries, block_expenses = [], []
+        for _ in range(DAYS_PER_BLOCK):
+            if day > last_day:
+                break
+            entries, expenses = _day_rows(
+                rng, day, all_users, activity, catalog, weights, timelines, expense_rate,
+            )
+            block_entries += entries
+            block_expenses += expenses
+            day += timedelta(days=1)
+
+        with db_transaction.atomic():
+            if block_entries:
+                create_orders(block_entries)
+            if block_expenses:
+                write_expenses(block_expenses)
+
+        counts['orders'] += len(block_entries)
+        counts['order_items'] += sum(len(lines) for _, lines in block_entries)
+        counts['expenses'] += len(block_expenses)
+        if progress:
+            progress(f"{min(day, last_day)}: {counts['orders']} orders, {counts['expenses']} expenses")
+
+    return counts
@@ -1,3 +1,1963 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from urllib.request import urlopen
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import channels_auth
+from .authentication import ClaimsJWTAuthentication, RoleJWTAuthentication
+from .bulk import OrderIngestError, create_orders, ingest_orders
+from .catalog import bump_catalog_version, catalog_version
+from .compression import DEFAULTS, CompressionMiddleware, available_codecs, select_codec
+from . import metrics
+from .fast_serializers import EXPENSE_VALUES, ORDER_VALUES, serialize_expenses, serialize_orders
+from .filters import apply_report_filters, day_filter
+from . import outbox
+from . import renderers
+from .order_totals import apply_order_delta, reconcile_orders, suspend_order_totals
+from .pagination import decode_cursor, decode_key, encode_cursor, encode_key, paginate_queryset
+from .permissions import ROLE_CACHE_TIMEOUT, is_admin, role_name_for
+from .pricing import PriceTimeline, reprice_items, reprice_queryset, resolve_prices
+from .rollups import BULK_DELTA_THRESHOLD, apply_daily_deltas, check_daily_totals, compute_daily_totals, local_date
+from .routing import websocket_urlpatterns
+from .serializers import ExpenseSerializer, MyTokenObtainPairSerializer, OrderSerializer
+from .utils import get_admin_user_ids
+from .models import (
+    Category, DailyTotal, Expense, Item, ItemPriceHistory, Notification, NotificationOutbox, Order, OrderItem, Role,
+    Transaction, TransactionOrder, User,
+)
+
+
+def query_plan(queryset):
+    """Return the database's plan for ``queryset`` as one lowercase string.
+
+    SQLite answers with ``EXPLAIN QUERY PLAN``; PostgreSQL with ``EXPLAIN``,
+    where sequential scans are disabled for the test so the planner does not
+    pick them just because the test tables are tiny.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain().lower()
+
+
+def sql_plan(sql):
+    """``query_plan`` for captured SQL, such as a view's queries."""
+    prefix = 'EXPLAIN ' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(prefix + sql)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall()).lower()
+
+
+class HotPathIndexTests(TestCase):
+    """The filters behind the busiest endpoints must be answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(
+            username='alice', email='alice@example.com', password='pw', role=role,
+        )
+        category = Category.objects.create(category_name='Drinks', created_user=cls.user)
+        item = Item.objects.create(category=category, created_user=cls.user, item_name='Tea', item_price=10)
+        start = timezone.now() - timedelta(days=60)
+        for day in range(60):
+            when = start + timedelta(days=day)
+            order = Order.objects.create(created_user=cls.user, calculated_price=0)
+            OrderItem.objects.create(order=order, item=item, price=10, morning_count=1, added_date=when)
+            expense = Expense.objects.create(user=cls.user, date=when.date(), amount=5)
+            txn = Transaction.objects.create(user=cls.user, total_price=5, from_date=when, to_date=when)
+            TransactionOrder.objects.create(transaction=txn, expense=expense, order_id=order)
+            Notification.objects.create(user=cls.user, recipient=cls.user, message=f'n{day}', is_read=day % 2 == 0)
+        # Planner statistics, as a live database has; without them SQLite
+        # cannot tell the partial unread index is the smaller one.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = query_plan(queryset)
+        self.assertIn(index_name.lower(), plan, plan)
+
+    def view_plans(self, method, path):
+        """``{sql: plan}`` for the queries ``path`` runs on the app's tables."""
+        client = jwt_client(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(path)
+        self.assertLess(response.status_code, 300)
+        statements = [query['sql'] for query in queries if 'expense_app_' in query['sql']]
+        return {sql: sql_plan(sql) for sql in statements if 'expense_app_role' not in sql}
+
+    def test_month_filter_is_a_range_on_added_date(self):
+        queryset = apply_report_filters(
+            OrderItem.objects.all(), {'month': date.today().strftime('%Y-%m')},
+            date_field='added_date', user_field='order__created_user__username',
+        )
+        sql = str(queryset.query).lower()
+        self.assertNotIn('strftime', sql)
+        self.assertNotIn('extract', sql)
+        self.assertUsesIndex(queryset, 'orderitem_added_date_idx')
+
+    def test_single_day_filter_uses_added_date_index(self):
+        queryset = OrderItem.objects.filter(**day_filter('added_date', date.today().isoformat()))
+        self.assertUsesIndex(queryset, 'orderitem_added_date_idx')
+
+    def test_latest_order_for_user_uses_index(self):
+        queryset = Order.objects.filter(created_user=self.user).order_by('-created_date')[:1]
+        self.assertUsesIndex(queryset, 'order_user_created_idx')
+
+    def test_expenses_for_user_and_dates_use_index(self):
+        queryset = Expense.objects.filter(
+            user=self.user, date__gte=date.today() - timedelta(days=7), date__lt=date.today(),
+        )
+        self.assertUsesIndex(queryset, 'expense_user_date_idx')
+
+    def test_notification_list_uses_notification_indexes(self):
+        plans = self.view_plans('get', '/api/notifications/')
+        [(count_sql, count_plan)] = [(sql, plan) for sql, plan in plans.items() if 'count(' in sql.lower()]
+        [(list_sql, list_plan)] = [(sql, plan) for sql, plan in plans.items() if sql != count_sql]
+        # The unread badge count only reads the partial index of unread rows
+        self.assertIn('notif_unread_idx', count_plan, count_sql)
+        self.assertIn('notif_recipient_read_idx', list_plan, list_sql)
+
+    def test_transaction_lookup_by_expense_uses_fk_index(self):
+        expense = Expense.objects.first()
+        plan = query_plan(TransactionOrder.objects.filter(expense=expense))
+        self.assertIn('transactionorder_expense_id', plan, plan)
+
+    def test_available_dates_are_distinct_and_descending(self):
+        response = jwt_client(self.user).get('/api/orders/available-dates/')
+        self.assertEqual(len(response.data), 60)
+        self.assertEqual(response.data, sorted(set(response.data), reverse=True))
+
+    def test_available_dates_read_only_the_added_date_index(self):
+        [plan] = self.view_plans('get', '/api/orders/available-dates/').values()
+        self.assertIn('orderitem_added_date_idx', plan)
+
+
+def seed_history(users, items, admin, days, first_day=0):
+    """Bulk-create ``days`` days of history for every user.
+
+    Each user gets one order with a line per item, one expense with its
+    transaction, and one notification to ``admin`` per day; every item gets a
+    price history entry per day.
+    """
+    now = timezone.now()
+    entries, expenses, notifications, history = [], [], [], []
+    for day in range(first_day, first_day + days):
+        when = now - timedelta(days=day)
+        for user in users:
+            lines = [
+                OrderItem(item=item, price=item.item_price, morning_count=1, evening_count=2, added_date=when)
+                for item in items
+            ]
+            entries.append((user.id, lines))
+            expenses.append(Expense(user=user, date=when.date(), amount=20, created_date=when))
+            notifications.append(Notification(user=user, recipient=admin, message=f'{user.username} day {day}'))
+        history.extend(ItemPriceHistory(item=item, price=item.item_price, date=when) for item in items)
+
+    orders = create_orders(entries)
+    Expense.objects.bulk_create(expenses)
+    transactions = Transaction.objects.bulk_create([
+        Transaction(user_id=expense.user_id, total_price=expense.amount, from_date=now, to_date=now)
+        for expense in expenses
+    ])
+    TransactionOrder.objects.bulk_create([
+        TransactionOrder(transaction=txn, expense=expense, order_id=order)
+        for expense, order, txn in zip(expenses, orders, transactions)
+    ])
+    Notification.objects.bulk_create(notifications)
+    ItemPriceHistory.objects.bulk_create(history)
+
+
+def jwt_client(user):
+    client = APIClient()
+    token = MyTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class QueryBudgetTests(TestCase):
+    """Every URL in expense_app/urls.py runs a fixed number of queries.
+
+    Budgets are upper bounds for a cold cache. Read endpoints are measured
+    twice, before and after the history is doubled, and must run the same
+    number of queries both times, so an N+1 fails here rather than in
+    production.
+    """
+
+    DAYS = 15
+
+    # name -> (client, url, query budget); ``t`` is the test case
+    READS = {
+        'role-list': ('admin', lambda t: '/api/roles/', 2),
+        'role-detail': ('admin', lambda t: f'/api/roles/{t.user_role.pk}/', 2),
+        'category-list': ('user', lambda t: '/api/categories/', 2),
+        'category-list-paginated': ('user', lambda t: '/api/categories/?limit=2', 2),
+        'category-detail': ('admin', lambda t: f'/api/categories/{t.category.pk}/', 2),
+        'item-list': ('user', lambda t: '/api/items/', 2),
+        'item-list-paginated': ('user', lambda t: '/api/items/?limit=2', 2),
+        'item-detail': ('admin', lambda t: f'/api/items/{t.items[0].pk}/', 2),
+        'item-price-history': ('user', lambda t: f'/api/items/{t.items[0].pk}/price-history/', 2),
+        'item-prices-as-of': ('user', lambda t: f'/api/items/prices-as-of/?at={date.today().isoformat()}', 3),
+        'expense-list': ('user', lambda t: '/api/expenses/', 2),
+        'expense-list-paginated': ('user', lambda t: '/api/expenses/?limit=20', 2),
+        'expense-detail': ('user', lambda t: f'/api/expenses/{t.expense.pk}/', 3),
+        'my-expenses': ('user', lambda t: '/api/expenses/mydata/', 1),
+        'my-expenses-paginated': ('user', lambda t: '/api/expenses/mydata/?limit=20', 1),
+        'profile': ('user', lambda t: '/api/profile/', 1),
+        'order-list': ('user', lambda t: '/api/orders/', 3),
+        'order-list-admin': ('admin', lambda t: '/api/orders/', 3),
+        'order-list-paginated': ('user', lambda t: '/api/orders/?limit=20', 3),
+        'order-detail': ('user', lambda t: f'/api/orders/{t.order.pk}/', 3),
+        'order-item-list': ('user', lambda t: '/api/order-items/', 2),
+        'order-item-list-paginated': ('user', lambda t: '/api/order-items/?limit=20', 2),
+        'order-item-detail': ('user', lambda t: f'/api/order-items/{t.line.pk}/', 3),
+        'transaction-list': ('user', lambda t: '/api/transactions/', 2),
+        'transaction-list-paginated': ('user', lambda t: '/api/transactions/?limit=20', 2),
+        'transaction-detail': ('user', lambda t: f'/api/transactions/{t.transaction.pk}/', 2),
+        'notification-list': ('admin', lambda t: '/api/notifications/', 2),
+        'notification-list-paginated': ('admin', lambda t: '/api/notifications/?limit=20', 2),
+        'notification-detail': ('admin', lambda t: f'/api/notifications/{t.notification.pk}/', 2),
+        'daily-summary': ('user', lambda t: '/api/daily-summary/', 1),
+        'order-summary': ('user', lambda t: '/api/order-summary/', 1),
+        'order-summary-paginated': ('admin', lambda t: '/api/order-summary/?limit=5', 2),
+        'order-summary-filtered': (
+            'admin', lambda t: f'/api/order-summary/?limit=5&user={t.user.username}&month={date.today():%Y-%m}', 2,
+        ),
+        'orders-by-date': (
+            'user', lambda t: f'/api/orders-by-date/?date={date.today().isoformat()}&username={t.user.username}', 2,
+        ),
+        'grouped-by-date': ('user', lambda t: '/api/orders/grouped-by-date/', 4),
+        'grouped-by-date-month': (
+            'user', lambda t: f"/api/orders/grouped-by-date/?month={date.today().strftime('%Y-%m')}", 4,
+        ),
+        'available-dates': ('user', lambda t: '/api/orders/available-dates/', 1),
+        'export-expenses': ('admin', lambda t: '/api/export/expenses/', 2),
+        'export-orders': ('admin', lambda t: '/api/export/orders/?output=ndjson', 2),
+        'export-order-items': ('admin', lambda t: '/api/export/order-items/', 2),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        admin_role = Role.objects.create(role_name='Admin')
+        cls.user_role = Role.objects.create(role_name='User')
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pw', role=admin_role,
+        )
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com', password='pw', role=cls.user_role,
+            )
+            for i in range(5)
+        ]
+        cls.user = cls.users[0]
+        cls.category = Category.objects.create(category_name='Snacks', created_user=cls.admin)
+        cls.items = [
+            Item.objects.create(category=cls.category, created_user=cls.admin, item_name=f'Item {i}', item_price=5 + i)
+            for i in range(4)
+        ]
+        seed_history(cls.users, cls.items, cls.admin, cls.DAYS)
+
+        cls.order = Order.objects.filter(created_user=cls.user).first()
+        cls.line = cls.order.orderitem_set.first()
+        cls.expense = Expense.objects.filter(user=cls.user).first()
+        cls.transaction = Transaction.objects.filter(user=cls.user).first()
+        cls.notification = Notification.objects.filter(recipient=cls.admin).first()
+
+    def setUp(self):
+        self.clients = {'admin': jwt_client(self.admin), 'user': jwt_client(self.user)}
+
+    def count_queries(self, client, method, url, data=None, **extra):
+        """Run one request against a cold cache and return its query count."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {url}: {response.status_code}')
+        return len(queries)
+
+    def assertWithinBudget(self, budget, client, method, url, data=None, **extra):
+        count = self.count_queries(client, method, url, data, **extra)
+        self.assertLessEqual(count, budget, f'{method.upper()} {url} ran {count} queries (budget {budget})')
+
+    def test_read_budgets_do_not_grow_with_data(self):
+        def measure():
+            return {
+                name: self.count_queries(self.clients[who], 'get', url(self))
+                for name, (who, url, _) in self.READS.items()
+            }
+
+        before = measure()
+        seed_history(self.users, self.items, self.admin, self.DAYS, first_day=self.DAYS)
+        after = measure()
+
+        for name, (_, _, budget) in self.READS.items():
+            with self.subTest(name):
+                self.assertEqual(after[name], before[name], 'query count grew with the data')
+                self.assertLessEqual(after[name], budget)
+
+    def test_auth_budgets(self):
+        client = APIClient()
+        self.assertWithinBudget(4, client, 'post', '/api/register/', {
+            'username': 'new', 'email': 'new@example.com', 'password': 'pw-123456',
+        }, format='json')
+        self.assertWithinBudget(5, client, 'post', '/api/login/', {
+            'email': self.user.email, 'password': 'pw',
+        }, format='json')
+        refresh = str(MyTokenObtainPairSerializer.get_token(self.user))
+        self.assertWithinBudget(8, self.clients['user'], 'post', '/api/logout/', {
+            'refresh_token': refresh,
+        }, format='json')
+
+    def test_profile_budgets(self):
+        client = self.clients['user']
+        self.assertWithinBudget(2, client, 'patch', '/api/update-profile-picture/', {'name': 'Alice'})
+        self.assertWithinBudget(2, client, 'put', '/api/profile/', {'name': 'Alice B'})
+
+    def test_role_budgets(self):
+        client = self.clients['admin']
+        self.assertWithinBudget(2, client, 'post', '/api/roles/', {'role_name': 'Auditor'}, format='json')
+        role = Role.objects.create(role_name='Temp')
+        self.assertWithinBudget(3, client, 'put', f'/api/roles/{role.pk}/', {'role_name': 'Temp 2'}, format='json')
+        self.assertWithinBudget(4, client, 'delete', f'/api/roles/{role.pk}/')
+
+    def test_catalog_budgets(self):
+        client = self.clients['admin']
+        self.assertWithinBudget(3, client, 'post', '/api/categories/', {'category_name': 'Drinks'}, format='json')
+        category = Category.objects.create(category_name='Temp', created_user=self.admin)
+        self.assertWithinBudget(
+            3, client, 'put', f'/api/categories/{category.pk}/', {'category_name': 'Temp 2'}, format='json',
+        )
+        item_data = {'category': category.pk, 'item_name': 'Tea', 'item_price': 12}
+        self.assertWithinBudget(3, client, 'post', '/api/items/', item_data, format='json')
+        item = Item.objects.create(category=category, created_user=self.admin, item_name='Temp', item_price=3)
+        self.assertWithinBudget(5, client, 'put', f'/api/items/{item.pk}/', item_data, format='json')
+        self.assertWithinBudget(4, client, 'patch', f'/api/items/{item.pk}/', {'item_price': 14}, format='json')
+        prices = {str(other.pk): 99 for other in self.items}
+        self.assertWithinBudget(6, client, 'post', '/api/items/reprice/', {'prices': prices}, format='json')
+        self.assertWithinBudget(5, client, 'delete', f'/api/items/{item.pk}/')
+        self.assertWithinBudget(7, client, 'delete', f'/api/categories/{category.pk}/')
+
+    def test_expense_budgets(self):
+        self.assertWithinBudget(11, self.clients['user'], 'post', '/api/expenses/', {
+            'date': date.today().isoformat(), 'amount': 42, 'expense_type': 'Product', 'description': 'Lunch',
+        }, format='json')
+        expense = Expense.objects.filter(user=self.user).latest('id')
+        self.assertWithinBudget(15, self.clients['admin'], 'put', f'/api/expenses/{expense.pk}/', {
+            'amount': 50, 'is_verified': True,
+        }, format='json')
+        self.assertWithinBudget(7, self.clients['user'], 'delete', f'/api/expenses/{expense.pk}/')
+
+    def test_order_budgets(self):
+        client = self.clients['user']
+        now = timezone.now().isoformat()
+        order_items = [{'item': item.pk, 'count': 2, 'added_date': now} for item in self.items]
+        self.assertWithinBudget(9, client, 'post', '/api/orders/', {'order_items': order_items}, format='json')
+        self.assertWithinBudget(9, client, 'post', '/api/orders/', {
+            'orders': [{'order_items': order_items}, {'order_items': order_items}],
+        }, format='json')
+
+        order = Order.objects.filter(created_user=self.user).latest('id')
+        lines = list(order.orderitem_set.all())
+        updated = [{'id': line.pk, 'count': 4} for line in lines[:-1]]
+        self.assertWithinBudget(16, client, 'put', f'/api/orders/{order.pk}/', {'order_items': updated}, format='json')
+        self.assertWithinBudget(12, client, 'delete', f'/api/orders/{order.pk}/delete/')
+
+    def test_order_item_budgets(self):
+        client = self.clients['user']
+        self.assertWithinBudget(7, client, 'post', '/api/order-items/', {
+            'order': self.order.pk, 'item': self.items[0].pk, 'count': 2,
+            'added_date': timezone.now().isoformat(),
+        }, format='json')
+        line = OrderItem.objects.filter(order=self.order).latest('id')
+        self.assertWithinBudget(6, client, 'put', f'/api/order-items/{line.pk}/', {'count': 6}, format='json')
+        self.assertWithinBudget(6, client, 'patch', f'/api/order-items/{line.pk}/', {'count': 2}, format='json')
+        self.assertWithinBudget(6, client, 'delete', f'/api/order-items/{line.pk}/')
+
+    def test_delete_orders_by_date_budget(self):
+        day = (date.today() - timedelta(days=3)).isoformat()
+        self.assertWithinBudget(
+            15, self.clients['user'], 'delete', f'/api/orders/delete-by-date/?date={day}&username={self.user.username}',
+        )
+
+    def test_transaction_budgets(self):
+        client = self.clients['user']
+        now = timezone.now().isoformat()
+        self.assertWithinBudget(2, client, 'post', '/api/transactions/', {
+            'total_price': 10, 'status': 'Pending', 'from_date': now, 'to_date': now,
+        }, format='json')
+        transaction = Transaction.objects.filter(user=self.user).latest('id')
+        self.assertWithinBudget(3, client, 'put', f'/api/transactions/{transaction.pk}/', {'remarks': 'ok'}, format='json')
+        self.assertWithinBudget(4, client, 'delete', f'/api/transactions/{transaction.pk}/')
+
+    def test_notification_budgets(self):
+        client = self.clients['admin']
+        self.assertWithinBudget(3, client, 'patch', f'/api/notifications/{self.notification.pk}/')
+        self.assertWithinBudget(2, client, 'patch', '/api/notifications/mark-all-read/')
+        self.assertWithinBudget(2, client, 'delete', '/api/notifications/clear-all/')
+
+    def test_import_budget(self):
+        sheet = SimpleUploadedFile(
+            'expenses.csv',
+            b'date,amount,description\n2024-01-01,10,Tea\n2024-01-02,12,Coffee\n2024-01-03,9,Snacks\n',
+            content_type='text/csv',
+        )
+        self.assertWithinBudget(22, self.clients['admin'], 'post', '/api/import/expenses/', {'file': sheet})
+
+
+class RequestProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(username='bob', email='bob@example.com', password='pw', role=role)
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        self.settings_override = override_settings(REQUEST_PROFILING={
+            'ENABLED': True,
+            'PROFILE_TOKEN': 'secret',
+            'PROFILE_DIR': self.profile_dir,
+            'PROFILE_KEEP': 2,
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.api = jwt_client(self.user)
+
+    def test_server_timing_reports_queries(self):
+        response = self.api.get('/api/expenses/mydata/')
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        # Statements are only shown to trusted requests
+        self.assertNotIn('sql-1', timing)
+        self.assertNotIn('X-Profile-File', response)
+
+    def test_trusted_request_is_profiled_and_rotated(self):
+        for _ in range(3):
+            response = self.api.get('/api/expenses/mydata/', HTTP_X_PROFILE='secret')
+            self.assertIn('sql-1;dur=', response['Server-Timing'])
+            self.assertTrue(os.path.exists(os.path.join(self.profile_dir, response['X-Profile-File'])))
+        self.assertEqual(len(os.listdir(self.profile_dir)), 2)
+
+    def test_wrong_token_is_not_profiled(self):
+        response = self.api.get('/api/expenses/mydata/', HTTP_X_PROFILE='guess')
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
+class MetricsTests(TestCase):
+    def test_histogram_exposition(self):
+        registry = metrics.Registry()
+        histogram = metrics.Histogram('demo_seconds', 'Demo.', ['view'], buckets=(0.1, 1), registry=registry)
+        histogram.observe(0.05, view='/a')
+        histogram.observe(0.5, view='/a')
+        histogram.observe(3, view='/a')
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP demo_seconds Demo.',
+            '# TYPE demo_seconds histogram',
+            'demo_seconds_bucket{view="/a",le="0.1"} 1',
+            'demo_seconds_bucket{view="/a",le="1"} 2',
+            'demo_seconds_bucket{view="/a",le="+Inf"} 3',
+            'demo_seconds_sum{view="/a"} 3.55',
+            'demo_seconds_count{view="/a"} 3',
+        ])
+
+    @override_settings(METRICS={'ENABLED': True, 'TOKEN': '', 'PUBLIC': True})
+    def test_requests_are_recorded_per_view(self):
+        role = Role.objects.create(role_name='User')
+        user = User.objects.create_user(username='carol', email='carol@example.com', password='pw', role=role)
+        before = metrics.REQUEST_LATENCY.count(view='/api/expenses/mydata/', method='GET')
+        jwt_client(user).get('/api/expenses/mydata/')
+
+        self.assertEqual(metrics.REQUEST_LATENCY.count(view='/api/expenses/mydata/', method='GET'), before + 1)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('expense_http_request_db_queries_bucket{view="/api/expenses/mydata/",method="GET"', body)
+        self.assertIn('expense_notification_outbox_pending 0', body)
+
+    @override_settings(METRICS={'ENABLED': True, 'TOKEN': 'scrape'})
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+
+    @override_settings(METRICS={'ENABLED': True, 'TOKEN': ''})
+    def test_worker_exporter_is_loopback_only_unless_public(self):
+        server = metrics.start_http_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+        self.assertEqual(host, '127.0.0.1')
+        with urlopen(f'http://127.0.0.1:{port}/') as response:
+            self.assertIn(b'expense_http_requests_total', response.read())
+
+        for address in ('0.0.0.0', '', '::', '192.0.2.10'):
+            with self.subTest(address=address), self.assertRaises(ImproperlyConfigured):
+                metrics.start_http_server(0, address)
+        with self.assertRaisesMessage(CommandError, 'METRICS_PUBLIC'):
+            call_command('deliver_notifications', '--once', '--metrics-port', '0', '--metrics-address', '0.0.0.0')
+
+        with self.settings(METRICS={'ENABLED': True, 'TOKEN': '', 'PUBLIC': True}):
+            public = metrics.start_http_server(0, '0.0.0.0')
+        public.shutdown()
+        public.server_close()
+
+    @override_settings(METRICS={'ENABLED': True, 'TOKEN': ''})
+    def test_closed_without_a_token_unless_public(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with self.settings(METRICS={'ENABLED': True, 'TOKEN': '', 'PUBLIC': True}):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class PriceSnapshotTests(TestCase):
+    """Order totals come from OrderItem.price, not the item's current price."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(username='dave', email='dave@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Drinks', created_user=cls.user)
+        cls.item = Item.objects.create(category=category, created_user=cls.user, item_name='Tea', item_price=10)
+
+    def test_price_change_does_not_rewrite_past_totals(self):
+        order = Order.objects.create(created_user=self.user, calculated_price=0)
+        OrderItem.objects.create(order=order, item=self.item, price=10, morning_count=2, evening_count=1)
+        self.item.item_price = 25
+        self.item.save()
+
+        client = jwt_client(self.user)
+        grouped = client.get('/api/orders/grouped-by-date/').json()
+        [row] = grouped['results'][timezone.localdate().isoformat()]
+        self.assertEqual((row['item_name'], row['price'], row['total']), ('Tea', 10.0, 30.0))
+        self.assertEqual(grouped['total_price'], 30.0)
+        [summary] = client.get('/api/order-summary/').json()
+        self.assertEqual(summary['total_amount'], 30.0)
+
+    def test_backfill_prices_lines_from_history(self):
+        from importlib import import_module
+        from django.apps import apps
+        from .models import DailyTotal
+
+        backfill = import_module('expense_app.migrations.0023_backfill_orderitem_price').backfill_line_prices
+        now = timezone.now()
+        # 12 until three days ago, 8 until yesterday, 10 since
+        ItemPriceHistory.objects.create(item=self.item, price=12, date=now - timedelta(days=3))
+        ItemPriceHistory.objects.create(item=self.item, price=8, date=now - timedelta(days=1))
+        lines = {}
+        for days_ago in (5, 2, 0):
+            order = Order.objects.create(created_user=self.user, calculated_price=0)
+            lines[days_ago] = OrderItem.objects.create(
+                order=order, item=self.item, price=0, morning_count=1, evening_count=1,
+                added_date=now - timedelta(days=days_ago, minutes=1),
+            )
+
+        backfill(apps, None)
+
+        for days_ago, expected in ((5, 12), (2, 8), (0, 10)):
+            line = OrderItem.objects.select_related('order').get(pk=lines[days_ago].pk)
+            self.assertEqual(line.price, expected)
+            self.assertEqual(line.order.calculated_price, expected * 2)
+            total = DailyTotal.objects.get(user=self.user, date=timezone.localdate(line.added_date))
+            self.assertEqual(total.order_total, expected * 2)
+
+
+class PriceTimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(username='erin', email='erin@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=cls.user)
+        cls.tea = Item.objects.create(category=category, created_user=cls.user, item_name='Tea', item_price=10)
+        cls.cake = Item.objects.create(category=category, created_user=cls.user, item_name='Cake', item_price=40)
+        cls.change = timezone.make_aware(datetime(2024, 3, 10, 6, 0))
+        # Tea: 6 until 2024-03-01, 8 until 2024-03-10 06:00, 10 since
+        ItemPriceHistory.objects.create(item=cls.tea, price=6, date=timezone.make_aware(datetime(2024, 3, 1)))
+        ItemPriceHistory.objects.create(item=cls.tea, price=8, date=cls.change)
+
+    def test_price_at(self):
+        timeline = PriceTimeline.load()
+        second = timedelta(seconds=1)
+        self.assertEqual(timeline.price_at(self.tea.pk, date(2024, 2, 1)), 6)
+        self.assertEqual(timeline.price_at(self.tea.pk, self.change - second), 8)
+        self.assertEqual(timeline.price_at(self.tea.pk, self.change), 10)
+        # A date is priced at the end of the day
+        self.assertEqual(timeline.price_at(self.tea.pk, date(2024, 3, 10)), 10)
+        self.assertEqual(timeline.price_at(self.tea.pk, date(2024, 3, 9)), 8)
+        self.assertEqual(timeline.price_at(self.cake.pk, date(2020, 1, 1)), 40)
+        self.assertIsNone(timeline.price_at(0, date(2024, 1, 1)))
+
+    def test_batch_resolution_runs_two_queries(self):
+        pairs = [(self.tea.pk, self.change - timedelta(hours=h)) for h in range(1, 501)]
+        pairs += [(self.cake.pk, self.change)] * 500
+        with self.assertNumQueries(2):
+            prices = resolve_prices(pairs)
+        self.assertEqual(prices[0], 8)
+        self.assertEqual(prices[499], 6)
+        self.assertEqual(set(prices[500:]), {40})
+
+    def test_prices_as_of_endpoint(self):
+        client = jwt_client(self.user)
+        response = client.get('/api/items/prices-as-of/', {'at': '2024-03-05', 'item': self.tea.pk})
+        self.assertEqual(response.json()['results'], [{'item_id': self.tea.pk, 'item_name': 'Tea', 'price': 8}])
+        response = client.get('/api/items/prices-as-of/', {'at': '2024-03-05'})
+        self.assertEqual([row['price'] for row in response.json()['results']], [40, 8])
+
+        response = client.post('/api/items/prices-as-of/', {'lookups': [
+            {'item': self.tea.pk, 'at': '2024-02-01T12:00:00Z'},
+            {'item': self.cake.pk, 'at': '2024-02-01'},
+        ]}, format='json')
+        self.assertEqual(response.json(), {'prices': [6, 40]})
+
+        self.assertEqual(client.get('/api/items/prices-as-of/', {'at': 'soon'}).status_code, 400)
+        response = client.post('/api/items/prices-as-of/', {'lookups': [{'item': 'tea'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PriceTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(username='fay', email='fay@example.com', password='pw', role=role)
+        cls.category = Category.objects.create(category_name='Drinks', created_user=cls.user)
+
+    def make_items(self, *prices):
+        return [
+            Item.objects.create(category=self.category, created_user=self.user, item_name=f'Item {i}', item_price=price)
+            for i, price in enumerate(prices)
+        ]
+
+    def test_loaded_price_avoids_select(self):
+        [item] = self.make_items(10)
+        item = Item.objects.get(pk=item.pk)
+        item.item_price = 12
+        with self.assertNumQueries(2):  # UPDATE + history INSERT
+            item.save()
+        item.item_name = 'Renamed'
+        with self.assertNumQueries(1):
+            item.save()
+        self.assertEqual(list(ItemPriceHistory.objects.values_list('price', flat=True)), [10])
+
+    def test_unloaded_instance_still_tracked(self):
+        [item] = self.make_items(10)
+        Item(pk=item.pk, category=self.category, created_user=self.user, item_name='Tea', item_price=11).save()
+        self.assertEqual(list(ItemPriceHistory.objects.values_list('price', flat=True)), [10])
+
+    def test_single_history_row_per_api_update(self):
+        admin_role = Role.objects.create(role_name='Admin')
+        admin = User.objects.create_user(username='gus', email='gus@example.com', password='pw', role=admin_role)
+        [item] = self.make_items(10)
+        jwt_client(admin).patch(f'/api/items/{item.pk}/', {'item_price': 15}, format='json')
+        self.assertEqual(ItemPriceHistory.objects.filter(item=item).count(), 1)
+
+    def test_reprice_items(self):
+        tea, cake, bun = self.make_items(10, 40, 5)
+        # SELECT, UPDATE and INSERT, plus the savepoint pair inside the test transaction
+        with self.assertNumQueries(5):
+            changed = reprice_items({tea.pk: 11, cake.pk: 40, bun.pk: 6})
+        self.assertEqual(changed, 2)
+        self.assertEqual(
+            dict(Item.objects.values_list('item_name', 'item_price')),
+            {'Item 0': 11, 'Item 1': 40, 'Item 2': 6},
+        )
+        self.assertEqual(sorted(ItemPriceHistory.objects.values_list('item_id', 'price')), [(tea.pk, 10), (bun.pk, 5)])
+
+    def test_reprice_queryset(self):
+        tea, cake = self.make_items(10, 40)
+        with self.assertNumQueries(6):
+            changed = reprice_queryset(Item.objects.filter(category=self.category), F('item_price') * 2)
+        self.assertEqual(changed, 2)
+        self.assertEqual(Item.objects.get(pk=tea.pk).item_price, 20)
+        self.assertEqual(sorted(ItemPriceHistory.objects.values_list('price', flat=True)), [10, 40])
+
+
+    def test_catalog_version_bumps_after_commit(self):
+        [tea] = self.make_items(10)
+        version = catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            tea.item_name = 'Green tea'
+            tea.save()
+            reprice_items({tea.pk: 12})
+            reprice_queryset(Item.objects.filter(pk=tea.pk), 14)
+            self.assertEqual(catalog_version(), version)
+        self.assertEqual(callbacks, [bump_catalog_version] * 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(catalog_version(), version + 3)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        role = Role.objects.create(role_name='User')
+        self.user = User.objects.create_user(username='gil', email='gil@example.com', password='pw', role=role)
+        self.category = Category.objects.create(category_name='Drinks', created_user=self.user)
+        self.tea = Item.objects.create(category=self.category, created_user=self.user, item_name='Tea', item_price=10)
+        self.client = jwt_client(self.user)
+
+    def test_etag_round_trip(self):
+        for url in ('/api/items/', '/api/categories/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                self.assertIn('Accept', response['Vary'])
+
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertIn('Accept', response['Vary'])
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+                response = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_saves_serve_a_fresh_list_after_commit(self):
+        first = self.client.get('/api/items/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.item_name = 'Green tea'
+            self.tea.save()
+        response = self.client.get('/api/items/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual([item['item_name'] for item in response.json()], ['Green tea'])
+
+        etag = self.client.get('/api/categories/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(category_name='Snacks', created_user=self.user)
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(sorted(category['category_name'] for category in response.json()), ['Drinks', 'Snacks'])
+
+    def test_paginated_requests_skip_the_cache(self):
+        self.client.get('/api/items/')
+        # Rename without running the on-commit bump: the cached list is stale
+        Item.objects.filter(pk=self.tea.pk).update(item_name='Green tea')
+        self.assertEqual(self.client.get('/api/items/').json()[0]['item_name'], 'Tea')
+
+        response = self.client.get('/api/items/', {'limit': 10})
+        self.assertNotIn('ETag', response)
+        self.assertEqual([item['item_name'] for item in response.json()['results']], ['Green tea'])
+
+
+class OrderSummaryTests(TestCase):
+    DAYS = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.users = [
+            User.objects.create_user(username=f'sum{i}', email=f'sum{i}@example.com', password='pw', role=role)
+            for i in range(3)
+        ]
+        category = Category.objects.create(category_name='Snacks', created_user=cls.users[0])
+        items = [
+            Item.objects.create(category=category, created_user=cls.users[0], item_name=f'Item {i}', item_price=5 + i)
+            for i in range(2)
+        ]
+        seed_history(cls.users, items, cls.users[0], cls.DAYS)
+
+    def setUp(self):
+        self.client = jwt_client(self.users[0])
+
+    def test_one_row_per_date_and_user(self):
+        rows = self.client.get('/api/order-summary/').json()
+        self.assertEqual(len(rows), self.DAYS * len(self.users))
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row['date'], row['user']), reverse=True))
+        # Two lines of three units each, at 5 and 6
+        self.assertEqual({(row['total_count'], row['total_amount']) for row in rows}, {(6, 33.0)})
+        first = rows[0]
+        order = Order.objects.get(pk=first['order_id'])
+        self.assertEqual(order.created_user.username, first['user'])
+
+    def test_pages_match_the_full_summary(self):
+        expected = self.client.get('/api/order-summary/').json()
+        pages, url = [], '/api/order-summary/?limit=4'
+        while url:
+            body = self.client.get(url).json()
+            pages += body['results']
+            url = body['next'] and f"/api/order-summary/?limit=4&cursor={body['next']}"
+        self.assertEqual(pages, expected)
+
+    def test_no_next_page_when_the_last_page_is_full(self):
+        # One row per day for a single user: pages of 3 end exactly on day 6
+        first = self.client.get('/api/order-summary/', {'user': 'sum1', 'limit': 3}).json()
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get('/api/order-summary/', {'user': 'sum1', 'limit': 3, 'cursor': first['next']}).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+
+        rows = self.client.get('/api/order-summary/', {'limit': self.DAYS * len(self.users)}).json()
+        self.assertIsNone(rows['next'])
+
+    def test_invalid_cursors_are_not_found(self):
+        for cursor in ('garbage', encode_key('not-a-date', 'sum1'), encode_key(date.today().isoformat(), 7)):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/order-summary/', {'limit': 3, 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/orders/grouped-by-date/', {'cursor': 'yesterday'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_filters(self):
+        start = (date.today() - timedelta(days=2)).isoformat()
+        rows = self.client.get('/api/order-summary/', {'user': 'sum1', 'start_date': start}).json()
+        self.assertEqual({row['user'] for row in rows}, {'sum1'})
+        self.assertEqual(len(rows), 3)
+
+
+class FastSerializerTests(TestCase):
+    """The values() fast path must render exactly what the DRF serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(
+            username='hal', email='hal@example.com', password='pw', role=role, name='Hal',
+        )
+        category = Category.objects.create(category_name='Snacks', created_user=cls.user)
+        items = [
+            Item.objects.create(category=category, created_user=cls.user, item_name=f'Item {i}', item_price=5 + i)
+            for i in range(2)
+        ]
+        seed_history([cls.user], items, cls.user, 3)
+        Expense.objects.create(user=cls.user, date=date(2024, 5, 1), amount=12.5, bill='bills/user_1/bill ü #1.pdf')
+        Expense.objects.create(user=cls.user, date=date(2024, 5, 2), amount=0, description=None)
+        Order.objects.create(created_user=cls.user, calculated_price=0)  # no lines
+
+    def assertSameJSON(self, fast, drf):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_expenses(self):
+        request = Request(APIRequestFactory().get('/api/expenses/'))
+        expenses = Expense.objects.select_related('user').order_by('-date', 'id')
+        rows = Expense.objects.order_by('-date', 'id').values(*EXPENSE_VALUES)
+        for zone in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(zone=zone), timezone.override(zone):
+                self.assertSameJSON(
+                    serialize_expenses(rows, request),
+                    ExpenseSerializer(expenses, many=True, context={'request': request}).data,
+                )
+                self.assertSameJSON(serialize_expenses(rows), ExpenseSerializer(expenses, many=True).data)
+
+    def test_orders(self):
+        orders = Order.objects.prefetch_related('orderitem_set').order_by('-created_date')
+        rows = Order.objects.order_by('-created_date').values(*ORDER_VALUES)
+        for zone in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(zone=zone), timezone.override(zone):
+                self.assertSameJSON(serialize_orders(rows), OrderSerializer(orders, many=True).data)
+
+    def test_paginated_list(self):
+        client = jwt_client(self.user)
+        ids, url = [], '/api/expenses/mydata/?limit=2'
+        while url:
+            body = client.get(url).json()
+            ids += [row['id'] for row in body['results']]
+            url = body['next'] and f"/api/expenses/mydata/?limit=2&cursor={body['next']}"
+        self.assertEqual(ids, list(Expense.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+
+class FastJSONTests(TestCase):
+    PAYLOAD = {
+        'aware': datetime(2024, 5, 1, 8, 30, 15, 123456, tzinfo=timezone.get_fixed_timezone(0)),
+        'ist': datetime(2024, 5, 1, 8, 30, tzinfo=timezone.get_fixed_timezone(330)),
+        'naive': datetime(2024, 5, 1, 8, 30),
+        'day': date(2024, 5, 1),
+        'time': time(8, 30),
+        'price': Decimal('12.50'),
+        'amounts': [0.1, 33.0, 1234567.89, 0, -2.5, True, None],
+        'text': 'caf\u00e9 \u2028 \u2029 "quoted" \n',
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        7: 'int key',
+        'nested': [{'a': (1, 2)}, []],
+    }
+
+    def test_renderer_matches_drf(self):
+        for payload in (self.PAYLOAD, [], {}, 'text', 12.5, None):
+            with self.subTest(payload=payload):
+                self.assertEqual(renderers.FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_indented_and_fallback_rendering_match_drf(self):
+        media_type = 'application/json; indent=2'
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(self.PAYLOAD, media_type),
+            JSONRenderer().render(self.PAYLOAD, media_type),
+        )
+        self.assertEqual(renderers.FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.PAYLOAD), JSONRenderer().render(self.PAYLOAD))
+
+    def test_api_responses_match_drf(self):
+        role = Role.objects.create(role_name='Admin')
+        admin = User.objects.create_user(username='ivy', email='ivy@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=admin)
+        items = [
+            Item.objects.create(category=category, created_user=admin, item_name=f'Item {i}', item_price=5.5 + i)
+            for i in range(2)
+        ]
+        seed_history([admin], items, admin, 3)
+        client = jwt_client(admin)
+        for url in ('/api/expenses/', '/api/orders/grouped-by-date/', '/api/order-items/'):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertIsInstance(response.accepted_renderer, renderers.FastJSONRenderer)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parser_matches_drf(self):
+        body = JSONRenderer().render(self.PAYLOAD)
+        self.assertEqual(
+            renderers.FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)),
+        )
+        self.assertEqual(renderers.FastJSONParser().parse(io.BytesIO(b'{"n": 123456789012345678901}')), {
+            'n': 123456789012345678901,
+        })
+        for invalid in (b'{"a": NaN}', b'{"a": 1,}', b''):
+            with self.subTest(body=invalid):
+                with self.assertRaises(ParseError) as fast:
+                    renderers.FastJSONParser().parse(io.BytesIO(invalid))
+                with self.assertRaises(ParseError) as drf:
+                    JSONParser().parse(io.BytesIO(invalid))
+                self.assertEqual(str(fast.exception), str(drf.exception))
+
+    def test_json_requests_are_parsed(self):
+        role = Role.objects.create(role_name='Admin')
+        admin = User.objects.create_user(username='jo', email='jo@example.com', password='pw', role=role)
+        response = jwt_client(admin).post('/api/roles/', {'role_name': 'Caf\u00e9 \u2028 Auditor'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Role.objects.get(pk=response.json()['id']).role_name, 'Caf\u00e9 \u2028 Auditor')
+
+
+class MessagePackTests(TestCase):
+    def setUp(self):
+        role = Role.objects.create(role_name='Admin')
+        self.admin = User.objects.create_user(username='kai', email='kai@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.admin)
+        self.items = [
+            Item.objects.create(category=category, created_user=self.admin, item_name=f'Item {i}', item_price=5.5 + i)
+            for i in range(2)
+        ]
+        self.client = jwt_client(self.admin)
+
+    def test_types_are_encoded_like_json(self):
+        payload = {
+            'aware': datetime(2024, 5, 1, 8, 30, 15, 123456, tzinfo=timezone.get_fixed_timezone(0)),
+            'day': date(2024, 5, 1),
+            'price': Decimal('12.50'),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'nested': [{'a': (1, 2)}, None, 1.5],
+        }
+        body = renderers.MessagePackRenderer().render(payload)
+        self.assertEqual(renderers.MessagePackParser().parse(io.BytesIO(body)), {
+            'aware': '2024-05-01T08:30:15.123456Z',
+            'day': '2024-05-01',
+            'price': '12.50',
+            'id': '12345678-1234-5678-1234-567812345678',
+            'nested': [{'a': [1, 2]}, None, 1.5],
+        })
+        self.assertEqual(renderers.MessagePackRenderer().render(None), b'')
+
+    def test_invalid_body_is_a_parse_error(self):
+        for invalid in (b'', b'\xc1', b'\x81\x91\x01\x01', b'\x01\x02'):
+            with self.subTest(body=invalid):
+                with self.assertRaises(ParseError):
+                    renderers.MessagePackParser().parse(io.BytesIO(invalid))
+
+    def test_responses_are_negotiated(self):
+        seed_history([self.admin], self.items, self.admin, 3)
+        for url in ('/api/expenses/', '/api/orders/grouped-by-date/', '/api/items/', '/api/profile/'):
+            with self.subTest(url=url):
+                as_json = self.client.get(url)
+                response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/msgpack')
+                self.assertEqual(msgpack.unpackb(response.content), as_json.json())
+                self.assertLess(len(response.content), len(as_json.content))
+        response = self.client.get('/api/items/?format=msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+
+    def test_msgpack_requests_are_parsed(self):
+        added = datetime(2024, 5, 1, 8, 30, tzinfo=timezone.get_fixed_timezone(0))
+        body = msgpack.packb({'order_items': [
+            # An ISO string and the timestamp extension type are both accepted
+            {'item': self.items[0].pk, 'count': 2, 'added_date': added.isoformat()},
+            {'item': self.items[1].pk, 'count': 1, 'added_date': added},
+        ]}, datetime=True)
+        response = self.client.post(
+            '/api/orders/', body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get(pk=msgpack.unpackb(response.content)['id'])
+        self.assertEqual(sorted(order.orderitem_set.values_list('added_date', flat=True)), [added, added])
+        self.assertEqual(order.calculated_price, 2 * 5.5 + 6.5)
+
+        response = self.client.put(
+            '/api/profile/', msgpack.packb({'name': 'Kai Lee'}), content_type='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.admin.pk).name, 'Kai Lee')
+
+    def test_price_lookups_accept_msgpack_timestamps(self):
+        tea, cake = self.items
+        change = timezone.make_aware(datetime(2024, 3, 10, 6, 0))
+        ItemPriceHistory.objects.create(item=tea, price=4, date=change)
+        body = msgpack.packb({'lookups': [
+            {'item': tea.pk, 'at': change - timedelta(minutes=1)},
+            {'item': tea.pk, 'at': change},
+            {'item': cake.pk, 'at': '2024-03-10'},
+        ]}, datetime=True)
+        response = self.client.post(
+            '/api/items/prices-as-of/', body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(msgpack.unpackb(response.content), {'prices': [4, 5.5, 6.5]})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        admin_role = Role.objects.create(role_name='Admin')
+        user_role = Role.objects.create(role_name='User')
+        self.admin = User.objects.create_user(username='ana', email='ana@example.com', password='pw', role=admin_role)
+        self.user = User.objects.create_user(username='ben', email='ben@example.com', password='pw', role=user_role)
+        self.other = User.objects.create_user(username='cai', email='cai@example.com', password='pw', role=user_role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.admin)
+        items = [
+            Item.objects.create(category=category, created_user=self.admin, item_name=name, item_price=5)
+            for name in ('Tea', 'Cake')
+        ]
+        seed_history([self.user, self.other], items, self.admin, 2)
+
+    USER_COLUMNS = {
+        'expenses': 'user__username',
+        'orders': 'created_user__username',
+        'order-items': 'order__created_user__username',
+    }
+
+    def export_users(self, user, resource):
+        response = jwt_client(user).get(f'/api/export/{resource}/?output=ndjson')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return sorted(row[self.USER_COLUMNS[resource]] for row in rows)
+
+    def test_users_export_only_their_own_rows(self):
+        self.assertEqual(self.export_users(self.user, 'expenses'), ['ben', 'ben'])
+        self.assertEqual(self.export_users(self.user, 'orders'), ['ben', 'ben'])
+        self.assertEqual(self.export_users(self.user, 'order-items'), ['ben'] * 4)
+        # A username filter cannot widen the export
+        response = jwt_client(self.user).get('/api/export/expenses/?output=ndjson&user=cai')
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_admins_export_every_row(self):
+        self.assertEqual(self.export_users(self.admin, 'expenses'), ['ben', 'ben', 'cai', 'cai'])
+        self.assertEqual(self.export_users(self.admin, 'order-items'), ['ben'] * 4 + ['cai'] * 4)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        role = Role.objects.create(role_name='Admin')
+        self.admin = User.objects.create_user(username='lin', email='lin@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.admin)
+        items = [
+            Item.objects.create(category=category, created_user=self.admin, item_name=f'Item {i}', item_price=5.5 + i)
+            for i in range(20)
+        ]
+        seed_history([self.admin], items, self.admin, 20)
+        self.client = jwt_client(self.admin)
+
+    def middleware(self, response):
+        return CompressionMiddleware(lambda request: response)
+
+    def test_reports_are_gzipped(self):
+        for url in ('/api/orders/grouped-by-date/', '/api/order-summary/', '/api/expenses/'):
+            with self.subTest(url=url):
+                plain = self.client.get(url)
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(int(response['Content-Length']), len(response.content))
+                self.assertEqual(gzip.decompress(response.content), plain.content)
+                self.assertLess(len(response.content), len(plain.content) / 3)
+        response = self.client.get('/api/items/', HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_uncompressed_responses_still_vary(self):
+        url = '/api/orders/grouped-by-date/'
+        for accept_encoding in (None, 'identity', 'gzip;q=0', 'deflate'):
+            with self.subTest(accept_encoding=accept_encoding):
+                extra = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding else {}
+                response = self.client.get(url, **extra)
+                self.assertNotIn('Content-Encoding', response)
+                self.assertIn('Accept-Encoding', response['Vary'])
+        # Below MIN_SIZE
+        response = self.client.get('/api/profile/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @override_settings(COMPRESSION={'STREAM_FLUSH_SIZE': 64})
+    def test_streaming_exports_are_compressed_in_flushed_chunks(self):
+        url = '/api/export/order-items/?output=ndjson'
+        plain = b''.join(jwt_client(self.admin).get(url).streaming_content)
+        response = jwt_client(self.admin).get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        # Each flushed chunk can be decoded as soon as it arrives
+        decoder = zlib.decompressobj(wbits=31)
+        self.assertTrue(plain.startswith(decoder.decompress(chunks[0])))
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
+
+    def test_media_and_binary_responses_are_skipped(self):
+        request = APIRequestFactory().get('/media/bills/receipt.txt', HTTP_ACCEPT_ENCODING='gzip')
+        response = self.middleware(HttpResponse(b'total,12.50\n' * 500, content_type='text/csv'))(request)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertFalse(response.has_header('Vary'))
+
+        request = APIRequestFactory().get('/api/photo/', HTTP_ACCEPT_ENCODING='gzip')
+        for response in (
+            HttpResponse(b'\xff\xd8' * 5000, content_type='image/jpeg'),
+            HttpResponse(b'{}' * 5000, content_type='application/json', headers={'Content-Encoding': 'br'}),
+            HttpResponse(b'{}' * 5000, content_type='application/json', headers={'Cache-Control': 'no-transform'}),
+        ):
+            with self.subTest(headers=dict(response.headers)):
+                body = response.content
+                self.assertEqual(self.middleware(response)(request).content, body)
+
+    def test_html_is_not_compressed(self):
+        request = APIRequestFactory().get('/api/items/', HTTP_ACCEPT_ENCODING='gzip')
+        page = b'<input type="hidden" name="csrfmiddlewaretoken" value="secret">' * 100
+        for content_type in ('text/html; charset=utf-8', 'text/plain'):
+            response = self.middleware(HttpResponse(page, content_type=content_type))(request)
+            self.assertNotIn('Content-Encoding', response)
+
+        response = jwt_client(self.admin).get('/api/items/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_etag_is_weakened(self):
+        request = APIRequestFactory().get('/api/items/', HTTP_ACCEPT_ENCODING='gzip')
+        response = HttpResponse(b'{"a":1}' * 1000, content_type='application/json', headers={'ETag': '"items-3-json"'})
+        response = self.middleware(response)(request)
+        self.assertEqual(response['ETag'], 'W/"items-3-json"')
+        # and still validates: catalog ETags match ignoring W/
+        client = jwt_client(self.admin)
+        etag = client.get('/api/items/', HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        response = client.get('/api/items/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_codec_selection(self):
+        codecs = [SimpleNamespace(encoding=name) for name in ('zstd', 'br', 'gzip')]
+        cases = {
+            'gzip, deflate, br, zstd': 'zstd',
+            'gzip, br': 'br',
+            'gzip;q=1.0, br;q=0.5': 'gzip',
+            'br;q=0, *': 'zstd',
+            'zstd;q=0, br;q=0, *;q=0.1': 'gzip',
+            'identity': None,
+            '*;q=0': None,
+            'gzip;q=bogus, br': 'br',
+            '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                codec = select_codec(header, codecs)
+                self.assertEqual(codec and codec.encoding, expected)
+        self.assertEqual([codec.encoding for codec in available_codecs({**DEFAULTS, 'ENCODINGS': ('gzip',)})], ['gzip'])
+
+
+class DailyTotalRollupTests(TestCase):
+    """Every write keeps DailyTotal equal to a fresh aggregate."""
+
+    def setUp(self):
+        role = Role.objects.create(role_name='User')
+        self.ann = User.objects.create_user(username='ann', email='ann@example.com', password='pw', role=role)
+        self.ben = User.objects.create_user(username='ben', email='ben@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.ann)
+        self.tea = Item.objects.create(category=category, created_user=self.ann, item_name='Tea', item_price=2.5)
+        self.cake = Item.objects.create(category=category, created_user=self.ann, item_name='Cake', item_price=4)
+        self.now = timezone.now()
+
+    def assertRollupConsistent(self):
+        self.assertEqual(check_daily_totals(), [])
+        stored = {
+            (row.date, row.user_id): [row.order_total, row.expense_total] for row in DailyTotal.objects.all()
+        }
+        expected = {key: value for key, value in compute_daily_totals().items() if value != [0.0, 0.0]}
+        self.assertEqual({key: value for key, value in stored.items() if value != [0.0, 0.0]}, expected)
+
+    def test_expense_writes(self):
+        expense = Expense.objects.create(user=self.ann, date=self.now.date(), amount=40, created_date=self.now)
+        self.assertRollupConsistent()
+        self.assertEqual(DailyTotal.objects.get(user=self.ann).expense_total, 40)
+
+        expense.amount = 55
+        expense.save()
+        self.assertRollupConsistent()
+
+        expense.created_date = self.now - timedelta(days=3)
+        expense.save()
+        self.assertRollupConsistent()
+
+        expense.user = self.ben
+        expense.save()
+        self.assertRollupConsistent()
+        self.assertEqual(DailyTotal.objects.get(user=self.ben).expense_total, 55)
+
+        expense.delete()
+        self.assertRollupConsistent()
+        self.assertFalse(DailyTotal.objects.exclude(expense_total=0).exists())
+
+    def test_order_item_writes(self):
+        order = Order.objects.create(created_user=self.ann, calculated_price=0)
+        line = OrderItem.objects.create(order=order, item=self.tea, morning_count=2, price=self.tea.item_price)
+        OrderItem.objects.create(order=order, item=self.cake, evening_count=1, price=self.cake.item_price)
+        self.assertRollupConsistent()
+        self.assertEqual(DailyTotal.objects.get(user=self.ann).order_total, 9)
+
+        line.evening_count = 3
+        line.save()
+        self.assertRollupConsistent()
+
+        line.added_date = self.now - timedelta(days=2)
+        line.save()
+        self.assertRollupConsistent()
+
+        # Moving the line to another user's order moves it between users
+        line.order = Order.objects.create(created_user=self.ben, calculated_price=0)
+        line.save()
+        self.assertRollupConsistent()
+        self.assertEqual(DailyTotal.objects.get(user=self.ben).order_total, 12.5)
+
+        line.delete()
+        self.assertRollupConsistent()
+        order.delete()
+        self.assertRollupConsistent()
+        self.assertFalse(DailyTotal.objects.exclude(order_total=0).exists())
+
+    def test_bulk_deltas(self):
+        Expense.objects.create(user=self.ann, date=self.now.date(), amount=10, created_date=self.now)
+        days = range(BULK_DELTA_THRESHOLD + 5)
+        # bulk_create sends no signals, so the rollup is behind until the deltas are applied
+        Expense.objects.bulk_create([
+            Expense(user=user, date=self.now.date(), amount=day + 1, created_date=self.now - timedelta(days=day))
+            for day in days for user in (self.ann, self.ben)
+        ])
+        self.assertNotEqual(check_daily_totals(), [])
+
+        deltas = {
+            (local_date(self.now - timedelta(days=day)), user.pk): (0.0, float(day + 1))
+            for day in days for user in (self.ann, self.ben)
+        }
+        self.assertGreater(len(deltas), BULK_DELTA_THRESHOLD)
+        # Lock, delete, insert (plus the savepoint), however many keys
+        with self.assertNumQueries(5):
+            apply_daily_deltas(deltas)
+        self.assertRollupConsistent()
+        self.assertEqual(DailyTotal.objects.get(user=self.ann, date=local_date(self.now)).expense_total, 11)
+
+
+class GroupedByDateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.ann = User.objects.create_user(username='ann', email='ann@example.com', password='pw', role=role)
+        cls.ben = User.objects.create_user(username='ben', email='ben@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Drinks', created_user=cls.ann)
+        cls.tea = Item.objects.create(category=category, created_user=cls.ann, item_name='Tea', item_price=2)
+        now = timezone.now()
+        for days_ago in range(3):
+            # ann orders first each day, then ben orders the same item
+            for user in (cls.ann, cls.ben):
+                order = Order.objects.create(created_user=user, calculated_price=0)
+                OrderItem.objects.create(
+                    order=order, item=cls.tea, price=2, morning_count=1, added_date=now - timedelta(days=days_ago),
+                )
+        cls.days = [(timezone.localdate() - timedelta(days=days_ago)).isoformat() for days_ago in range(3)]
+
+    def setUp(self):
+        self.client = jwt_client(self.ben)
+
+    def test_page_shape(self):
+        response = self.client.get('/api/orders/grouped-by-date/').json()
+        self.assertEqual(set(response), {'results', 'total_price', 'total_pages', 'current_page', 'next_cursor'})
+        self.assertEqual(list(response['results']), self.days)
+        [row] = response['results'][self.days[0]]
+        first_line = OrderItem.objects.filter(added_date__date=self.days[0]).order_by('id').first()
+        self.assertEqual(row, {
+            'id': first_line.pk, 'item_id': self.tea.pk, 'item_name': 'Tea', 'price': 2.0, 'count': 2, 'total': 4.0,
+            # A day with several users reports the user of its first line
+            'user': 'ann',
+        })
+        self.assertEqual((response['total_price'], response['total_pages'], response['current_page']), (12.0, 1, 1))
+        self.assertIsNone(response['next_cursor'])
+
+    def test_cursor_walk_ends_on_full_last_page(self):
+        url = '/api/orders/grouped-by-date/?page_size=1'
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url + (f'&cursor={cursor}' if cursor else '')).json()
+            seen += list(response['results'])
+            cursor = response['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.days)
+
+        for query in ('page_size=3', 'page_size=1&page=3'):
+            with self.subTest(query=query):
+                self.assertIsNone(self.client.get(f'/api/orders/grouped-by-date/?{query}').json()['next_cursor'])
+        self.assertEqual(
+            self.client.get('/api/orders/grouped-by-date/?page_size=2').json()['next_cursor'], self.days[1],
+        )
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='User')
+        cls.user = User.objects.create_user(username='pat', email='pat@example.com', password='pw', role=role)
+        today = date.today()
+        # Five expenses share one date, so only the id tie-breaker orders them
+        cls.expenses = Expense.objects.bulk_create(
+            [Expense(user=cls.user, date=today, amount=i) for i in range(5)]
+            + [Expense(user=cls.user, date=today - timedelta(days=1), amount=i) for i in range(2)]
+        )
+
+    def walk(self, ordering, limit):
+        pages, cursor = [], None
+        while True:
+            query = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            request = Request(APIRequestFactory().get('/', query))
+            rows, cursor = paginate_queryset(request, Expense.objects.filter(user=self.user), ordering)
+            pages.append([row.pk for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_key(encode_key(date(2024, 5, 1), 'ann', 7), 3), ['2024-05-01', 'ann', 7])
+        self.assertEqual(decode_cursor(encode_cursor('2024-05-01', 42)), ('2024-05-01', 42))
+
+    def test_ties_are_broken_by_id(self):
+        ordered = sorted(self.expenses, key=lambda expense: (expense.date, expense.pk))
+        for ordering, expected in (('date', ordered), ('-date', ordered[::-1])):
+            for limit in (1, 2, 3, 7):
+                with self.subTest(ordering=ordering, limit=limit):
+                    pages = self.walk(ordering, limit)
+                    self.assertEqual([pk for page in pages for pk in page], [expense.pk for expense in expected])
+                    # An exactly full last page has no next cursor
+                    self.assertTrue(pages[-1])
+
+    def test_invalid_cursors(self):
+        for cursor in ('not base64!', encode_key('2024-05-01'), encode_key('2024-05-01', 'x'), encode_key('soon', 1)):
+            with self.subTest(cursor=cursor):
+                request = Request(APIRequestFactory().get('/', {'cursor': cursor}))
+                with self.assertRaises(NotFound):
+                    paginate_queryset(request, Expense.objects.all(), '-date')
+        response = jwt_client(self.user).get('/api/expenses/mydata/', {'cursor': 'not base64!'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderTotalTests(TestCase):
+    """Order.calculated_price follows every line change through F() deltas."""
+
+    def setUp(self):
+        role = Role.objects.create(role_name='User')
+        self.user = User.objects.create_user(username='cam', email='cam@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.user)
+        self.tea = Item.objects.create(category=category, created_user=self.user, item_name='Tea', item_price=2.5)
+        self.cake = Item.objects.create(category=category, created_user=self.user, item_name='Cake', item_price=4)
+        self.order = Order.objects.create(created_user=self.user, calculated_price=0)
+
+    def assertTotal(self, order, expected):
+        stored = Order.objects.get(pk=order.pk).calculated_price
+        lines = sum(line.line_total for line in OrderItem.objects.filter(order=order))
+        self.assertAlmostEqual(stored, lines)
+        self.assertAlmostEqual(stored, expected)
+
+    def test_changing_the_item_through_the_api_reprices_the_line(self):
+        line = OrderItem.objects.create(order=self.order, item=self.tea, price=self.tea.item_price, count=2)
+        client = jwt_client(self.user)
+        response = client.patch(f'/api/order-items/{line.pk}/', {'count': 2, 'item': self.cake.pk}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        line.refresh_from_db()
+        self.assertEqual((line.item_id, line.price), (self.cake.pk, 4))
+        self.assertTotal(self.order, 8)
+        total = DailyTotal.objects.get(user=self.user, date=timezone.localdate(line.added_date))
+        self.assertAlmostEqual(total.order_total, 8)
+
+        for missing in (self.cake.pk + 1000, 'cake'):
+            response = client.patch(f'/api/order-items/{line.pk}/', {'count': 2, 'item': missing}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertTotal(self.order, 8)
+
+    def test_create_line_validates_count(self):
+        client = jwt_client(self.user)
+        for count in ('abc', None, [2]):
+            with self.subTest(count=count):
+                response = client.post('/api/order-items/', {
+                    'order': self.order.pk, 'item': self.tea.pk, 'count': count, 'added_date': timezone.now(),
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
+
+        response = client.post('/api/order-items/', {
+            'order': self.order.pk, 'item': self.tea.pk, 'count': '3', 'added_date': timezone.now(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTotal(self.order, 7.5)
+
+    def test_line_changes(self):
+        line = OrderItem.objects.create(order=self.order, item=self.tea, morning_count=2, price=self.tea.item_price)
+        OrderItem.objects.create(order=self.order, item=self.cake, evening_count=1, price=self.cake.item_price)
+        self.assertTotal(self.order, 9)
+
+        line.evening_count = 2
+        line.save()
+        self.assertTotal(self.order, 14)
+
+        line.item, line.price = self.cake, self.cake.item_price
+        line.save()
+        self.assertTotal(self.order, 20)
+
+        other = Order.objects.create(created_user=self.user, calculated_price=0)
+        line.order = other
+        line.save()
+        self.assertTotal(self.order, 4)
+        self.assertTotal(other, 16)
+
+        # Reloaded lines carry their loaded state, so deltas still apply
+        line = OrderItem.objects.get(pk=line.pk)
+        line.morning_count = 0
+        line.save()
+        self.assertTotal(other, 8)
+
+        line.delete()
+        self.assertTotal(other, 0)
+        self.assertTotal(self.order, 4)
+
+    def test_suspended_totals_are_reconciled_once(self):
+        line = OrderItem.objects.create(order=self.order, item=self.tea, morning_count=1, price=self.tea.item_price)
+        other = Order.objects.create(created_user=self.user, calculated_price=0)
+        with suspend_order_totals():
+            with suspend_order_totals():
+                OrderItem.objects.create(order=self.order, item=self.cake, morning_count=2, price=self.cake.item_price)
+            line.order = other
+            line.save()
+            # Nothing is applied until the outermost block exits
+            self.assertEqual(Order.objects.get(pk=self.order.pk).calculated_price, 2.5)
+            self.assertEqual(Order.objects.get(pk=other.pk).calculated_price, 0)
+        self.assertTotal(self.order, 8)
+        self.assertTotal(other, 2.5)
+
+    def test_reconcile_orders_repairs_drift(self):
+        OrderItem.objects.create(order=self.order, item=self.tea, morning_count=4, price=self.tea.item_price)
+        Order.objects.filter(pk=self.order.pk).update(calculated_price=999)
+        reconcile_orders({self.order.pk: None})
+        self.assertTotal(self.order, 10)
+
+    def test_apply_order_delta_keeps_instance_in_step(self):
+        apply_order_delta(self.order.pk, 3.5, self.order)
+        self.assertEqual(self.order.calculated_price, 3.5)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).calculated_price, 3.5)
+
+
+class BulkOrderIngestTests(TestCase):
+    def setUp(self):
+        role = Role.objects.create(role_name='User')
+        self.user = User.objects.create_user(username='dee', email='dee@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Snacks', created_user=self.user)
+        self.tea = Item.objects.create(category=category, created_user=self.user, item_name='Tea', item_price=2.5)
+        self.cake = Item.objects.create(category=category, created_user=self.user, item_name='Cake', item_price=4)
+        self.now = timezone.now()
+
+    def line(self, item, count, days_ago=0):
+        return {'item': item.pk, 'count': count, 'added_date': (self.now - timedelta(days=days_ago)).isoformat()}
+
+    def test_ingest_orders(self):
+        orders = ingest_orders(self.user, [
+            {'order_items': [self.line(self.tea, 2), self.line(self.cake, 1)]},
+            {'order_items': [self.line(self.cake, 3, days_ago=1)]},
+        ])
+        self.assertEqual([order.calculated_price for order in orders], [9.0, 12.0])
+        with self.assertNumQueries(0):
+            self.assertEqual([len(order.orderitem_set.all()) for order in orders], [2, 1])
+        for order in orders:
+            self.assertAlmostEqual(order.calculated_price, sum(line.line_total for line in order.orderitem_set.all()))
+        self.assertEqual(check_daily_totals(), [])
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=local_date(self.now)).order_total, 9.0)
+
+    def test_create_orders_totals_and_rollup(self):
+        entries = [
+            (self.user.pk, [
+                OrderItem(item=self.tea, price=self.tea.item_price, morning_count=1, added_date=self.now - timedelta(days=day))
+                for _ in range(2)
+            ])
+            for day in range(BULK_DELTA_THRESHOLD + 2)
+        ]
+        orders = create_orders(entries)
+        self.assertEqual({Order.objects.get(pk=order.pk).calculated_price for order in orders}, {5.0})
+        self.assertEqual(OrderItem.objects.count(), 2 * len(entries))
+        self.assertEqual(check_daily_totals(), [])
+
+    def test_invalid_payloads_write_nothing(self):
+        cases = {
+            'missing date': [{'order_items': [{'item': self.tea.pk, 'count': 1}]}],
+            'bad date': [{'order_items': [{**self.line(self.tea, 1), 'added_date': 'yesterday'}]}],
+            'bad count': [{'order_items': [self.line(self.tea, 'two')]}],
+            'unknown item': [{'order_items': [self.line(self.tea, 1), {**self.line(self.tea, 1), 'item': 99999}]}],
+            'non-numeric item': [{'order_items': [{**self.line(self.tea, 1), 'item': 'tea'}]}],
+            'order not an object': [5],
+            'items not a list': [{'order_items': 'tea'}],
+            'item not an object': [{'order_items': [7]}],
+        }
+        for name, orders_data in cases.items():
+            with self.subTest(name):
+                with self.assertRaises(OrderIngestError):
+                    ingest_orders(self.user, orders_data)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(DailyTotal.objects.exists())
+
+    def test_api_reports_ingest_errors(self):
+        client = jwt_client(self.user)
+        response = client.post('/api/orders/', {
+            'order_items': [{**self.line(self.tea, 1), 'item': 99999}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Item with id 99999 does not exist.'})
+        for body in ({'orders': 'x'}, {'orders': [5]}):
+            with self.subTest(body=body):
+                self.assertEqual(client.post('/api/orders/', body, format='json').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class CsvImportTests(TestCase):
+    def setUp(self):
+        role = Role.objects.create(role_name='Admin')
+        self.admin = User.objects.create_user(username='ivy', email='ivy@example.com', password='pw', role=role)
+        self.user = User.objects.create_user(username='jon', email='jon@example.com', password='pw', role=role)
+        category = Category.objects.create(category_name='Drinks', created_user=self.admin)
+        self.tea = Item.objects.create(category=category, created_user=self.admin, item_name='Tea', item_price=2.5)
+
+    def upload(self, resource, body):
+        sheet = SimpleUploadedFile(f'{resource}.csv', body, content_type='text/csv')
+        response = jwt_client(self.admin).post(f'/api/import/{resource}/', {'file': sheet})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_clean_expense_import(self):
+        result = self.upload('expenses', (
+            '\ufeffdate,amount,description,user,is_verified\n'
+            '2024-01-01,10,Café,jon@example.com,yes\n'
+            '2024-01-02,12,Coffee,,\n'
+        ).encode())
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        self.assertEqual(
+            sorted(Expense.objects.values_list('user__username', 'description', 'is_verified')),
+            [('ivy', 'Coffee', False), ('jon', 'Café', True)],
+        )
+        self.assertEqual(TransactionOrder.objects.count(), 2)
+        self.assertEqual(DailyTotal.objects.get(user=self.user, date=date(2024, 1, 1)).expense_total, 10)
+
+    def test_clean_order_sheet_import(self):
+        result = self.upload('orders', (
+            f'date,item,item_name,morning_count,evening_count\n'
+            f'2024-01-01,{self.tea.pk},,1,2\n'
+            f'2024-01-01,,tea,0,1\n'
+        ).encode())
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        order = Order.objects.get()
+        self.assertEqual(order.orderitem_set.count(), 2)
+        self.assertEqual(order.calculated_price, 4 * 2.5)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        result = self.upload('expenses', (
+            b'date,amount,expense_type,user\n'
+            b'2024-01-01,10,Food,\n'
+            b'01/02/2024,ten,Gift,nobody@example.com\n'
+            b'2024-01-03,5,Food,\n'
+        ))
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['errors'], [{'row': 3, 'errors': {
+            'date': 'Expected YYYY-MM-DD.',
+            'amount': 'A number is required.',
+            'expense_type': 'Must be one of: Food, Product, Service.',
+            'user': 'Unknown user: nobody@example.com',
+        }}])
+
+    def test_non_utf8_rows_are_reported_not_a_server_error(self):
+        result = self.upload('expenses', (
+            'date,amount,description\n2024-01-01,10,Tea\n2024-01-02,12,Caf\u00e9\n'.encode('latin-1')
+        ))
+        self.assertEqual(result, {'created': 1, 'errors': [{'row': 3, 'errors': {'encoding': 'Not valid UTF-8 text.'}}]})
+        self.assertEqual(list(Expense.objects.values_list('description', flat=True)), ['Tea'])
+
+    def test_command_reports_non_utf8_rows(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as sheet:
+            sheet.write('date,amount,description\n2024-01-01,10,Caf\u00e9\n2024-01-02,12,Tea\n'.encode('latin-1'))
+        self.addCleanup(os.remove, sheet.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            'import_csv', 'expenses', sheet.name, '--user', self.admin.email, '--chunk-size', '1',
+            stdout=stdout, stderr=stderr,
+        )
+        self.assertIn("Row 2: {'encoding': 'Not valid UTF-8 text.'}", stderr.getvalue())
+        self.assertIn('Imported 1 row(s); 1 row(s) skipped.', stdout.getvalue())
+        self.assertEqual(list(Expense.objects.values_list('description', flat=True)), ['Tea'])
+
+
+class AdminRecipientTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_role = Role.objects.create(role_name='Admin')
+        self.user_role = Role.objects.create(role_name='User')
+        self.admin = User.objects.create_user(
+            username='ada', email='ada@example.com', password='pw', role=self.admin_role,
+        )
+        self.user = User.objects.create_user(username='eve', email='eve@example.com', password='pw', role=self.user_role)
+
+    def test_cached_until_users_or_roles_change(self):
+        self.assertEqual(get_admin_user_ids(), [self.admin.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_admin_user_ids(), [self.admin.pk])
+
+        new_admin = User.objects.create_user(
+            username='max', email='max@example.com', password='pw', role=self.admin_role,
+        )
+        self.assertEqual(sorted(get_admin_user_ids()), [self.admin.pk, new_admin.pk])
+
+        self.admin.role = self.user_role
+        self.admin.save()
+        self.assertEqual(get_admin_user_ids(), [new_admin.pk])
+
+        self.user_role.role_name = 'admin'
+        self.user_role.save()
+        self.assertEqual(sorted(get_admin_user_ids()), sorted([self.admin.pk, new_admin.pk, self.user.pk]))
+
+        self.admin_role.delete()
+        self.assertEqual(sorted(get_admin_user_ids()), [self.admin.pk, self.user.pk])
+
+    def test_submission_notifies_every_admin_in_one_batch(self):
+        second = User.objects.create_user(username='max', email='max@example.com', password='pw', role=self.admin_role)
+        get_admin_user_ids()  # warm the cache, as a running server would have
+        response = jwt_client(self.user).post('/api/expenses/', {
+            'date': date.today().isoformat(), 'amount': 42, 'expense_type': 'Product', 'description': 'Lunch',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        notifications = Notification.objects.filter(user=self.user)
+        self.assertEqual(sorted(notifications.values_list('recipient_id', flat=True)), [self.admin.pk, second.pk])
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.values_list('group_name', flat=True)),
+            sorted([f'user_{self.admin.pk}', f'user_{second.pk}']),
+        )
+        self.assertEqual({entry.payload['message'] for entry in NotificationOutbox.objects.all()}, {
+            notifications.first().message,
+        })
+
+
+
+class RoleAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_role = Role.objects.create(role_name='Admin')
+        self.user_role = Role.objects.create(role_name='User')
+        self.admin = User.objects.create_user(
+            username='ada', email='ada@example.com', password='pw', role=self.admin_role,
+        )
+        self.user = User.objects.create_user(username='eve', email='eve@example.com', password='pw', role=self.user_role)
+
+    def test_token_claims(self):
+        self.assertEqual(MyTokenObtainPairSerializer.get_token(self.admin)['role'], 'Admin')
+        self.assertIs(MyTokenObtainPairSerializer.get_token(self.admin)['is_admin'], True)
+        self.assertIs(MyTokenObtainPairSerializer.get_token(self.user)['is_admin'], False)
+        self.user.role = None
+        self.assertIs(MyTokenObtainPairSerializer.get_token(self.user)['is_admin'], False)
+
+    def test_claims_authentication_skips_the_user_query(self):
+        token = str(MyTokenObtainPairSerializer.get_token(self.admin).access_token)
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        with self.assertNumQueries(0):
+            user, validated = ClaimsJWTAuthentication().authenticate(request)
+        self.assertNotIsInstance(user, User)
+        self.assertEqual(user.id, self.admin.pk)
+        request.user, request.auth = user, validated
+        self.assertTrue(is_admin(request))
+
+    def test_default_authentication_loads_the_role(self):
+        token = str(MyTokenObtainPairSerializer.get_token(self.admin).access_token)
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        with self.assertNumQueries(1):
+            user, validated = RoleJWTAuthentication().authenticate(request)
+            request.user, request.auth = user, validated
+            self.assertTrue(is_admin(request))
+
+    def test_demotion_applies_to_issued_tokens(self):
+        client = jwt_client(self.admin)
+        self.assertEqual(client.get('/api/roles/').status_code, 200)
+        self.admin.role = self.user_role
+        self.admin.save()
+        self.assertEqual(client.get('/api/roles/').status_code, 403)
+
+    def test_inactive_user_is_rejected(self):
+        client = jwt_client(self.admin)
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(client.get('/api/roles/').status_code, 401)
+
+    def test_role_names_are_cached_until_the_role_changes(self):
+        self.assertEqual(role_name_for(self.user_role.pk), 'user')
+        with self.assertNumQueries(0):
+            self.assertEqual(role_name_for(self.user_role.pk), 'user')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user_role.role_name = 'Admin'
+            self.user_role.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(role_name_for(self.user_role.pk), 'admin')
+
+        role_pk = self.user_role.pk
+        self.user_role.delete()
+        self.assertEqual(role_name_for(role_pk), '')
+
+    def test_role_names_expire(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            role_name_for(self.admin_role.pk)
+        self.assertEqual(cache_set.call_args.args[2], ROLE_CACHE_TIMEOUT)
+
+
+class PerfToolingTests(TestCase):
+    """Smoke tests for the synthetic data generator and the bench command."""
+
+    def test_seed_perf_keeps_the_rollup_consistent_and_bench_reports(self):
+        stdout = io.StringIO()
+        call_command('seed_perf', '--days', '3', '--users', '2', '--items', '4', '--prefix', 'smoke', stdout=stdout)
+        self.assertIn('Created 3 users, 4 items', stdout.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='smoke_').count(), 3)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertEqual(check_daily_totals(), [])
+        with self.assertRaisesMessage(CommandError, 'already exist'):
+            call_command('seed_perf', '--days', '1', '--prefix', 'smoke', stdout=io.StringIO())
+
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command(
+            'bench', '--suite', 'pricing', '--iterations', '1', '--warmup', '0', '--output', output,
+            stdout=io.StringIO(),
+        )
+        with open(output, encoding='utf-8') as handle:
+            report = json.load(handle)
+        self.assertEqual(set(report), {'meta', 'suites'})
+        self.assertEqual(report['meta']['iterations'], 1)
+        self.assertEqual(report['meta']['rows']['users'], 3)
+        cases = report['suites']['pricing']
+        self.assertEqual(set(cases), {'resolve_prices', 'PriceTimeline.resolve (loaded)'})
+        for entry in cases.values():
+            self.assertEqual(entry['iterations'], 1)
+            self.assertEqual(entry['resolved'], entry['lookups'])
+            self.assertLessEqual(entry['p50_ms'], entry['p99_ms'])
+            for key in ('p95_ms', 'mean_ms', 'queries', 'peak_kib'):
+                self.assertIn(key, entry)
+        self.assertEqual(cases['resolve_prices']['queries'], 2)
+
+
+class FailingLayer:
+    """Channel layer whose group_send always raises."""
+
+    async def group_send(self, group, message):
+        raise ConnectionError('layer down')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.layer = InMemoryChannelLayer()
+        patcher = mock.patch.object(outbox, 'get_channel_layer', lambda: self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue(self):
+        queued = metrics.NOTIFICATIONS_QUEUED.value()
+        with self.assertNumQueries(1):
+            outbox.enqueue_notifications([1, 2], 'hello')
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.values_list('group_name', 'payload')),
+            [('user_1', {'type': 'send_notification', 'message': 'hello'}),
+             ('user_2', {'type': 'send_notification', 'message': 'hello'})],
+        )
+        self.assertEqual(metrics.NOTIFICATIONS_QUEUED.value(), queued + 2)
+
+    def test_delivery_happens_outside_the_claim_transaction(self):
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)('user_1', channel)
+        outbox.enqueue_notifications([1], 'hello')
+
+        db = connections['default']
+        depth = len(db.savepoint_ids)
+        seen = []
+        group_send = self.layer.group_send
+
+        async def recording_send(group, message):
+            # No savepoint of deliver_pending's own is open while sending
+            seen.append(len(db.savepoint_ids))
+            return await group_send(group, message)
+
+        self.layer.group_send = recording_send
+        self.assertEqual(outbox.deliver_pending(), (1, 0))
+        self.assertEqual(seen, [depth])
+        self.assertEqual(async_to_sync(self.layer.receive)(channel)['message'], 'hello')
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual((entry.attempts, entry.last_error), (1, ''))
+        self.assertIsNotNone(entry.delivered_date)
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+
+    def test_claimed_rows_are_skipped_until_the_claim_expires(self):
+        outbox.enqueue_notifications([1], 'hello')
+        [entry] = outbox.claim_due()
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(outbox.claim_due(), [])
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(outbox.claim_due()), 1)
+
+    def test_failures_back_off(self):
+        self.layer = FailingLayer()
+        outbox.enqueue_notifications([1], 'hello')
+        for attempt, delay in ((1, 2), (2, 4), (3, 8)):
+            start = timezone.now()
+            self.assertEqual(outbox.deliver_pending(), (0, 1))
+            entry = NotificationOutbox.objects.get()
+            self.assertEqual(entry.attempts, attempt)
+            self.assertIn('layer down', entry.last_error)
+            self.assertIsNone(entry.delivered_date)
+            self.assertGreaterEqual(entry.next_attempt_at, start + timedelta(seconds=delay))
+            self.assertLess(entry.next_attempt_at, start + timedelta(seconds=delay + 5))
+            # Not due again until the backoff has passed
+            self.assertEqual(outbox.deliver_pending(), (0, 0))
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.backoff(20), outbox.MAX_BACKOFF)
+
+    def test_retry_cap_dead_letters(self):
+        self.layer = FailingLayer()
+        outbox.enqueue_notifications([1, 2], 'hello')
+        NotificationOutbox.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        with self.assertLogs('expense_app.outbox', 'WARNING'):
+            self.assertEqual(outbox.deliver_pending(), (0, 2))
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.deliver_pending(), (0, 0))
+        self.assertEqual(outbox.dead_letters().count(), 2)
+
+        body = metrics.REGISTRY.render()
+        self.assertIn('expense_notification_outbox_dead 2', body)
+        self.assertIn('expense_notification_outbox_pending 0', body)
+
+        # Delivered-row purging leaves dead letters alone; purge_dead removes old ones
+        self.assertEqual(outbox.purge_delivered(timedelta(0)), 0)
+        self.assertEqual(outbox.purge_dead(), 0)
+        NotificationOutbox.objects.filter(group_name='user_1').update(created_date=timezone.now() - timedelta(days=31))
+        self.assertEqual(outbox.purge_dead(), 1)
+        self.assertEqual(list(NotificationOutbox.objects.values_list('group_name', flat=True)), ['user_2'])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationSocketTests(TestCase):
+    """JWTAuthMiddleware + NotificationConsumer, driven through WebsocketCommunicator.
+
+    The async code runs via async_to_sync from the test thread, so the
+    database_sync_to_async user lookups share the test's connection.
+    """
+
+    def setUp(self):
+        channels_auth._user_cache.clear()
+        role = Role.objects.create(role_name='User')
+        self.user = User.objects.create_user(username='wes', email='wes@example.com', password='pw', role=role)
+        self.token = str(MyTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.app = channels_auth.JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def connect(self, path='/ws/notifications/', subprotocols=None, then=None):
+        async def run():
+            communicator = WebsocketCommunicator(self.app, path, subprotocols=subprotocols)
+            result = await communicator.connect()
+            received = None
+            if result[0] and then:
+                received = await then(communicator)
+            await communicator.disconnect()
+            return result, received
+        return async_to_sync(run)()
+
+    def test_query_string_token(self):
+        async def receive_notification(communicator):
+            await get_channel_layer().group_send(
+                f'user_{self.user.pk}', {'type': 'send_notification', 'message': 'hi'},
+            )
+            return await communicator.receive_json_from()
+
+        result, received = self.connect(f'/ws/notifications/?token={self.token}', then=receive_notification)
+        self.assertEqual(result, (True, None))
+        self.assertEqual(received, {'message': 'hi'})
+
+    def test_subprotocol_token(self):
+        result, _ = self.connect(subprotocols=['bearer', self.token])
+        # The bearer subprotocol is echoed so browsers accept the handshake
+        self.assertEqual(result, (True, 'bearer'))
+
+    def test_missing_or_invalid_token_is_rejected(self):
+        refresh = str(MyTokenObtainPairSerializer.get_token(self.user))
+        for path, subprotocols in (
+            ('/ws/notifications/', None),
+            ('/ws/notifications/?token=garbage', None),
+            (f'/ws/notifications/?token={refresh}', None),  # not an access token
+            ('/ws/notifications/', ['bearer']),
+        ):
+            with self.subTest(path=path, subprotocols=subprotocols):
+                self.assertEqual(self.connect(path, subprotocols)[0], (False, 4401))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.connect(f'/ws/notifications/?token={self.token}')[0], (False, 4401))
+
+    def test_users_are_cached_for_the_ttl(self):
+        path = f'/ws/notifications/?token={self.token}'
+        clock = [1000.0]
+        with mock.patch.object(channels_auth.time, 'monotonic', lambda: clock[0]):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.connect(path)[0], (True, None))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.connect(path)[0], (True, None))
+
+            # A deactivation is only seen once the cached entry expires
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.assertEqual(self.connect(path)[0], (True, None))
+            clock[0] += channels_auth.USER_CACHE_TTL + 1
+            with self.assertNumQueries(1):
+                self.assertEqual(self.connect(path)[0], (False, 4401))
 
-# Create your tests here.
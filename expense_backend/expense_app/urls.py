@@ -20,6 +20,8 @@ urlpatterns = [
     path('items/', views.item_list_create, name='item-list-create'),
     path('items/<int:pk>/', views.item_detail, name='item-detail'),
     path('items/<int:item_id>/price-history/', views.item_price_history, name='item-price-history'),
+    path('items/prices-as-of/', views.item_prices_as_of, name='item-prices-as-of'),
+    path('items/reprice/', views.reprice_items_view, name='item-reprice'),
     
     # Expenses
     path('expenses/', views.expense_list_create, name='expense-list-create'),
@@ -65,4 +67,10 @@ urlpatterns = [
 
     path('orders/grouped-by-date/', views.order_items_grouped_by_date, name='order-items-grouped-by-date'),
     path('orders/available-dates/', views.available_dates, name='available-dates'),
+
+    # Streaming CSV / NDJSON exports
+    path('export/<str:resource>/', views.export_data, name='export'),
+
+    # Bulk CSV import (expenses, orders)
+    path('import/<str:resource>/', views.import_data, name='import'),
 ]
@@ -1,14 +1,39 @@
 # expense_app/utils.py
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+ADMIN_IDS_CACHE_KEY = 'expense_app:admin_user_ids'
+ADMIN_IDS_CACHE_TIMEOUT = 60 * 60
+
 
 def send_realtime_notification(user, message):
-    channel_layer = get_channel_layer()
-    group_name = f"user_{user.id}"
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "send_notification",
-            "message": message,
-        }
-    )
+    """Queue a realtime notification for ``user``.
+
+    Delivery happens out of band through the notification outbox, so this
+    only writes a row and is safe to call inside a request's transaction.
+    """
+    send_realtime_notifications([user.id], message)
+
+
+def send_realtime_notifications(user_ids, message):
+    """Queue ``message`` for many users with a single INSERT."""
+    from .outbox import enqueue_notifications
+
+    if user_ids:
+        enqueue_notifications(user_ids, message)
+
+
+def get_admin_user_ids():
+    """Ids of every admin user, cached until a User or Role changes."""
+    admin_ids = cache.get(ADMIN_IDS_CACHE_KEY)
+    if admin_ids is None:
+        from .models import User
+
+        admin_ids = list(
+            User.objects.filter(role__role_name__iexact="admin").values_list('id', flat=True)
+        )
+        cache.set(ADMIN_IDS_CACHE_KEY, admin_ids, ADMIN_IDS_CACHE_TIMEOUT)
+    return admin_ids
+
+
+def invalidate_admin_user_ids():
+    cache.delete(ADMIN_IDS_CACHE_KEY)
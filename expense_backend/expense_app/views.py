@@ -1,34 +1,47 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models.functions import TruncDate
+from django.db.models.functions import Cast, TruncDate
 
 from django.db import transaction as db_transaction
 from django.contrib.auth import logout
-from django.db.models import Sum, F, FloatField
+from django.db.models import Sum, F, FloatField, Min, Q
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import parser_classes  # ✅ this is the missing one
 from django.utils.timezone import datetime,now,make_aware
 from rest_framework import viewsets
-from datetime import date
+from datetime import date, timedelta
+import hmac
+import io
 import json
 
 from .models import *
 from .serializers import *
 from .permissions import *
-
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .pagination import decode_key, encode_key, get_page_size, is_paginated, paginate_queryset
+from .order_totals import suspend_order_totals
+from .authentication import ClaimsJWTAuthentication
+from .catalog import cached_catalog_response
+from .filters import apply_report_filters, day_filter, start_of_day
+from .exports import EXPORT_FORMATS, EXPORT_RESOURCES, export_response
+from .imports import IMPORTERS
+from .bulk import OrderIngestError, ingest_orders
+from .fast_serializers import EXPENSE_VALUES, ORDER_VALUES, serialize_expenses, serialize_orders
+from .pricing import PriceTimeline, parse_instant, reprice_items, resolve_prices
+from .renderers import MessagePackParser
+from . import metrics as app_metrics
+
+from django.conf import settings
 from django.utils import timezone
-from expense_app.utils import send_realtime_notification
+from expense_app.utils import send_realtime_notification, send_realtime_notifications, get_admin_user_ids
 
-from dateutil import parser
 from .serializers import MyTokenObtainPairSerializer
 
 
@@ -41,7 +54,7 @@ def register_user(request):
     serializer = UserSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = MyTokenObtainPairSerializer.get_token(user)
         return Response({
             'user': serializer.data,
             'refresh': str(refresh),
@@ -51,7 +64,7 @@ def register_user(request):
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([MultiPartParser, FormParser, MessagePackParser])
 def update_profile_picture(request):
     user = request.user
 
@@ -76,7 +89,7 @@ def update_profile_picture(request):
 
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([MultiPartParser, FormParser, MessagePackParser])
 def user_profile(request):
     user = request.user
 
@@ -175,11 +188,16 @@ def role_detail(request, pk):
 def category_list_create(request):
     if request.method == 'GET':
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, categories, 'id')
+            serializer = CategorySerializer(page, many=True)
+            return Response({'results': serializer.data, 'next': next_cursor})
+        return cached_catalog_response(
+            request, 'categories', lambda: CategorySerializer(categories, many=True).data
+        )
     
     elif request.method == 'POST':
-        if not request.user.role or request.user.role.role_name.lower() != 'admin':
+        if not is_admin(request):
             return Response({'error': 'Only admin can create categories'}, status=status.HTTP_403_FORBIDDEN)
         
         data = request.data.copy()
@@ -217,12 +235,17 @@ def category_detail(request, pk):
 def item_list_create(request):
     if request.method == 'GET':
         items = Item.objects.all()
-        serializer = ItemSerializer(items, many=True)
-        return Response(serializer.data)
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, items, 'id')
+            serializer = ItemSerializer(page, many=True)
+            return Response({'results': serializer.data, 'next': next_cursor})
+        return cached_catalog_response(
+            request, 'items', lambda: ItemSerializer(items, many=True).data
+        )
 
     elif request.method == 'POST':
         # Allow only admins to create items
-        if not request.user.role or request.user.role.role_name.lower() != 'admin':
+        if not is_admin(request):
             return Response({'error': 'Only admin can create items'}, status=status.HTTP_403_FORBIDDEN)
 
         # ✅ Do NOT manually inject 'created_user'
@@ -270,42 +293,114 @@ def item_detail(request, pk):
 # Item Price Track
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def item_price_history(request, item_id):
     try:
         item = Item.objects.get(pk=item_id)
-        history = ItemPriceHistory.objects.filter(item=item).order_by('-date')
+        history = ItemPriceHistory.objects.filter(item=item).select_related('item').order_by('-date')
         serializer = ItemPriceHistorySerializer(history, many=True)
         return Response(serializer.data)
     except Item.DoesNotExist:
         return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
+MAX_PRICE_LOOKUPS = 100_000
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([ClaimsJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def item_prices_as_of(request):
+    """Item prices at a point in time, from ItemPriceHistory.
+
+    GET ``?at=<date or datetime>`` (default now), optionally narrowed with
+    repeated ``item=<id>``, lists the catalog as it was priced then. POST
+    ``{"lookups": [{"item": <id>, "at": ...}, ...]}`` resolves a batch of
+    lookups and returns ``{"prices": [...]}`` in the same order, with null
+    for unknown items. A date means the price at the end of that day.
+    """
+    if request.method == 'GET':
+        at = request.query_params.get('at')
+        when = parse_instant(at) if at else timezone.now()
+        if when is None:
+            return Response({'error': f'Invalid at: {at}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            item_ids = [int(pk) for pk in request.query_params.getlist('item')] or None
+        except ValueError:
+            return Response({'error': 'item must be an integer id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        timeline = PriceTimeline.load(item_ids)
+        items = Item.objects.filter(pk__in=timeline.current).order_by('item_name').values_list('id', 'item_name')
+        return Response({
+            'at': at or when.isoformat(),
+            'results': [
+                {'item_id': pk, 'item_name': name, 'price': timeline.price_at(pk, when)}
+                for pk, name in items
+            ],
+        })
+
+    # ✅ POST: batch of (item, at) lookups
+    lookups = request.data.get('lookups') if isinstance(request.data, dict) else None
+    if not isinstance(lookups, list):
+        return Response({'error': 'lookups must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(lookups) > MAX_PRICE_LOOKUPS:
+        return Response(
+            {'error': f'At most {MAX_PRICE_LOOKUPS} lookups per request'}, status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    pairs = []
+    for index, lookup in enumerate(lookups):
+        item_id = lookup.get('item') if isinstance(lookup, dict) else None
+        when = parse_instant(lookup.get('at')) if isinstance(lookup, dict) else None
+        if not isinstance(item_id, int) or when is None:
+            return Response(
+                {'error': f'lookups[{index}] needs an integer item and a date or datetime at'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        pairs.append((item_id, when))
+    return Response({'prices': resolve_prices(pairs)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def reprice_items_view(request):
+    """Reprice many items at once: ``{"prices": {"<item id>": <price>, ...}}``.
+
+    One bulk update plus one bulk insert of ItemPriceHistory, instead of a
+    save (and its history write) per item.
+    """
+    prices = request.data.get('prices') if isinstance(request.data, dict) else None
+    if not isinstance(prices, dict) or not prices:
+        return Response({'error': 'prices must be an object of item id -> price'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        prices = {int(pk): float(price) for pk, price in prices.items()}
+    except (TypeError, ValueError):
+        return Response({'error': 'prices must map integer ids to numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    if any(price < 0 for price in prices.values()):
+        return Response({'error': 'Prices cannot be negative'}, status=status.HTTP_400_BAD_REQUEST)
+
+    changed = reprice_items(prices)
+    return Response({'changed': changed})
+
+
 class ItemViewSet(viewsets.ModelViewSet):
+    # ✅ Price history is written by signals.track_price_change
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_update(self, serializer):
-        old_instance = self.get_object()
-        old_price = old_instance.item_price
-        updated_instance = serializer.save()
-
-        if old_price != updated_instance.item_price:
-            ItemPriceHistory.objects.create(
-                item=updated_instance,
-                price=old_price,
-                date=timezone.now()
-            )
-
 # Expense Views
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def expense_list_create(request):
     if request.method == 'GET':
-        expenses = Expense.objects.all().order_by('-date')
-        serializer = ExpenseSerializer(expenses, many=True, context={'request': request})
-        return Response(serializer.data)
+        # ✅ values() fast path; same JSON as ExpenseSerializer
+        expenses = Expense.objects.order_by('-date').values(*EXPENSE_VALUES)
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, expenses, '-date')
+            return Response({'results': serialize_expenses(page, request), 'next': next_cursor})
+        return Response(serialize_expenses(expenses, request))
 
     elif request.method == 'POST':
         serializer = ExpenseSerializer(data=request.data, context={'request': request})
@@ -317,21 +412,22 @@ def expense_list_create(request):
                 # 1) Save the expense itself
                 expense = serializer.save(user=request.user)
 
-                # 2) Notify all admins
-                admins = User.objects.filter(role__role_name__iexact="admin")
-                for admin in admins:
-                    Notification.objects.create(
+                # 2) Notify all admins with a single INSERT
+                message = f"{request.user.username} submitted an expense ₹{expense.amount} on {expense.date}"
+                admin_ids = get_admin_user_ids()
+                Notification.objects.bulk_create([
+                    Notification(
                         user=request.user,
-                        recipient=admin,
-                        message=f"{request.user.username} submitted an expense ₹{expense.amount} on {expense.date}",
+                        recipient_id=admin_id,
+                        message=message,
                         is_read=False
                     )
+                    for admin_id in admin_ids
+                ])
 
-                    # ✅ Send real-time notification
-                    send_realtime_notification(
-                        admin,
-                        f"{request.user.username} submitted an expense ₹{expense.amount} on {expense.date}"
-                    )
+                # ✅ Queue real-time notifications; the outbox worker delivers
+                # them once this transaction commits
+                send_realtime_notifications(admin_ids, message)
 
                 # 3) Create a corresponding Order
                 order = Order.objects.create(
@@ -357,6 +453,7 @@ def expense_list_create(request):
 
                 # 6) Save uploaded bill file (if any)
                 if 'bill' in request.FILES:
+                    app_metrics.BILL_UPLOAD_BYTES.observe(request.FILES['bill'].size)
                     expense.bill = request.FILES['bill']
                     expense.save()
 
@@ -369,11 +466,14 @@ def expense_list_create(request):
 
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def my_expenses(request):
-    user_expenses = Expense.objects.filter(user=request.user)
-    serializer = ExpenseSerializer(user_expenses, many=True)
-    return Response(serializer.data)
+    user_expenses = Expense.objects.filter(user_id=request.user.id).values(*EXPENSE_VALUES)
+    if is_paginated(request):
+        page, next_cursor = paginate_queryset(request, user_expenses, '-date')
+        return Response({'results': serialize_expenses(page), 'next': next_cursor})
+    return Response(serialize_expenses(user_expenses))
 
 
 
@@ -394,18 +494,14 @@ def expense_detail(request, pk):
         data = request.data
 
         # ✅ Prevent non-admins from editing others' expenses
-        if expense.user != user and (
-            not user.role or user.role.role_name.lower() != 'admin'
-        ):
+        if expense.user_id != user.id and not is_admin(request):
             return Response(
                 {"error": "You do not have permission to edit this expense."},
                 status=status.HTTP_403_FORBIDDEN
             )
 
         # ✅ Optional: Enforce only admin can change verification/refund
-        if ('is_verified' in data or 'is_refunded' in data) and (
-            not user.role or user.role.role_name.lower() != 'admin'
-        ):
+        if ('is_verified' in data or 'is_refunded' in data) and not is_admin(request):
             return Response(
                 {"error": "Only admin can update verification or refund status."},
                 status=status.HTTP_403_FORBIDDEN
@@ -425,21 +521,24 @@ def expense_detail(request, pk):
 
                 # ✅ Handle bill file replacement
                 if 'bill' in request.FILES:
+                    app_metrics.BILL_UPLOAD_BYTES.observe(request.FILES['bill'].size)
                     expense.bill = request.FILES['bill']
 
                 expense.save()
 
                 # ✅ Send notification when admin verifies
                 if data.get('is_verified') is True:
+                    message = (
+                        f"Your expense of ₹{expense.amount}"
+                        f" on {expense.date} has been verified"
+                    )
                     Notification.objects.create(
                         user=request.user,
                         recipient=expense.user,
-                        message=(
-                            f"Your expense of ₹{expense.amount}"
-                            f" on {expense.date} has been verified"
-                        ),
+                        message=message,
                         is_read=False
                     )
+                    send_realtime_notification(expense.user, message)
 
                 # ✅ Correct user for order creation: use expense.user
                 order = (
@@ -484,9 +583,7 @@ def expense_detail(request, pk):
     # 4) DELETE
     else:
         # ✅ Only allow owner or admin to delete
-        if expense.user != user and (
-            not user.role or user.role.role_name.lower() != 'admin'
-        ):
+        if expense.user_id != user.id and not is_admin(request):
             return Response(
                 {"error": "You do not have permission to delete this expense."},
                 status=status.HTTP_403_FORBIDDEN
@@ -498,70 +595,36 @@ def expense_detail(request, pk):
 @permission_classes([IsAuthenticated])
 def order_list_create(request):
     if request.method == 'GET':
-        if request.user.role and request.user.role.role_name.lower() == 'admin':
+        if is_admin(request):
             orders = Order.objects.all()
         else:
             orders = Order.objects.filter(created_user=request.user)
+        orders = orders.values(*ORDER_VALUES)
 
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, orders, '-created_date')
+            return Response({'results': serialize_orders(page), 'next': next_cursor})
+        return Response(serialize_orders(orders))
 
     elif request.method == 'POST':
-        try:
-            with db_transaction.atomic():
-                # Create new Order
-                order = Order.objects.create(
-                    created_user=request.user,
-                    calculated_price=0  # Will be updated after items are added
-                )
-
-                for item_data in request.data.get('order_items', []):
-                    item_id = item_data.get('item')
-                    raw_date = item_data.get('added_date')
-                    count = int(item_data.get('count', 0))
-
-                    # Parse and validate added_date
-                    if raw_date:
-                        try:
-                            added_date = parser.isoparse(raw_date)
-                            if timezone.is_naive(added_date):
-                                added_date = timezone.make_aware(added_date)
-                        except Exception as e:
-                            print(f"Invalid added_date format: {raw_date} — Error: {e}")
-                            return Response({'error': f'Invalid date format: {raw_date}'}, status=400)
-                    else:
-                        return Response({'error': 'Missing added_date for one of the items.'}, status=400)
-
-                    # ✅ Fetch item and get price
-                    try:
-                        item = Item.objects.get(id=item_id)
-                        price = item.item_price
-                    except Item.DoesNotExist:
-                        return Response({'error': f'Item with id {item_id} does not exist.'}, status=400)
-
-                    # Split count into morning and evening
-                    morning_count = count // 2
-                    evening_count = count - morning_count
-
-                    # ✅ Create OrderItem with price
-                    OrderItem.objects.create(
-                        order=order,
-                        item=item,
-                        morning_count=morning_count,
-                        evening_count=evening_count,
-                        added_date=added_date,
-                        price=price
-                    )
+        # Either a single order ({"order_items": [...]}) or, for bulk entry
+        # across many dates, {"orders": [{"order_items": [...]}, ...]}.
+        many = 'orders' in request.data
+        orders_data = request.data.get('orders') if many else [request.data]
+        if not isinstance(orders_data, list):
+            return Response({'error': '"orders" must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Recalculate total price after adding all items
-                order.update_total_price()
-
-                serializer = OrderSerializer(order)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except Exception as e:
+        try:
+            orders = ingest_orders(request.user, orders_data)
+        except OrderIngestError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        if many:
+            serializer = OrderSerializer(orders, many=True)
+        else:
+            serializer = OrderSerializer(orders[0])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
 def order_detail(request, pk):
@@ -577,7 +640,9 @@ def order_detail(request, pk):
     elif request.method == 'PUT':
 
         try:
-            with db_transaction.atomic():
+            # Line changes skip the per-item total update; the order total is
+            # reconciled once when the block exits.
+            with db_transaction.atomic(), suspend_order_totals():
                 # Get existing items to compare
                 existing_items = {item.id: item for item in order.orderitem_set.all()}
                 updated_ids = []
@@ -595,24 +660,22 @@ def order_detail(request, pk):
                         updated_ids.append(item_id)
                     else:
                         # Create new item
+                        new_item = Item.objects.get(pk=item_data.get('item'))
                         OrderItem.objects.create(
                             order=order,
-                            item_id=item_data.get('item'),
+                            item=new_item,
                             count=item_data.get('count', 1),
-                            added_date=timezone.now()
+                            added_date=timezone.now(),
+                            price=new_item.item_price
                         )
                 
                 # Delete items not in request
                 for item_id, item in existing_items.items():
                     if item_id not in updated_ids:
                         item.delete()
-                
-                # Update order total
-                order.update_total_price()
-                order.save()
-                
-                return Response(OrderSerializer(order).data)
-                
+
+            return Response(OrderSerializer(order).data)
+
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -620,7 +683,7 @@ def order_detail(request, pk):
 def delete_order(request, order_id):
     try:
         order = Order.objects.get(id=order_id)
-        if order.added_date != timezone.now().date():
+        if timezone.localdate(order.created_date) != timezone.localdate():
             return Response({'error': 'Only today\'s orders can be deleted.'}, status=403)
         order.delete()
         return Response({'message': 'Order deleted successfully'}, status=204)
@@ -633,6 +696,10 @@ def order_item_list(request):
     """List all order items or create a new order item."""
     if request.method == "GET":
         order_items = OrderItem.objects.all()
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, order_items, '-added_date')
+            serializer = OrderItemSerializer(page, many=True)
+            return Response({'results': serializer.data, 'next': next_cursor})
         serializer = OrderItemSerializer(order_items, many=True)
         return Response(serializer.data)
 
@@ -649,16 +716,20 @@ def order_item_list(request):
 
             order = get_object_or_404(Order, id=order_id)
             item = get_object_or_404(Item, id=item_id)
-            count = validated.get("count", 1)
+            try:
+                count = int(request.data.get("count", 1))
+            except (TypeError, ValueError):
+                return Response({"error": "count must be a whole number"}, status=status.HTTP_400_BAD_REQUEST)
             added_date = validated.get("added_date", timezone.now())
 
+            # The order total is updated by the OrderItem post_save receiver
             order_item = OrderItem.objects.create(
                 order=order,
                 item=item,
                 count=count,
-                added_date=added_date
+                added_date=added_date,
+                price=item.item_price
             )
-            order.update_total_price()
 
             return Response(OrderItemSerializer(order_item).data, status=status.HTTP_201_CREATED)
 
@@ -669,11 +740,10 @@ def order_item_list(request):
 def order_item_detail(request, pk):
     order_item = get_object_or_404(OrderItem, id=pk)
 
-    is_admin = request.user.role and request.user.role.role_name.lower() == 'admin'
-    is_owner = order_item.order.created_user == request.user  # ✅ Based on order ownership
+    is_owner = order_item.order.created_user_id == request.user.id  # ✅ Based on order ownership
 
     if request.method in ['PUT', 'PATCH', 'DELETE']:
-        if not is_admin and not is_owner:
+        if not is_admin(request) and not is_owner:
             return Response(
                 {"error": "You do not have permission to modify this item."},
                 status=status.HTTP_403_FORBIDDEN
@@ -690,21 +760,24 @@ def order_item_detail(request, pk):
             order_item.evening_count = new_count - order_item.morning_count
 
             if "item" in request.data:
-                order_item.item_id = request.data["item"]
+                item = Item.objects.filter(pk=request.data["item"]).only('id', 'item_price').first()
+                if item is None:
+                    return Response({"error": "Item not found"}, status=status.HTTP_400_BAD_REQUEST)
+                if item.pk != order_item.item_id:
+                    # ✅ Totals are built from the line's price snapshot, so it follows the new item
+                    order_item.item = item
+                    order_item.price = item.item_price
             if "added_date" in request.data:
                 order_item.added_date = request.data["added_date"]
 
             order_item.save()
-            order_item.order.update_total_price()
             return Response(OrderItemSerializer(order_item).data)
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == "DELETE":
-        order = order_item.order
         order_item.delete()
-        order.update_total_price()
         return Response({"message": "OrderItem deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 # Transaction Views
@@ -714,6 +787,10 @@ def order_item_detail(request, pk):
 def transaction_list_create(request):
     if request.method == 'GET':
         transactions = Transaction.objects.filter(user=request.user)
+        if is_paginated(request):
+            page, next_cursor = paginate_queryset(request, transactions, '-created_date')
+            serializer = TransactionSerializer(page, many=True)
+            return Response({'results': serializer.data, 'next': next_cursor})
         serializer = TransactionSerializer(transactions, many=True)
         return Response(serializer.data)
     
@@ -749,12 +826,22 @@ def transaction_detail(request, pk):
 # Notification Views
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def notification_list(request):
-    notifications = Notification.objects.filter(recipient=request.user).order_by('-created_date')
-    serializer = NotificationSerializer(notifications, many=True)
+    notifications = Notification.objects.filter(recipient_id=request.user.id).order_by('-created_date')
     unread_count = notifications.filter(is_read=False).count()
 
+    if is_paginated(request):
+        page, next_cursor = paginate_queryset(request, notifications, '-created_date')
+        serializer = NotificationSerializer(page, many=True)
+        return Response({
+            "unread_count": unread_count,
+            "notifications": serializer.data,
+            "next": next_cursor
+        })
+
+    serializer = NotificationSerializer(notifications, many=True)
     return Response({
         "unread_count": unread_count,
         "notifications": serializer.data  # ✅ send as list under key
@@ -780,19 +867,6 @@ def mark_all_notifications_read(request):
     Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
     return Response({"detail": "All notifications marked as read"})
 
-def send_realtime_notification(user, message):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{user.id}",
-        {
-            "type": "send_notification",
-            "notification": {
-                "message": message,
-                "created_at": str(timezone.now()),
-            }
-        }
-    )
-
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def clear_all_notifications(request):
@@ -804,52 +878,30 @@ def clear_all_notifications(request):
 # Daily total
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def daily_combined_totals(request):
-
-    orderitem_totals = (
-        OrderItem.objects
-        .annotate(date=TruncDate('added_date'))
+    # Read from the DailyTotal rollup (one row per date and user), which the
+    # OrderItem/Expense signals keep current, instead of scanning history.
+    daily_totals = (
+        DailyTotal.objects
         .values('date')
-        .annotate(order_total=Sum(F('item__item_price') * F('count')))
+        .annotate(order_total=Sum('order_total'), expense_total=Sum('expense_total'))
         .order_by('date')
     )
-    print("Regular expense",orderitem_totals)
-
-    expense_totals = (
-        TransactionOrder.objects
-        .filter(expense__isnull=False)
-        .annotate(date=TruncDate('created_date'))
-        .values('date')
-        .annotate(expense_total=Sum('expense__amount'))  
-        .order_by('date')
-    )
-
-    print("Regular expense",expense_totals)
 
-    # === Merge Both Results ===
-    totals_by_date = {}
-
-    for entry in orderitem_totals:
-        date_str = entry['date'].strftime('%Y-%m-%d')
-        totals_by_date.setdefault(date_str, {'order_total': 0, 'expense_total': 0})
-        totals_by_date[date_str]['order_total'] = entry['order_total']
-
-    for entry in expense_totals:
-        date_str = entry['date'].strftime('%Y-%m-%d')
-        totals_by_date.setdefault(date_str, {'order_total': 0, 'expense_total': 0})
-        totals_by_date[date_str]['expense_total'] = entry['expense_total']
-
-    # Convert to list for response
-    result = [
-        {
-            'date': date,
-            'order_total': round(values['order_total'] or 0, 2),
-            'expense_total': round(values['expense_total'] or 0, 2),
-            'combined_total': round((values['order_total'] or 0) + (values['expense_total'] or 0), 2)
-        }
-        for date, values in sorted(totals_by_date.items())
-    ]
+    result = []
+    for entry in daily_totals:
+        order_total = round(entry['order_total'] or 0, 2)
+        expense_total = round(entry['expense_total'] or 0, 2)
+        if not order_total and not expense_total:
+            continue
+        result.append({
+            'date': entry['date'].strftime('%Y-%m-%d'),
+            'order_total': order_total,
+            'expense_total': expense_total,
+            'combined_total': round(order_total + expense_total, 2)
+        })
 
     return Response(result)
 
@@ -887,39 +939,83 @@ def daily_combined_totals(request):
 #     return Response(response_data)
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def daily_orderitem_summary(request):
-    orderitems = OrderItem.objects.filter(
-        order__calculated_price__gt=0
-    ).annotate(
-        order_date=F('added_date__date'),
-        username=F('order__created_user__username'),
+    """Per (date, user) line count and amount, newest date first.
+
+    One GROUP BY in the database; takes the report filters (``start_date``,
+    ``end_date``, ``month``, ``date``, ``user``, ``item_name``). With
+    ``limit``/``cursor`` it returns ``{'results', 'next'}`` pages keyed on
+    (date, user), reading only the days that page covers.
+    """
+    order_items = filter_order_items(
+        OrderItem.objects.filter(order__calculated_price__gt=0), request.query_params,
     )
+    paginated = is_paginated(request)
+    page_size = get_page_size(request)
+
+    if paginated:
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            day, username = decode_key(cursor, 2)
+            try:
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                raise NotFound('Invalid cursor')
+            if not isinstance(username, str):
+                raise NotFound('Invalid cursor')
+            # ✅ Rows after (day, username) in (-date, -user) order
+            order_items = order_items.filter(
+                Q(added_date__lt=start_of_day(day))
+                | Q(order__created_user__username__lt=username, **day_filter('added_date', day))
+            )
+        # Every day has at least one row, so a page never spans more days
+        # than it has rows; bound the aggregate to those days. One day more
+        # yields an extra row exactly when there is a next page.
+        days = list(order_items.dates('added_date', 'day', order='DESC')[:page_size + 1])
+        if not days:
+            return Response({'results': [], 'next': None})
+        order_items = order_items.filter(added_date__gte=start_of_day(days[-1]))
+
+    line_count = F('morning_count') + F('evening_count')
+    rows = (
+        order_items
+        .annotate(day=TruncDate('added_date'))
+        .values('day', 'order__created_user__username')
+        .annotate(
+            total_count=Sum(line_count),
+            total_amount=Sum(line_count * Cast('price', FloatField()), output_field=FloatField()),
+            order_id=Min('order_id'),
+        )
+        .order_by('-day', '-order__created_user__username')
+    )
+    if paginated:
+        rows = rows[:page_size + 1]
 
-    summary = {}
-    for item in orderitems:
-        date_str = item.added_date.date().isoformat()
-        user = item.order.created_user.username
-        key = (date_str, user)
-
-        if key not in summary:
-            summary[key] = {
-                "date": date_str,
-                "user": user,
-                "total_count": 0,
-                "total_amount": 0.0,
-                "order_id": item.order.id  # ✅ include order ID here
-            }
-
-        summary[key]["total_count"] += item.count
-        summary[key]["total_amount"] += item.item.item_price * item.count
-
-    response_data = sorted(summary.values(), key=lambda x: (x['date'], x['user']), reverse=True)
-    return Response(response_data)
+    response_data = [
+        {
+            "date": row['day'].isoformat(),
+            "user": row['order__created_user__username'],
+            "total_count": row['total_count'],
+            "total_amount": row['total_amount'],
+            "order_id": row['order_id'],  # ✅ lowest order ID of the group
+        }
+        for row in rows
+    ]
+    if not paginated:
+        return Response(response_data)
 
+    next_cursor = None
+    if len(response_data) > page_size:
+        response_data = response_data[:page_size]
+        last = response_data[-1]
+        next_cursor = encode_key(last['date'], last['user'])
+    return Response({'results': response_data, 'next': next_cursor})
 
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def orders_by_date(request):
     date = request.query_params.get('date')
@@ -931,8 +1027,8 @@ def orders_by_date(request):
     try:
         user = User.objects.get(username=username)
         order_items = OrderItem.objects.filter(
-            added_date__date=date,
-            order__created_user=user
+            order__created_user=user,
+            **day_filter('added_date', date)
         ).select_related('item', 'order') 
 
         serializer = OrderItemSerializer(order_items, many=True)
@@ -955,7 +1051,7 @@ def delete_orders_by_date_user(request):
     try:
         orders_to_delete = Order.objects.filter(
             created_user__username=username,
-            orderitem__added_date__date=date
+            **day_filter('orderitem__added_date', date)
         ).distinct()
 
         count = orders_to_delete.count()
@@ -967,96 +1063,160 @@ def delete_orders_by_date_user(request):
         return Response({'error': str(e)}, status=500)
 
 
+def filter_order_items(order_items, params):
+    """Apply the report filters shared by the order item endpoints."""
+    return apply_report_filters(
+        order_items, params,
+        date_field='added_date',
+        user_field='order__created_user__username',
+        item_field='item__item_name',
+    )
+
+
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def order_items_grouped_by_date(request):
     # ✅ Allow ALL users to see ALL orders
-    order_items = OrderItem.objects.all()
-
-    # Filters
-    start_date = request.query_params.get('start_date')
-    end_date = request.query_params.get('end_date')
-    month = request.query_params.get('month')
-    user = request.query_params.get('user')
-    item_name = request.query_params.get('item_name')
-    date = request.query_params.get('date')
+    order_items = filter_order_items(OrderItem.objects.all(), request.query_params)
 
-    if start_date:
-        order_items = order_items.filter(added_date__gte=start_date)
-    if end_date:
-        order_items = order_items.filter(added_date__lte=end_date)
-    if month:
-        try:
-            year = int(month[:4])
-            month_num = int(month[5:])
-            order_items = order_items.filter(added_date__year=year, added_date__month=month_num)
-        except (ValueError, IndexError):
-            pass
-
-    if user:
-        order_items = order_items.filter(order__created_user__username=user)
-    if item_name:
-        order_items = order_items.filter(item__item_name=item_name)
-    if date:
-        order_items = order_items.filter(added_date__date=date)
-
-    # Pagination
+    # Pagination: `cursor` (the last date of the previous page) seeks past
+    # that date; the legacy `page` number is still honoured without it.
     try:
         page = int(request.query_params.get('page', 1))
         page_size = int(request.query_params.get('page_size', 10))
     except ValueError:
         page, page_size = 1, 10
+    page, page_size = max(page, 1), max(page_size, 1)
 
-    dates = order_items.dates('added_date', 'day').order_by('-added_date')
+    dates = order_items.dates('added_date', 'day', order='DESC')
     total_count = dates.count()
     total_pages = (total_count + page_size - 1) // page_size
 
-    start = (page - 1) * page_size
-    end = start + page_size
-    paginated_dates = dates[start:end]
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            cursor_date = datetime.strptime(cursor, '%Y-%m-%d').date()
+        except ValueError:
+            # ✅ Same answer as every other cursor endpoint (see pagination.decode_key)
+            raise NotFound('Invalid cursor')
+        paginated_dates = list(dates.filter(added_date__lt=start_of_day(cursor_date))[:page_size + 1])
+    else:
+        start = (page - 1) * page_size
+        paginated_dates = list(dates[start:start + page_size + 1])
+    # The extra date only tells whether another page follows
+    has_more = len(paginated_dates) > page_size
+    paginated_dates = paginated_dates[:page_size]
 
     grouped_data = {}
     grand_total = 0
 
-    for date in paginated_dates:
-        date_str = date.strftime('%Y-%m-%d')
-        items = order_items.filter(added_date__date=date).select_related('item', 'order__created_user')
-
-        date_items = {}
-        date_total = 0
-
-        for item in items:
-            key = item.item.id
-
-            if key not in date_items:
-                date_items[key] = {
-                    'id': item.id,  
-                    'item_id': item.item.id,
-                    'item_name': item.item.item_name,
-                    'price': float(item.item.item_price),
-                    'count': 0,
-                    'total': 0,
-                    'user': item.order.created_user.username
-                }
-
-            date_items[key]['count'] += item.count
-            item_total = item.count * item.item.item_price
-            date_items[key]['total'] += item_total
-            date_total += item_total
+    if paginated_dates:
+        # One GROUP BY over the page's date window: a row per (date, item,
+        # price). Lines are totalled at the price they were ordered at, so a
+        # later price change does not rewrite past days.
+        line_count = F('morning_count') + F('evening_count')
+        rows = list(
+            order_items
+            .filter(
+                added_date__gte=start_of_day(paginated_dates[-1]),
+                added_date__lt=start_of_day(paginated_dates[0] + timedelta(days=1)),
+            )
+            .annotate(day=TruncDate('added_date'))
+            .values('day', 'item_id', 'price')
+            .annotate(
+                first_id=Min('id'),
+                count=Sum(line_count),
+                total=Sum(line_count * Cast('price', FloatField()), output_field=FloatField()),
+            )
+            .order_by('-day', 'first_id')
+        )
+        # Item name and user come from each group's first line, as before
+        first_lines = {
+            pk: (item_name, username)
+            for pk, item_name, username in OrderItem.objects.filter(pk__in=[row['first_id'] for row in rows])
+            .values_list('id', 'item__item_name', 'order__created_user__username')
+        }
 
-        grouped_data[date_str] = list(date_items.values())
-        grand_total += date_total
+        for row in rows:
+            date_str = row['day'].strftime('%Y-%m-%d')
+            item_name, username = first_lines[row['first_id']]
+            grouped_data.setdefault(date_str, []).append({
+                'id': row['first_id'],
+                'item_id': row['item_id'],
+                'item_name': item_name,
+                'price': float(row['price']),
+                'count': row['count'],
+                'total': row['total'],
+                'user': username
+            })
+            grand_total += row['total']
+
+    next_cursor = paginated_dates[-1].strftime('%Y-%m-%d') if has_more else None
 
     return Response({
         'results': grouped_data,
         'total_price': grand_total,
         'total_pages': total_pages,
-        'current_page': page
+        'current_page': page,
+        'next_cursor': next_cursor
     })
 
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def available_dates(request):
     # ✅ Show all dates, no matter the user
-    dates = OrderItem.objects.dates('added_date', 'day').order_by('-added_date')
+    dates = OrderItem.objects.dates('added_date', 'day', order='DESC')
     return Response([date.strftime('%Y-%m-%d') for date in dates])
+
+
+# Streaming exports
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_data(request, resource):
+    if resource not in EXPORT_RESOURCES:
+        return Response({'error': f'Unknown export: {resource}'}, status=status.HTTP_404_NOT_FOUND)
+
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    # ✅ Admins export everyone's rows; other users only their own
+    user = None if is_admin(request) else request.user
+    return export_response(resource, request.query_params, output, user)
+
+
+# Bulk CSV import
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@parser_classes([MultiPartParser, FormParser])
+def import_data(request, resource):
+    if resource not in IMPORTERS:
+        return Response({'error': f'Unknown import: {resource}'}, status=status.HTTP_404_NOT_FOUND)
+    if 'file' not in request.FILES:
+        return Response({'error': 'Upload the CSV as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # ✅ Bytes that are not UTF-8 are reported per row instead of failing with a 500
+    stream = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig', errors='replace', newline='')
+    result = IMPORTERS[resource](stream, request.user)
+    return Response(result, status=status.HTTP_200_OK)
+
+
+# Prometheus metrics (plain Django view: no DRF auth or content negotiation)
+
+def metrics(request):
+    config = getattr(settings, 'METRICS', {})
+    token = config.get('TOKEN')
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    elif not config.get('PUBLIC'):
+        # ✅ No token configured: closed unless explicitly made public
+        return HttpResponseForbidden()
+    return HttpResponse(app_metrics.REGISTRY.render(), content_type=app_metrics.CONTENT_TYPE)
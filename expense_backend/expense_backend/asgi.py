@@ -9,18 +9,18 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 # expense_backend/asgi.py
 import os
-import django
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
-from expense_app.routing import websocket_urlpatterns  # 👈 must create this
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_backend.settings')
-django.setup()
+django_asgi_app = get_asgi_application()  # sets up Django before the app imports below
+
+from expense_app.channels_auth import JWTAuthMiddleware  # noqa: E402
+from expense_app.routing import websocket_urlpatterns  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    "websocket": JWTAuthMiddleware(
         URLRouter(websocket_urlpatterns)
     ),
 })
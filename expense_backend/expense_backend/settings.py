@@ -51,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expense_app.middleware.MetricsMiddleware',
+    'expense_app.middleware.RequestProfilingMiddleware',  # no-op unless REQUEST_PROFILING['ENABLED']
+    'expense_app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -161,11 +164,24 @@ AUTH_USER_MODEL = 'expense_app.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'expense_app.authentication.RoleJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson when installed, same output as DRF's JSONRenderer/JSONParser;
+    # application/msgpack on request (Accept, Content-Type or ?format=msgpack)
+    'DEFAULT_RENDERER_CLASSES': (
+        'expense_app.renderers.FastJSONRenderer',
+        'expense_app.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'expense_app.renderers.FastJSONParser',
+        'expense_app.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 
@@ -197,6 +213,65 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Cache (catalog responses, admin recipients)
+# CACHE_BACKEND=locmem (default, per process) | file | redis. Use file or
+# redis when running more than one worker process so invalidations are shared.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'expense-app',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+
+# Request profiling (expense_app.middleware.RequestProfilingMiddleware)
+# REQUEST_PROFILING=1 adds Server-Timing headers and logs slow requests.
+# Requests that send X-Profile: <REQUEST_PROFILING_TOKEN> are also profiled
+# with cProfile into PROFILE_DIR (open the .prof files with snakeviz/pstats).
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('REQUEST_PROFILING', '0') == '1',
+    'SLOW_QUERIES': 3,
+    'SLOW_REQUEST_MS': int(os.environ.get('REQUEST_PROFILING_SLOW_MS', 500)),
+    'PROFILE_HEADER': 'X-Profile',
+    'PROFILE_TOKEN': os.environ.get('REQUEST_PROFILING_TOKEN', ''),
+    'PROFILE_DIR': os.environ.get('REQUEST_PROFILING_DIR', os.path.join(BASE_DIR, 'profiles')),
+    'PROFILE_KEEP': 50,
+}
+
+# Prometheus metrics at /metrics (expense_app.metrics). Scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token /metrics answers
+# 403 unless METRICS_PUBLIC=1 (only where the network already restricts it).
+# The worker's unauthenticated exporter (deliver_notifications --metrics-port)
+# binds to loopback, and other addresses also need METRICS_PUBLIC=1.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', '1') == '1',
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+    'PUBLIC': os.environ.get('METRICS_PUBLIC', '0') == '1',
+}
+
+# Response compression (expense_app.compression.CompressionMiddleware):
+# zstd, br or gzip by Accept-Encoding (br/zstd only when brotli/zstandard are
+# installed) for JSON, NDJSON, MessagePack and CSV bodies of at least MIN_SIZE
+# bytes. HTML (admin, browsable API) is not compressed.
+# Uploaded media (bills, profile pictures) is served as is.
+COMPRESSION = {
+    'ENABLED': os.environ.get('COMPRESSION', '1') == '1',
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+}
+
 # Channels (WebSocket) Layer
 CHANNEL_LAYERS = {
     "default": {
@@ -3,9 +3,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from expense_app.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('expense_app.urls')),  # Or whatever your app is
+    path('metrics', metrics, name='metrics'),
 ]
 
 # Add this line to serve media files in development